@@ -3,6 +3,8 @@ from enum import Enum
 from selenium.common.exceptions import NoSuchElementException
 from selenium.common.exceptions import NoSuchWindowException
 
+import page_selectors
+
 
 # There are three possible results when searching for permits:
 # ------------------------------------------------------------
@@ -12,15 +14,12 @@ from selenium.common.exceptions import NoSuchWindowException
 #                       innerHTML: No applications of this type were received on the given date.
 
 
+# The selectors are in page_selectors.py: results.single_title,
+# results.search_again_button and results.no_result.
 class PermitResult:
-    def __init__(self):
-        self.xpathToSingleResultSpanElement = "//div[@id='ctl00_cphTitleBand_pnlTitleBand']/div[1]/span[1]"
-        self.xpathToMultipleResultButtonElement = "//input[@value='Search Again']"
-        self.xpathToNoResultCenterElement = "//center[@class='posseerror']"
-
     def __call__(self, driver):
         try:
-            single_result_span = driver.find_element_by_xpath(self.xpathToSingleResultSpanElement)
+            single_result_span = page_selectors.find(driver, "results.single_title")
             inner_html = single_result_span.get_attribute("innerHTML")
             if "Master Permit" in inner_html:
                 return ResultType.SINGLE
@@ -32,7 +31,7 @@ class PermitResult:
             return False
 
         try:
-            driver.find_element_by_xpath(self.xpathToMultipleResultButtonElement)
+            page_selectors.find(driver, "results.search_again_button")
             return ResultType.MULTIPLE
         except NoSuchElementException:
             pass
@@ -40,7 +39,7 @@ class PermitResult:
             return False
 
         try:
-            driver.find_element_by_xpath(self.xpathToNoResultCenterElement)
+            page_selectors.find(driver, "results.no_result")
             return ResultType.NONE
         except NoSuchElementException:
             pass
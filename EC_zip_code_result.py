@@ -3,15 +3,14 @@ from enum import Enum
 from selenium.common.exceptions import NoSuchElementException
 from selenium.common.exceptions import NoSuchWindowException
 
+import page_selectors
 
-class ZipCodeResult:
-    def __init__(self):
-        self.xpathToErrorElement = "//div[@class='server-error address-tAddress help-block']"
-        self.xpathToZipCodeResultElement = "//div[@class='zipcode-result-address']"
 
+# The selectors are in page_selectors.py: zip.error and zip.result.
+class ZipCodeResult:
     def __call__(self, driver):
         try:
-            driver.find_element_by_xpath(self.xpathToErrorElement)
+            page_selectors.find(driver, "zip.error")
             return ZipCodeResultType.ERROR
         except NoSuchElementException:
             pass
@@ -19,7 +18,7 @@ class ZipCodeResult:
             return False
 
         try:
-            driver.find_element_by_xpath(self.xpathToZipCodeResultElement)
+            page_selectors.find(driver, "zip.result")
             return ZipCodeResultType.FOUND
         except NoSuchElementException:
             return False
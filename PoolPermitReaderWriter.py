@@ -1,5 +1,11 @@
 import csv
 import os
+import shutil
+import tempfile
+
+from permit import COLUMNS
+from permit import Permit
+from permit_index import permit_id
 
 
 class CSVReaderWriter:
@@ -24,6 +30,8 @@ class CSVReaderWriter:
         """
 
         self.permits = []
+        self.permit_ids = set()
+        fieldnames = COLUMNS
         self.filename = csv_filename if ".csv" in csv_filename else csv_filename + ".csv"
 
         if create_new_file:
@@ -34,37 +42,44 @@ class CSVReaderWriter:
             self.file.seek(0)  # Go to the start of the file
             self.reader = csv.DictReader(self.file)
             for row in self.reader:
-                self.permits.append(row)  # Make copy of all current data in file
+                permit = Permit.from_row(row)
+                self.permits.append(permit)  # Make copy of all current data in file
+                self.permit_ids.add(permit_id(permit.url))
+            # Keep the columns of files written before "Permit Type" existed
+            fieldnames = self.reader.fieldnames or COLUMNS
 
-        self.writer = csv.DictWriter(self.file, fieldnames=["Application Date", "Completed Date", "Address",
-                                                            "Applicant", "Contractor", "Job Value Cost",
-                                                            "Permit URL"])
+        self.writer = csv.DictWriter(self.file, fieldnames=fieldnames, extrasaction="ignore")
 
-    def write_permit_to_csv(self, permit_data):
+    def write_permit_to_csv(self, permit):
         """
-        Appends the data from permit_data to self.data.
+        Appends @permit to self.permits.
         This function does not actually write to the
-        csv file to save compute time.
+        csv file to save compute time. A permit that is
+        already in self.permits (same permit identity)
+        is not appended again.
 
         Parameters
         ----------
-        permit_data: dict
-            A dictionary that contains the
-            following information for a permit:
-
-            - Application Date
-            - Completed Date (if exists, leave blank if not)
-            - Address
-            - Applicant
-            - Contractor
-            - Job Value Cost
-            - Permit URL
+        permit: Permit
+            The permit to save.
+
+        Returns
+        -------
+        bool
+            True if the permit was appended, False
+            if it was a duplicate.
 
         """
 
-        self.permits.append(permit_data)
+        identity = permit_id(permit.url)
+        if identity in self.permit_ids:
+            return False
 
-    def update_permit_in_csv(self, permit_idx, new_permit_data):
+        self.permit_ids.add(identity)
+        self.permits.append(permit)
+        return True
+
+    def update_permit_in_csv(self, permit_idx, new_permit):
         """
         Update a particular permit in the self.permits list.
 
@@ -73,13 +88,12 @@ class CSVReaderWriter:
         permit_idx: int
             For locating the permit to be updated
             in the self.permits list.
-        new_permit_data: dict
-            A dictionary containing the updated
-            data for the permit at index @permit_idx
+        new_permit: Permit
+            The updated permit for index @permit_idx
 
         """
 
-        self.permits[permit_idx] = new_permit_data
+        self.permits[permit_idx] = new_permit
 
     def get_list_of_uncompleted_permits(self):
         """
@@ -95,7 +109,7 @@ class CSVReaderWriter:
 
         """
 
-        return [(idx, permit) for idx, permit in enumerate(self.permits) if permit["Completed Date"] == ""]
+        return [(idx, permit) for idx, permit in enumerate(self.permits) if not permit.is_completed]
 
     def save_csv(self):
         """
@@ -106,7 +120,7 @@ class CSVReaderWriter:
         self.file.truncate(0)  # Delete all old content in file
         self.writer.writeheader()
         for permit in self.permits:
-            self.writer.writerow(permit)
+            self.writer.writerow(permit.to_row())
 
     def close_csv(self):
         """
@@ -118,3 +132,103 @@ class CSVReaderWriter:
         """
 
         self.file.close()
+
+
+def iter_permits(csv_filename):
+    """
+    Lazily read the permits of a csv file, one row
+    at a time, so the whole file is never in memory.
+
+    Parameters
+    ----------
+    csv_filename: str
+        Path to the csv file.
+
+    Yields
+    ------
+    tuple
+        A 2-tuple containing the index of the row
+        and the permit in that row.
+
+    """
+
+    with open(csv_filename, mode="r", newline="") as file:
+        for idx, row in enumerate(csv.DictReader(file)):
+            yield idx, Permit.from_row(row)
+
+
+def iter_uncompleted_permits(csv_filename):
+    """
+    Same as iter_permits(), but only yields the
+    permits without a completed date.
+
+    """
+
+    for idx, permit in iter_permits(csv_filename):
+        if not permit.is_completed:
+            yield idx, permit
+
+
+def append_permits_to_csv(csv_filename, permits):
+    """
+    Append permits to a csv file (e.g. a master file)
+    without reading it, creating the file if needed.
+    Rows are written with the columns of the file's
+    own header.
+
+    """
+
+    fieldnames = COLUMNS
+    if os.path.exists(csv_filename) and os.path.getsize(csv_filename) > 0:
+        with open(csv_filename, mode="r", newline="") as file:
+            fieldnames = next(csv.reader(file))
+
+    with open(csv_filename, mode="a", newline="") as file:
+        writer = csv.DictWriter(file, fieldnames=fieldnames, extrasaction="ignore")
+        if fieldnames is COLUMNS:
+            writer.writeheader()
+        for permit in permits:
+            writer.writerow(permit.to_row())
+
+
+def merge_updates(csv_filename, updated_permits):
+    """
+    Write @updated_permits back into the csv file in
+    a single sequential pass. Rows are copied to a
+    temporary file in the same directory, with the
+    updated rows replaced, and the temporary file is
+    then atomically swapped in for the original. An
+    interrupted merge leaves the original untouched.
+    The file keeps its own columns, so a file written
+    before the "Permit Type" column existed doesn't
+    gain it.
+
+    Parameters
+    ----------
+    csv_filename: str
+        Path to the csv file.
+    updated_permits: dict
+        Maps the index of a row (as given by
+        iter_permits()) to its updated permit.
+
+    """
+
+    if not updated_permits:
+        return
+
+    directory = os.path.dirname(os.path.abspath(csv_filename))
+    temp_file = tempfile.NamedTemporaryFile(mode="w", newline="", dir=directory,
+                                            prefix=".merge_", suffix=".csv", delete=False)
+    try:
+        with temp_file, open(csv_filename, mode="r", newline="") as file:
+            reader = csv.DictReader(file)
+            writer = csv.DictWriter(temp_file, fieldnames=reader.fieldnames or COLUMNS, extrasaction="ignore")
+            writer.writeheader()
+            for idx, row in enumerate(reader):
+                permit = updated_permits.get(idx)
+                writer.writerow(row if permit is None else permit.to_row())
+        shutil.copymode(csv_filename, temp_file.name)
+        os.replace(temp_file.name, csv_filename)
+    except BaseException:
+        os.remove(temp_file.name)
+        raise
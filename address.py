@@ -0,0 +1,244 @@
+import re
+from collections import namedtuple
+from functools import lru_cache
+
+
+# Abbreviations follow USPS Publication 28 (Appendix C): street suffixes
+# (C1), secondary unit designators (C2) and directionals (B). Each table
+# maps every common spelling to the standard abbreviation.
+STREET_SUFFIXES = {
+    "ALLEY": "ALY", "ALLEE": "ALY", "ALLY": "ALY",
+    "AVENUE": "AVE", "AV": "AVE", "AVEN": "AVE", "AVENU": "AVE", "AVN": "AVE", "AVNUE": "AVE",
+    "BEND": "BND",
+    "BOULEVARD": "BLVD", "BOUL": "BLVD", "BOULV": "BLVD",
+    "BRANCH": "BR", "BRNCH": "BR",
+    "BYPASS": "BYP", "BYPA": "BYP", "BYPAS": "BYP", "BYPS": "BYP",
+    "CIRCLE": "CIR", "CIRC": "CIR", "CIRCL": "CIR", "CRCL": "CIR", "CRCLE": "CIR",
+    "COURT": "CT", "CRT": "CT",
+    "COVE": "CV",
+    "CREEK": "CRK",
+    "CROSSING": "XING", "CRSSNG": "XING",
+    "DRIVE": "DR", "DRIV": "DR", "DRV": "DR",
+    "ESTATE": "EST", "ESTATES": "ESTS",
+    "EXPRESSWAY": "EXPY", "EXP": "EXPY", "EXPR": "EXPY", "EXPRESS": "EXPY", "EXPW": "EXPY",
+    "FREEWAY": "FWY", "FREEWY": "FWY", "FRWAY": "FWY", "FRWY": "FWY",
+    "GARDEN": "GDN", "GARDENS": "GDNS",
+    "GLEN": "GLN",
+    "GROVE": "GRV",
+    "HEIGHTS": "HTS", "HT": "HTS",
+    "HIGHWAY": "HWY", "HIGHWY": "HWY", "HIWAY": "HWY", "HIWY": "HWY", "HWAY": "HWY",
+    "HILL": "HL", "HILLS": "HLS",
+    "HOLLOW": "HOLW", "HLLW": "HOLW", "HOLLOWS": "HOLW", "HOLWS": "HOLW",
+    "JUNCTION": "JCT", "JCTION": "JCT", "JUNCTN": "JCT",
+    "LAKE": "LK", "LAKES": "LKS",
+    "LANDING": "LNDG", "LNDNG": "LNDG",
+    "LANE": "LN",
+    "LOOP": "LOOP", "LOOPS": "LOOP",
+    "MEADOW": "MDW", "MEADOWS": "MDWS", "MEDOWS": "MDWS",
+    "MOUNT": "MT", "MOUNTAIN": "MTN",
+    "OVERPASS": "OPAS",
+    "PARK": "PARK", "PARKS": "PARK",
+    "PARKWAY": "PKWY", "PARKWY": "PKWY", "PKWAY": "PKWY", "PKY": "PKWY", "PARKWAYS": "PKWY",
+    "PASS": "PASS",
+    "PATH": "PATH", "PATHS": "PATH",
+    "PIKE": "PIKE", "PIKES": "PIKE",
+    "PLACE": "PL",
+    "PLAZA": "PLZ", "PLZA": "PLZ",
+    "POINT": "PT", "POINTE": "PT",
+    "RIDGE": "RDG", "RDGE": "RDG",
+    "ROAD": "RD", "ROADS": "RDS",
+    "ROW": "ROW",
+    "RUN": "RUN",
+    "SQUARE": "SQ", "SQR": "SQ", "SQRE": "SQ", "SQU": "SQ",
+    "STREET": "ST", "STRT": "ST", "STR": "ST",
+    "TERRACE": "TER", "TERR": "TER",
+    "TRACE": "TRCE", "TRACES": "TRCE",
+    "TRAIL": "TRL", "TRAILS": "TRL", "TRLS": "TRL",
+    "TURNPIKE": "TPKE", "TRNPK": "TPKE", "TURNPK": "TPKE",
+    "VALLEY": "VLY", "VALLY": "VLY", "VLLY": "VLY",
+    "VIEW": "VW",
+    "VILLAGE": "VLG", "VILL": "VLG", "VILLAG": "VLG", "VILLG": "VLG",
+    "VISTA": "VIS", "VIST": "VIS", "VST": "VIS", "VSTA": "VIS",
+    "WALK": "WALK", "WALKS": "WALK",
+    "WAY": "WAY", "WY": "WAY",
+}
+DIRECTIONALS = {
+    "NORTH": "N", "SOUTH": "S", "EAST": "E", "WEST": "W",
+    "NORTHEAST": "NE", "NORTHWEST": "NW", "SOUTHEAST": "SE", "SOUTHWEST": "SW",
+}
+SECONDARY_UNITS = {
+    "APARTMENT": "APT", "APT": "APT",
+    "BUILDING": "BLDG", "BLDG": "BLDG",
+    "FLOOR": "FL", "FL": "FL",
+    "LOT": "LOT",
+    "ROOM": "RM", "RM": "RM",
+    "SPACE": "SPC", "SPC": "SPC",
+    "SUITE": "STE", "STE": "STE",
+    "TRAILER": "TRLR", "TRLR": "TRLR",
+    "UNIT": "UNIT",
+    "#": "#",
+}
+
+# A unit is a designator and a number ("APT 5"), or "#" and a number ("#5").
+# It is either at the end of the street line or on a line of its own.
+UNIT = r"(?:(" + "|".join(unit for unit in SECONDARY_UNITS if unit != "#") + r")\s+|(#)\s*)([A-Z0-9-]+)"
+UNIT_PATTERN = re.compile(r"\s+" + UNIT + "$")
+UNIT_LINE_PATTERN = re.compile("^" + UNIT + "$")
+# A house number may have a letter ("123A") or a fraction ("123 1/2")
+HOUSE_NUMBER_PATTERN = re.compile(r"^(\d+)(?:([A-Z])|\s+(\d+/\d+))?\s+(.+)$")
+
+# Number of distinct raw addresses whose parsed form is remembered
+CACHE_SIZE = 65536
+
+CanonicalAddress = namedtuple("CanonicalAddress", ["house_number", "house_suffix", "street", "unit"])
+
+
+@lru_cache(maxsize=CACHE_SIZE)
+def normalize_street_name(street):
+    """
+    Normalize a street name so different spellings
+    of the same street map to the same key, e.g.
+    "North Central Expressway" -> "N CENTRAL EXPY".
+
+    The pre- and post-directionals and the street
+    suffix are abbreviated; other words are kept,
+    so "West End Dr" -> "W END DR".
+
+    """
+
+    words = re.sub(r"[^A-Z0-9# ]", " ", street.upper()).split()
+    if not words:
+        return ""
+
+    words[0] = DIRECTIONALS.get(words[0], words[0])
+    if len(words) > 1 and words[-1] in DIRECTIONALS:
+        words[-1] = DIRECTIONALS[words[-1]]
+        suffix_idx = len(words) - 2
+    else:
+        suffix_idx = len(words) - 1
+    if suffix_idx > 0:
+        words[suffix_idx] = STREET_SUFFIXES.get(words[suffix_idx], words[suffix_idx])
+    return " ".join(words)
+
+
+def fold(line):
+    return " ".join(re.sub(r"[.,]", " ", line.upper()).split())
+
+
+def street_line(address):
+    """
+    The first line of a permit address, case- and
+    whitespace-folded, with the unit appended if it
+    is on the second line.
+
+    """
+
+    lines = [fold(line) for line in address.strip().splitlines()]
+    if not lines:
+        return ""
+    if len(lines) > 1 and UNIT_LINE_PATTERN.match(lines[1]):
+        return lines[0] + " " + lines[1]
+    return lines[0]
+
+
+@lru_cache(maxsize=CACHE_SIZE)
+def parse_address(address):
+    """
+    Parse the street line of a permit address.
+
+    Parameters
+    ----------
+    address: str
+        Address as saved by scraper.get_permit_info().
+        Only the street line is used (see street_line()).
+
+    Returns
+    -------
+    CanonicalAddress
+        The house number (int), its letter or fraction
+        ("A", "1/2" or "" if none), the normalized
+        street name and the normalized unit ("" if
+        none), or None if the address has no house
+        number.
+
+    """
+
+    line = street_line(address)
+
+    unit = ""
+    match = UNIT_PATTERN.search(line)
+    if match is not None:
+        designator, pound_sign, number = match.groups()
+        unit = SECONDARY_UNITS[designator or pound_sign] + " " + number
+        line = line[:match.start()]
+
+    match = HOUSE_NUMBER_PATTERN.match(line)
+    if match is None:
+        return None
+    number, letter, fraction, street = match.groups()
+    return CanonicalAddress(int(number), letter or fraction or "", normalize_street_name(street), unit)
+
+
+@lru_cache(maxsize=CACHE_SIZE)
+def canonical_address(address):
+    """
+    The canonical form of a permit address, e.g.
+    "1234  north Main Street\\nApt. 5" -> "1234 N MAIN ST APT 5"
+    or "123 1/2 Elm St" -> "123 1/2 ELM ST".
+    Equivalent spellings of an address have the same
+    canonical form, so it is used as the key to look
+    up each address only once.
+
+    Addresses that can't be parsed are only case-
+    and whitespace-folded.
+
+    """
+
+    parts = parse_address(address)
+    if parts is None:
+        return street_line(address)
+    return format_address(parts)
+
+
+def format_address(parts):
+    line = str(parts.house_number)
+    if "/" in parts.house_suffix:
+        line += " " + parts.house_suffix
+    else:
+        line += parts.house_suffix
+    line += " " + parts.street
+    return line + " " + parts.unit if parts.unit else line
+
+
+def format_full_address(street, city, state, zip_code):
+    """
+    Format a full address the way the USPS ZIP Code
+    Lookup page displays it (its zipcode-result-address
+    text): the street line(s), then "CITY STATE ZIP" on
+    the last line, e.g. "1234 N MAIN ST\nDALLAS TX 75201-1234".
+    Every ZIP lookup path uses this format, so one
+    output file never mixes formats.
+
+    Parameters
+    ----------
+    street: str
+        The street line, or several separated by "\n".
+    city, state: str
+    zip_code: str
+        ZIP+4, e.g. "75201-1234".
+
+    """
+
+    return normalize_full_address(street + "\n" + city + " " + state + " " + zip_code)
+
+
+def normalize_full_address(text):
+    """
+    Strip the layout whitespace of a full address
+    read from the USPS page: one line per address
+    line, single spaces, no blank lines.
+
+    """
+
+    lines = (" ".join(line.split()) for line in text.splitlines())
+    return "\n".join(line for line in lines if line)
@@ -0,0 +1,253 @@
+import asyncio
+
+import scraper
+from permit import DEFAULT_PERMIT_TYPE
+from progress import NULL_REPORTER
+from progress import Stage
+from scraper import NotAPermitPage
+
+
+# aiohttp is imported when a fetch starts, so it is only needed for use_http.
+
+# Same limit as the 10 second WebDriverWait used by the browser. It applies
+# to each request once it has a connection, not while it waits for one.
+DEFAULT_TIMEOUT = 10
+DEFAULT_LIMIT_PER_HOST = 20
+DEFAULT_LIMIT = 200
+
+NOT_A_PERMIT_PAGE = "not a permit page (login, error or maintenance page?)"
+
+HEADERS = {
+    "User-Agent": "Mozilla/5.0 (Macintosh; Intel Mac OS X 10_15_7) AppleWebKit/537.36 "
+                  "(KHTML, like Gecko) Chrome/118.0 Safari/537.36",
+}
+
+
+class FetchError(Exception):
+    def __init__(self, url, reason):
+        super().__init__(url + ": " + reason)
+        self.url = url
+        self.reason = reason
+
+
+class Page:
+    __slots__ = ("url", "status", "body", "etag", "last_modified")
+
+    def __init__(self, url, status, body, etag=None, last_modified=None):
+        self.url = url
+        self.status = status
+        self.body = body
+        self.etag = etag
+        self.last_modified = last_modified
+
+    @property
+    def not_modified(self):
+        return self.status == 304
+
+
+async def fetch_page(session, url, slots, headers=None, timeout=DEFAULT_TIMEOUT):
+    """
+    Fetch a single page.
+
+    Parameters
+    ----------
+    session: aiohttp.ClientSession
+    url: str
+    slots: asyncio.Semaphore
+        Bounds the requests in flight. The timeout only
+        starts once a slot is free, so requests queued
+        behind hundreds of others don't time out.
+    headers: dict
+        Extra request headers, e.g. the conditional-GET
+        headers from PermitStateStore.validators().
+    timeout: float
+        Seconds allowed for the request.
+
+    Returns
+    -------
+    Page
+        The fetched page. Its body is empty if the
+        server answered 304 Not Modified.
+
+    Raises
+    ------
+    FetchError
+        If the request failed, timed out or the
+        server answered with an error status.
+
+    """
+
+    import aiohttp
+
+    try:
+        async with slots:
+            request_timeout = aiohttp.ClientTimeout(total=timeout)
+            async with session.get(url, headers=headers or {}, timeout=request_timeout) as response:
+                if response.status == 304:
+                    return Page(url, response.status, "")
+                if response.status >= 400:
+                    raise FetchError(url, "HTTP " + str(response.status))
+                body = await response.text()
+                return Page(url, response.status, body,
+                            response.headers.get("ETag"), response.headers.get("Last-Modified"))
+    except asyncio.TimeoutError:
+        raise FetchError(url, "timed out")
+    except aiohttp.ClientError as error:
+        raise FetchError(url, repr(error))
+
+
+async def fetch_pages(urls, headers_for=None, limit_per_host=DEFAULT_LIMIT_PER_HOST, timeout=DEFAULT_TIMEOUT):
+    """
+    Fetch many pages concurrently on the running event
+    loop, yielding each page as soon as it has arrived
+    so it can be parsed while the rest are in flight.
+
+    Parameters
+    ----------
+    urls: list
+    headers_for: function
+        Given a url, returns the extra request
+        headers for it. Optional.
+    limit_per_host: int
+        Maximum number of requests in flight (and of
+        open connections) per host.
+    timeout: float
+        Seconds allowed for each request, counted
+        from when it is sent.
+
+    Yields
+    ------
+    Page
+        Pages in the order they finish, not the
+        order of @urls.
+
+    """
+
+    import aiohttp
+
+    connector = aiohttp.TCPConnector(limit=DEFAULT_LIMIT, limit_per_host=limit_per_host)
+    # Permit pages are all on one host, so one slot per connection
+    slots = asyncio.Semaphore(limit_per_host)
+    async with aiohttp.ClientSession(connector=connector, headers=HEADERS) as session:
+        tasks = [asyncio.ensure_future(fetch_page(session, url, slots, headers_for(url) if headers_for else None,
+                                                  timeout))
+                 for url in urls]
+        try:
+            for next_page in asyncio.as_completed(tasks):
+                yield await next_page
+        finally:
+            # The consumer stopped early (error or budget used up)
+            for task in tasks:
+                task.cancel()
+            await asyncio.gather(*tasks, return_exceptions=True)
+
+
+def get_permit_from_links(links, csv_rw, progress=NULL_REPORTER, permit_types=None):
+    """
+    HTTP counterpart of web_driver.get_permit_from_links().
+    Fetch every link concurrently and save each permit's
+    info into @csv_rw as its page arrives.
+
+    Parameters
+    ----------
+    links: list
+        List of links where each link will lead to a
+        web page that displays a permit's info.
+    csv_rw: CSVReaderWriter
+        Instance of CSVReaderWriter.
+    progress: ProgressReporter
+        Receives an event for each page loaded
+        and each permit found.
+    permit_types: dict
+        Maps a link to the application type it was
+        found under. Links not in it are tagged with
+        the default (pool) permit type.
+
+    Raises
+    ------
+    FetchError
+        If any of the pages couldn't be fetched, or
+        isn't a permit page.
+
+    """
+
+    async def run():
+        async for page in fetch_pages(links):
+            progress.page_loaded()
+            permit_type = permit_types.get(page.url, DEFAULT_PERMIT_TYPE) if permit_types else DEFAULT_PERMIT_TYPE
+            try:
+                if scraper.get_permit_info(page.body, page.url, csv_rw, permit_type):
+                    progress.permits_found()
+            except NotAPermitPage:
+                raise FetchError(page.url, NOT_A_PERMIT_PAGE)
+
+    asyncio.run(run())
+
+
+def update_permit_completion_date(uncompleted_permits, state, scheduler, progress=NULL_REPORTER):
+    """
+    HTTP counterpart of web_driver.update_permit_completion_date().
+    Fetch the scheduled uncompleted permits concurrently,
+    with conditional GETs where the server gave cache
+    validators, and update the permits in place with
+    any new completed date.
+
+    Parameters
+    ----------
+    uncompleted_permits: iterable
+        2-tuples containing the index of an
+        uncompleted permit and the permit itself,
+        e.g. from iter_uncompleted_permits().
+    state: PermitStateStore
+        Last-checked times and cache validators
+        of the permits. Pages that haven't changed
+        since the last check (304) aren't parsed.
+    scheduler: CompletionScheduler
+        Orders and caps the permits to check.
+    progress: ProgressReporter
+        Receives an event for each permit checked.
+
+    Returns
+    -------
+    list
+        List of 2-tuples containing the index and
+        the permit of each permit that has been
+        updated with a completed date.
+
+    Raises
+    ------
+    FetchError
+        If any of the pages couldn't be fetched, or
+        isn't a permit page.
+
+    """
+
+    uncompleted_permits = scheduler.schedule(uncompleted_permits, state)
+    by_url = {permit.url: (idx, permit) for idx, permit in uncompleted_permits}
+    updated_permits = []
+
+    async def run():
+        async for page in fetch_pages(list(by_url), headers_for=state.validators):
+            if scheduler.out_of_time():
+                break
+
+            progress.page_loaded()
+            progress.permit_checked()
+            state.mark_checked(page.url)
+            if page.not_modified:
+                continue
+
+            try:
+                completion_date = scraper.get_permit_completion_date(page.body)
+            except NotAPermitPage:
+                raise FetchError(page.url, NOT_A_PERMIT_PAGE)
+            state.set_validators(page.url, page.etag, page.last_modified)
+            if completion_date != "":
+                idx, permit = by_url[page.url]
+                permit.set_completed_date(completion_date)
+                updated_permits.append((idx, permit))
+
+    progress.stage_started(Stage.UPDATE, len(by_url))
+    scheduler.start()
+    asyncio.run(run())
+    return updated_permits
@@ -0,0 +1,92 @@
+import argparse
+import os
+import re
+import statistics
+import subprocess
+import sys
+import time
+
+from gui import STARTUP_BENCHMARK_VARIABLE
+
+
+def launch(command, benchmark):
+    """
+    Launch the app once and read the timestamps it
+    prints (see gui.report_startup()).
+
+    Returns
+    -------
+    dict
+        Seconds from launch to each event
+        ("window", "first-page").
+
+    """
+
+    env = dict(os.environ, **{STARTUP_BENCHMARK_VARIABLE: benchmark})
+    start = time.time()
+    output = subprocess.run(command, env=env, stdout=subprocess.PIPE, universal_newlines=True, check=True).stdout
+
+    timings = {}
+    for line in output.splitlines():
+        parts = line.split()
+        if len(parts) == 2 and parts[0] in ("window", "first-page"):
+            timings[parts[0]] = float(parts[1]) - start
+    return timings
+
+
+def import_times(module, top=15):
+    """
+    Cumulative import time of @module and its
+    slowest dependencies, from python -X importtime.
+
+    Returns
+    -------
+    list
+        2-tuples of (seconds, module name),
+        slowest first.
+
+    """
+
+    stderr = subprocess.run([sys.executable, "-X", "importtime", "-c", "import " + module],
+                            stderr=subprocess.PIPE, universal_newlines=True, check=True).stderr
+
+    times = []
+    for line in stderr.splitlines():
+        match = re.match(r"import time:\s+\d+\s+\|\s+(\d+)\s+\|\s+(.+)$", line)
+        if match:
+            times.append((int(match.group(1)) / 1e6, match.group(2).strip()))
+    times.sort(reverse=True)
+    return times[:top]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Measure the startup time of the app.")
+    parser.add_argument("--executable", help="Path to the frozen app (dist/gui). Defaults to running gui.py.")
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--first-page", action="store_true",
+                        help="Also measure the time until the browser has loaded the permit search page.")
+    parser.add_argument("--imports", action="store_true", help="Also list the slowest imports of web_driver.")
+    args = parser.parse_args()
+
+    if args.executable:
+        command = [args.executable]
+    else:
+        command = [sys.executable, os.path.join(os.path.dirname(os.path.abspath(__file__)), "gui.py")]
+    benchmark = "first-page" if args.first_page else "window"
+
+    runs = [launch(command, benchmark) for _ in range(args.runs)]
+    for event in ("window", "first-page"):
+        seconds = [timings[event] for timings in runs if event in timings]
+        if seconds:
+            print("Time to " + event + ": median {:.3f} s, min {:.3f} s, max {:.3f} s ({} runs)".format(
+                statistics.median(seconds), min(seconds), max(seconds), len(seconds)))
+
+    if args.imports:
+        print("")
+        print("Slowest imports of web_driver (deferred until a job starts):")
+        for seconds, module in import_times("web_driver"):
+            print("{:8.3f} s  {}".format(seconds, module))
+
+
+if __name__ == "__main__":
+    main()
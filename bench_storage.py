@@ -0,0 +1,311 @@
+import argparse
+import datetime
+import json
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+
+from synthetic_permits import generate_permits
+from synthetic_permits import write_csv
+
+
+BACKENDS = ("csv", "stream", "store", "parquet", "arrow", "jsonl")
+STAGES = ("load", "scan", "update", "save")
+DEFAULT_SIZES = (10000, 100000, 1000000)
+
+# Every UPDATE_EVERY-th uncompleted permit gets a completed date
+UPDATE_EVERY = 10
+
+# A stage (or the peak RSS) counts as a regression when it is this much
+# worse than in the baseline, and by more than the noise of a short run
+REGRESSION_RATIO = 1.25
+MIN_REGRESSION_SECONDS = 0.1
+MIN_REGRESSION_MB = 5
+
+
+def peak_rss_mb():
+    """
+    Peak resident set size of this process in MB, or
+    None where the resource module isn't available
+    (Windows).
+
+    """
+
+    try:
+        import resource
+    except ImportError:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # ru_maxrss is in bytes on macOS and in kilobytes on Linux
+    return peak / 2 ** 20 if sys.platform == "darwin" else peak / 2 ** 10
+
+
+def complete(permit):
+    permit.completed_date = permit.application_date + datetime.timedelta(days=30)
+    return permit
+
+
+def run_csv(csv_filename):
+    """
+    CSVReaderWriter: the whole file is loaded into
+    memory and saved back in full.
+
+    """
+
+    from PoolPermitReaderWriter import CSVReaderWriter
+
+    timings = {}
+    start = time.perf_counter()
+    csv_rw = CSVReaderWriter(csv_filename, create_new_file=False)
+    timings["load"] = time.perf_counter() - start
+
+    start = time.perf_counter()
+    uncompleted_permits = csv_rw.get_list_of_uncompleted_permits()
+    timings["scan"] = time.perf_counter() - start
+
+    start = time.perf_counter()
+    for idx, permit in uncompleted_permits[::UPDATE_EVERY]:
+        csv_rw.update_permit_in_csv(idx, complete(permit))
+    timings["update"] = time.perf_counter() - start
+
+    start = time.perf_counter()
+    csv_rw.save_csv()
+    csv_rw.close_csv()
+    timings["save"] = time.perf_counter() - start
+    return timings
+
+
+def run_stream(csv_filename):
+    """
+    iter_permits() / merge_updates(): the file is
+    streamed and only the uncompleted permits are
+    held in memory, as in update_file().
+
+    """
+
+    from PoolPermitReaderWriter import iter_permits
+    from PoolPermitReaderWriter import iter_uncompleted_permits
+    from PoolPermitReaderWriter import merge_updates
+
+    timings = {}
+    start = time.perf_counter()
+    for _ in iter_permits(csv_filename):
+        pass
+    timings["load"] = time.perf_counter() - start
+
+    start = time.perf_counter()
+    uncompleted_permits = list(iter_uncompleted_permits(csv_filename))
+    timings["scan"] = time.perf_counter() - start
+
+    start = time.perf_counter()
+    updated_permits = {idx: complete(permit) for idx, permit in uncompleted_permits[::UPDATE_EVERY]}
+    timings["update"] = time.perf_counter() - start
+
+    start = time.perf_counter()
+    merge_updates(csv_filename, updated_permits)
+    timings["save"] = time.perf_counter() - start
+    return timings
+
+
+def run_store(csv_filename):
+    """
+    PartitionedStore: only the shards with open
+    permits are read and rewritten. The store is
+    built from the csv file before timing starts.
+
+    """
+
+    from permit_store import PartitionedStore
+
+    directory = os.path.splitext(csv_filename)[0] + "_store"
+    PartitionedStore(directory).import_csv(csv_filename)
+
+    timings = {}
+    start = time.perf_counter()
+    store = PartitionedStore(directory)
+    timings["load"] = time.perf_counter() - start
+
+    start = time.perf_counter()
+    uncompleted_permits = list(store.iter_uncompleted_permits())
+    timings["scan"] = time.perf_counter() - start
+
+    start = time.perf_counter()
+    updated_permits = [(location, complete(permit)) for location, permit in uncompleted_permits[::UPDATE_EVERY]]
+    timings["update"] = time.perf_counter() - start
+
+    start = time.perf_counter()
+    store.apply_updates(updated_permits)
+    timings["save"] = time.perf_counter() - start
+    return timings
+
+
+def permit_from_record(record):
+    from permit import Permit
+
+    def date(value):
+        return datetime.date.fromisoformat(value) if value is not None else None
+
+    job_value = record["job_value"] if record["job_value"] is not None else ""
+    return Permit(date(record["application_date"]), date(record["completed_date"]), record["address"],
+                  record["applicant"], record["contractor"], job_value, record["permit_url"],
+                  record["permit_type"])
+
+
+def run_output(csv_filename, extension):
+    """
+    One of the output formats of permit_output.py:
+    the whole file is read into memory and written
+    back in full (the formats can't be updated in
+    place). The file is written from the csv file
+    before timing starts.
+
+    """
+
+    from permit_output import iter_records
+    from permit_output import open_output
+    from PoolPermitReaderWriter import iter_permits
+
+    filename = os.path.splitext(csv_filename)[0] + extension
+    with open_output(filename) as output:
+        output.write_permits(permit for _, permit in iter_permits(csv_filename))
+
+    timings = {}
+    start = time.perf_counter()
+    permits = [permit_from_record(record) for record in iter_records(filename)]
+    timings["load"] = time.perf_counter() - start
+
+    start = time.perf_counter()
+    uncompleted_permits = [(idx, permit) for idx, permit in enumerate(permits) if not permit.is_completed]
+    timings["scan"] = time.perf_counter() - start
+
+    start = time.perf_counter()
+    for idx, permit in uncompleted_permits[::UPDATE_EVERY]:
+        permits[idx] = complete(permit)
+    timings["update"] = time.perf_counter() - start
+
+    start = time.perf_counter()
+    with open_output(filename) as output:
+        output.write_permits(permits)
+    timings["save"] = time.perf_counter() - start
+    return timings
+
+
+RUNS = {"csv": run_csv, "stream": run_stream, "store": run_store,
+        "parquet": lambda csv_filename: run_output(csv_filename, ".parquet"),
+        "arrow": lambda csv_filename: run_output(csv_filename, ".arrow"),
+        "jsonl": lambda csv_filename: run_output(csv_filename, ".jsonl.zst")}
+
+# Module each backend needs besides the standard library
+REQUIREMENTS = {"parquet": "pyarrow", "arrow": "pyarrow", "jsonl": "zstandard"}
+
+
+def available_backends():
+    import importlib.util
+
+    return [backend for backend in BACKENDS
+            if backend not in REQUIREMENTS or importlib.util.find_spec(REQUIREMENTS[backend]) is not None]
+
+
+def run_backend(backend, csv_filename):
+    """
+    Run one backend on a copy of @csv_filename in a
+    fresh process, so its peak RSS isn't mixed with
+    the other runs.
+
+    Returns
+    -------
+    dict
+        Seconds per stage and "peak_rss_mb".
+
+    """
+
+    directory = tempfile.mkdtemp(prefix="bench_" + backend + "_")
+    try:
+        copy = os.path.join(directory, "permits.csv")
+        shutil.copyfile(csv_filename, copy)
+        output = subprocess.run([sys.executable, os.path.abspath(__file__), "--run", backend, copy],
+                                stdout=subprocess.PIPE, universal_newlines=True, check=True).stdout
+        return json.loads(output.splitlines()[-1])
+    finally:
+        # Store shards without open permits are read-only
+        shutil.rmtree(directory, onerror=lambda function, path, _: (os.chmod(path, 0o600), function(path)))
+
+
+def compare(results, baseline):
+    """
+    Return a line per stage (or peak RSS) that is
+    REGRESSION_RATIO times worse than in @baseline
+    (ignoring differences within the noise).
+
+    """
+
+    regressions = []
+    for key, result in results.items():
+        if key not in baseline:
+            continue
+        for measure in STAGES + ("peak_rss_mb",):
+            old, new = baseline[key].get(measure), result.get(measure)
+            noise = MIN_REGRESSION_MB if measure == "peak_rss_mb" else MIN_REGRESSION_SECONDS
+            if old and new and new > old * REGRESSION_RATIO and new - old > noise:
+                regressions.append("{} {}: {:.3f} -> {:.3f} ({:.0%} worse)".format(key, measure, old, new, new / old - 1))
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Scaling benchmark of the permit storage backends.")
+    parser.add_argument("--sizes", type=int, nargs="+", default=list(DEFAULT_SIZES))
+    parser.add_argument("--backends", nargs="+", choices=BACKENDS, default=None,
+                        help="Default: every backend whose modules are installed.")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", help="Save the results as JSON, e.g. to use as a baseline later.")
+    parser.add_argument("--baseline", help="JSON results of an earlier run. Exits with 1 on a regression.")
+    parser.add_argument("--run", nargs=2, metavar=("BACKEND", "CSV_FILE"), help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.backends is None:
+        args.backends = available_backends()
+
+    if args.run:
+        backend, csv_filename = args.run
+        timings = RUNS[backend](csv_filename)
+        timings["peak_rss_mb"] = peak_rss_mb()
+        print(json.dumps(timings))
+        return
+
+    results = {}
+    print("{:>9} {:>7} {:>9} {:>9} {:>9} {:>9} {:>13}".format("permits", "backend", *STAGES, "peak RSS (MB)"))
+    directory = tempfile.mkdtemp(prefix="bench_storage_")
+    try:
+        for size in args.sizes:
+            csv_filename = os.path.join(directory, "permits_" + str(size) + ".csv")
+            write_csv(csv_filename, generate_permits(size, datetime.date(2015, 1, 1), datetime.date(2019, 12, 31),
+                                                     seed=args.seed))
+
+            for backend in args.backends:
+                result = run_backend(backend, csv_filename)
+                results[backend + "/" + str(size)] = result
+                rss = result["peak_rss_mb"]
+                print("{:>9} {:>7} {:>9.3f} {:>9.3f} {:>9.3f} {:>9.3f} {:>13}".format(
+                    size, backend, *(result[stage] for stage in STAGES), "-" if rss is None else "{:.1f}".format(rss)))
+            os.remove(csv_filename)
+    finally:
+        shutil.rmtree(directory)
+
+    if args.output:
+        with open(args.output, mode="w") as file:
+            json.dump(results, file, indent=1, sort_keys=True)
+
+    if args.baseline:
+        with open(args.baseline, mode="r") as file:
+            regressions = compare(results, json.load(file))
+        for regression in regressions:
+            print("REGRESSION: " + regression)
+        if regressions:
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
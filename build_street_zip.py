@@ -0,0 +1,183 @@
+import argparse
+import csv
+import os
+import struct
+import sys
+import urllib.request
+import zipfile
+
+from zip_resolver import REFERENCE_FILENAME
+
+
+# The reference file is built from the Census Bureau's TIGER/Line address
+# range features (ADDRFEAT) of Dallas County. Each edge of a street gives
+# the house number range, parity and ZIP+4 of its left and right sides:
+# ----------------------------------------------------------------------
+# FULLNAME         - the street name, e.g. "N Central Expy"
+# LFROMHN, LTOHN   - house number range of the left side
+# RFROMHN, RTOHN   - house number range of the right side
+# PARITYL, PARITYR - "E", "O" or "B" (both)
+# ZIPL, ZIPR       - 5-digit ZIP code of each side
+# PLUS4L, PLUS4R   - +4 of each side (often blank)
+ADDRFEAT_URL = "https://www2.census.gov/geo/tiger/TIGER{year}/ADDRFEAT/tl_{year}_48113_addrfeat.zip"
+DEFAULT_YEAR = 2023
+
+# Dallas County also covers Garland, Irving, Mesquite, etc. City of Dallas
+# ZIP codes start with 752 or 753, so other cities' streets of the same name
+# don't make Dallas addresses ambiguous.
+DALLAS_ZIP_PREFIXES = ("752", "753")
+
+COLUMNS = ["Street", "From", "To", "Parity", "ZIP", "ZIP4"]
+
+
+def read_dbf(file):
+    """
+    Read the records of a dBASE III table (the
+    attributes of a shapefile).
+
+    Parameters
+    ----------
+    file: file object
+        Opened in binary mode.
+
+    Yields
+    ------
+    dict
+        Maps each field name to its value (str,
+        stripped). Deleted records are skipped.
+
+    """
+
+    header = file.read(32)
+    record_count, header_length, record_length = struct.unpack("<IHH", header[4:12])
+
+    fields = []
+    while True:
+        terminator = file.read(1)
+        if terminator in (b"\r", b""):
+            break
+        descriptor = terminator + file.read(31)
+        name = descriptor[:11].split(b"\0")[0].decode("ascii")
+        fields.append((name, descriptor[16]))
+
+    file.read(header_length - 32 * (len(fields) + 1) - 1)  # Rest of the header, if any
+    for _ in range(record_count):
+        record = file.read(record_length)
+        if len(record) < record_length:
+            return
+        if record[:1] == b"*":
+            continue
+        values = {}
+        pos = 1
+        for name, length in fields:
+            values[name] = record[pos:pos + length].decode("utf-8", errors="replace").strip()
+            pos += length
+        yield values
+
+
+def read_addrfeat(filename):
+    """
+    Read the records of an ADDRFEAT download (.zip) or
+    of its extracted .dbf file.
+
+    """
+
+    if filename.lower().endswith(".dbf"):
+        with open(filename, mode="rb") as file:
+            yield from read_dbf(file)
+        return
+
+    with zipfile.ZipFile(filename) as archive:
+        names = [name for name in archive.namelist() if name.lower().endswith(".dbf")]
+        if not names:
+            raise ValueError(filename + " has no .dbf file")
+        with archive.open(names[0]) as file:
+            yield from read_dbf(file)
+
+
+def street_segments(records, zip_prefixes=DALLAS_ZIP_PREFIXES):
+    """
+    Turn ADDRFEAT records into the rows of the reference
+    file, one per side of a street edge. Sides without
+    a numeric house number range or outside
+    @zip_prefixes are left out.
+
+    Yields
+    ------
+    dict
+        Rows with the columns in COLUMNS.
+
+    """
+
+    for record in records:
+        street = record.get("FULLNAME", "")
+        if not street:
+            continue
+        for side in ("L", "R"):
+            low = record.get(side + "FROMHN", "")
+            high = record.get(side + "TOHN", "")
+            zip_code = record.get("ZIP" + side, "")
+            if not (low.isdigit() and high.isdigit() and zip_code.startswith(zip_prefixes)):
+                continue
+            yield {"Street": street, "From": int(low), "To": int(high),
+                   "Parity": record.get("PARITY" + side, "") or "B", "ZIP": zip_code,
+                   "ZIP4": record.get("PLUS4" + side, "")}
+
+
+def build(filenames, output_filename=REFERENCE_FILENAME, zip_prefixes=DALLAS_ZIP_PREFIXES):
+    """
+    Build the reference file of zip_resolver.py from
+    ADDRFEAT files.
+
+    Returns
+    -------
+    tuple
+        A 2-tuple containing the number of rows
+        written and the number of them with a +4
+        (the only ones the resolver uses).
+
+    """
+
+    rows = 0
+    rows_with_plus_4 = 0
+    with open(output_filename, mode="w", newline="") as file:
+        writer = csv.DictWriter(file, fieldnames=COLUMNS)
+        writer.writeheader()
+        for filename in filenames:
+            for row in street_segments(read_addrfeat(filename), zip_prefixes):
+                writer.writerow(row)
+                rows += 1
+                if row["ZIP4"]:
+                    rows_with_plus_4 += 1
+    return rows, rows_with_plus_4
+
+
+def download(year, directory="."):
+    url = ADDRFEAT_URL.format(year=year)
+    filename = os.path.join(directory, url.rsplit("/", 1)[-1])
+    print("Downloading " + url)
+    urllib.request.urlretrieve(url, filename)
+    return filename
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Build " + REFERENCE_FILENAME + " (the offline ZIP code data) from the TIGER/Line "
+                    "address range features of Dallas County.")
+    parser.add_argument("addrfeat", nargs="*",
+                        help="ADDRFEAT .zip or .dbf files. Downloaded (see --year) if none is given.")
+    parser.add_argument("--year", type=int, default=DEFAULT_YEAR, help="TIGER/Line release to download.")
+    parser.add_argument("-o", "--output", default=REFERENCE_FILENAME)
+    args = parser.parse_args()
+
+    filenames = args.addrfeat or [download(args.year)]
+    rows, rows_with_plus_4 = build(filenames, args.output)
+    print(str(rows) + " street segments written to " + args.output + ", " + str(rows_with_plus_4) +
+          " of them with a ZIP+4.")
+    if rows_with_plus_4 == 0:
+        print("ERROR: no segment has a ZIP+4, so the resolver can't resolve any address.")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,153 @@
+import argparse
+import datetime
+import hashlib
+import json
+
+from permit import COLUMNS
+from permit_index import permit_id
+from PoolPermitReaderWriter import iter_permits
+
+
+# Change feed format (one JSON object per line):
+# ---------------------------------------------
+# {"op": "insert", "id": <permit id>, "record": {<column>: <value>, ...}}
+# {"op": "update", "id": <permit id>, "changes": {<column>: [<old value>, <new value>], ...}}
+# {"op": "delete", "id": <permit id>, "record": {<column>: <value>, ...}}
+INSERT = "insert"
+UPDATE = "update"
+DELETE = "delete"
+
+
+def record_hash(row):
+    """
+    Hash of every column of a csv row. Two rows with
+    the same hash have the same values.
+
+    """
+
+    return hashlib.sha1("\x1f".join(row[column] for column in COLUMNS).encode("utf-8")).hexdigest()
+
+
+def insert_change(row):
+    return {"op": INSERT, "id": permit_id(row["Permit URL"]), "record": row}
+
+
+def delete_change(row):
+    return {"op": DELETE, "id": permit_id(row["Permit URL"]), "record": row}
+
+
+def update_change(old_row, new_row):
+    """
+    Return the update change between two versions of
+    a permit, or None if they are the same.
+
+    """
+
+    if record_hash(old_row) == record_hash(new_row):
+        return None
+
+    changes = {column: [old_row[column], new_row[column]]
+               for column in COLUMNS if old_row[column] != new_row[column]}
+    return {"op": UPDATE, "id": permit_id(new_row["Permit URL"]), "changes": changes}
+
+
+def diff(master_permits, new_permits, scope=None):
+    """
+    Compare a fresh scrape or refresh against the master
+    store. The master permits are streamed; only the new
+    permits are held in memory.
+
+    Parameters
+    ----------
+    master_permits: iterable
+        Permits of the master store, e.g. from iter_permits().
+    new_permits: iterable
+        Permits of the new scrape.
+    scope: tuple
+        A 2-tuple of the first and last application date
+        (datetime.date) that the new scrape re-scraped in
+        full, i.e. without skipping the permits already in
+        the master (run_bot() without master_filename).
+        Master permits in that range that are missing from
+        the new scrape were cancelled or removed and are
+        reported as deleted. If None, nothing is deleted.
+        Never pass the range of a scrape that skipped
+        known permits: every one of them would be
+        reported as deleted.
+
+    Yields
+    ------
+    dict
+        The changes, inserts last.
+
+    """
+
+    new_rows = {}
+    for permit in new_permits:
+        new_rows[permit_id(permit.url)] = permit.to_row()
+
+    seen = set()
+    for permit in master_permits:
+        identity = permit_id(permit.url)
+        old_row = permit.to_row()
+        if identity in new_rows:
+            seen.add(identity)
+            change = update_change(old_row, new_rows[identity])
+            if change is not None:
+                yield change
+        elif scope is not None and isinstance(permit.application_date, datetime.date) and \
+                scope[0] <= permit.application_date <= scope[1]:
+            yield delete_change(old_row)
+
+    for identity, row in new_rows.items():
+        if identity not in seen:
+            yield insert_change(row)
+
+
+def write_change_feed(changes, filename):
+    """
+    Write changes to a JSONL file. The file is always
+    written, empty if there are no changes, so a feed
+    left by a previous run is never imported again.
+    None changes (from update_change()) are skipped.
+
+    Returns
+    -------
+    int
+        The number of changes written.
+
+    """
+
+    count = 0
+    with open(filename, mode="w") as file:
+        for change in changes:
+            if change is None:
+                continue
+            file.write(json.dumps(change) + "\n")
+            count += 1
+    return count
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Write the change feed between a master permit file and a new scrape.")
+    parser.add_argument("master_csv")
+    parser.add_argument("new_csv")
+    parser.add_argument("-o", "--output", required=True, help="Path to the JSONL change feed.")
+    parser.add_argument("--deletes-in", nargs=2, metavar=("START", "END"),
+                        help="Application date range (mm/dd/yyyy) that the new scrape re-scraped in full. "
+                             "Master permits in it that are missing from the new scrape are reported as "
+                             "deleted. By default nothing is reported as deleted.")
+    args = parser.parse_args()
+
+    scope = None
+    if args.deletes_in:
+        scope = tuple(datetime.datetime.strptime(date, "%m/%d/%Y").date() for date in args.deletes_in)
+
+    changes = diff((permit for _, permit in iter_permits(args.master_csv)),
+                   (permit for _, permit in iter_permits(args.new_csv)), scope)
+    count = write_change_feed(changes, args.output)
+    print(str(count) + " changes written to " + args.output if count else "No changes.")
+
+
+if __name__ == "__main__":
+    main()
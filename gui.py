@@ -1,13 +1,25 @@
 import datetime
 import os
 import threading
+import time
 from enum import Enum
 from tkinter import *
 from tkinter import filedialog
 from tkinter import messagebox
 from tkinter import ttk
 
-import web_driver
+from progress import ProgressReporter
+from progress import ProgressTracker
+
+
+# web_driver (and through it selenium, bs4, aiohttp and requests) is only
+# imported when a job starts, in the job's worker thread, so the window
+# opens without waiting for them.
+
+# Set by bench_startup.py. The app prints the time its window is up (and,
+# if set to "first-page", the time the permit search page has loaded in
+# the browser) and exits.
+STARTUP_BENCHMARK_VARIABLE = "POOL_PERMIT_STARTUP_BENCHMARK"
 
 
 class Status(Enum):
@@ -31,6 +43,7 @@ class Title:
 class Form:
     def __init__(self, master):
         self.filename = "No file chosen."
+        self.filenames = []
 
         self.frame = Frame(master)
         self.frame.pack()
@@ -45,6 +58,12 @@ class Form:
 
         self.button_choose_file = ttk.Button(self.frame, text="Choose file", command=self.get_filename)
 
+        # If checked, "Run Bot" adds the new permits to the chosen master
+        # file or store, skipping the permits already in it
+        self.add_to_master = IntVar()
+        self.check_add_to_master = Checkbutton(self.frame, text="Add new permits to the chosen file",
+                                               variable=self.add_to_master)
+
         # Grid setup
         self.label_start.grid(row=0, sticky=E)
         self.label_end.grid(row=1, sticky=E)
@@ -59,13 +78,20 @@ class Form:
         self.entry_end.bind("<Button-1>", lambda event: self.clear_placeholder(event, self.entry_end))
 
         self.button_choose_file.grid(row=2, column=2)
+        self.check_add_to_master.grid(row=3, column=1, columnspan=2, sticky=W)
 
     def get_filename(self):
-        self.filename = filedialog.askopenfilename(initialdir=os.path.expanduser("~/Desktop/"),
-                                                   title="Choose file",
-                                                   filetypes=(("csv files", "*.csv"),))
-        if self.filename == "":
+        # Several files can be chosen to update them in one batch
+        self.filenames = list(filedialog.askopenfilenames(initialdir=os.path.expanduser("~/Desktop/"),
+                                                          title="Choose file",
+                                                          filetypes=(("csv files", "*.csv"),
+                                                                     ("permit store manifest", "manifest.json"))))
+        if len(self.filenames) == 0:
             self.filename = "No file chosen."
+        elif len(self.filenames) == 1:
+            self.filename = self.filenames[0]
+        else:
+            self.filename = str(len(self.filenames)) + " files chosen."
         self.label_filename.config(text=self.filename)
 
     def clear_placeholder(self, event, entry):
@@ -74,10 +100,16 @@ class Form:
 
 
 class RunBotButtons:
+    # How often (in milliseconds) the Tk main loop drains progress events
+    PROGRESS_POLL_INTERVAL_MS = 250
+
     def __init__(self, master, form):
+        self.master = master
         self.status_bar = None
         self.status = Status.NORMAL
         self.form = form
+        self.progress = None
+        self.progress_tracker = None
 
         self.frame = Frame(master)
         self.frame.pack()
@@ -122,28 +154,38 @@ class RunBotButtons:
         if not formatted_date_range:
             self.button_run.config(state=NORMAL)
             return
-        else:
-            start_datetime, end_datetime, delta = formatted_date_range
-            run_bot_thread = threading.Thread(target=self.run_bot, args=(start_datetime, end_datetime, delta,))
-            run_bot_thread.start()
 
-    def run_bot(self, start_datetime, end_datetime, delta):
+        master_filename = None
+        if self.form.add_to_master.get():
+            if len(self.form.filenames) != 1:
+                messagebox.showwarning(title="No File Chosen",
+                                       message="Please choose one file to add the new permits to and try again.")
+                self.button_run.config(state=NORMAL)
+                return
+            master_filename = self.form.filenames[0]
+
+        start_datetime, end_datetime, delta = formatted_date_range
+        self.start_progress(Status.BOT_IS_RUNNING)
+        run_bot_thread = threading.Thread(target=self.run_bot,
+                                          args=(start_datetime, end_datetime, delta, master_filename,))
+        run_bot_thread.start()
+
+    def run_bot(self, start_datetime, end_datetime, delta, master_filename=None):
         """
-        Executes web_driver.run_bot(). When the
-        function finishes executing, the "Run Bot"
-        button will be re-enabled.
+        Executes web_driver.run_bot(). Runs in a worker
+        thread, so it must not touch any Tk widget. The
+        result is published as a progress event and the
+        "Run Bot" button is re-enabled by the main loop.
 
         """
 
-        if self.status_bar is not None:
-            self.status_bar.change_status_message(Status.BOT_IS_RUNNING)
-
-        if not web_driver.run_bot(start_datetime, end_datetime, delta):
-            self.status_bar.change_status_message(Status.BOT_ERROR)
-        else:
-            if self.status_bar is not None:
-                self.status_bar.change_status_message(Status.BOT_STOPPED_RUNNING)
-        self.button_run.config(state=NORMAL)
+        success = False
+        try:
+            import web_driver
+            success = web_driver.run_bot(start_datetime, end_datetime, delta, self.progress,
+                                         master_filename=master_filename)
+        finally:
+            self.progress.finished(success)
 
     def update_file_thread(self):
         """
@@ -161,26 +203,79 @@ class RunBotButtons:
             self.button_update.config(state=NORMAL)
             return
 
-        update_file_thread = threading.Thread(target=self.update_file)
+        self.start_progress(Status.BOT_IS_UPDATING_FILE)
+        update_file_thread = threading.Thread(target=self.update_file, args=(self.form.filenames,))
         update_file_thread.start()
 
-    def update_file(self):
+    def update_file(self, filenames):
         """
-        Executes web_driver.update_file(). When the
-        function finishes executing. the "Update File"
-        button will be re-enabled.
+        Executes web_driver.update_file(), or
+        web_driver.update_files() if several files were
+        chosen. Runs in a worker thread, so it must not
+        touch any Tk widget. The result is published as
+        a progress event and the "Update File" button is
+        re-enabled by the main loop.
 
         """
 
+        success = False
+        try:
+            import web_driver
+            if len(filenames) == 1:
+                success = web_driver.update_file(filenames[0], self.progress)
+            else:
+                success = web_driver.update_files(filenames, self.progress)
+        finally:
+            self.progress.finished(success)
+
+    def start_progress(self, status):
+        """
+        Set up a fresh ProgressReporter for the job that
+        is about to start and begin polling it from the
+        Tk main loop. Must be called from the main thread.
+
+        Parameters
+        ----------
+        status: Status
+            Either Status.BOT_IS_RUNNING or
+            Status.BOT_IS_UPDATING_FILE.
+
+        """
+
+        self.status = status
+        self.progress = ProgressReporter()
+        self.progress_tracker = ProgressTracker()
         if self.status_bar is not None:
-            self.status_bar.change_status_message(Status.BOT_IS_UPDATING_FILE)
+            self.status_bar.change_status_message(status)
+        self.master.after(self.PROGRESS_POLL_INTERVAL_MS, self.poll_progress)
 
-        if not web_driver.update_file(self.form.label_filename.cget("text")):
-            self.status_bar.change_status_message(Status.BOT_ERROR)
-        else:
+    def poll_progress(self):
+        """
+        Drain the progress events published by the worker
+        thread and refresh the status bar. Reschedules
+        itself with after() until the job has finished.
+
+        """
+
+        for event, value, timestamp in self.progress.drain():
+            self.progress_tracker.apply(event, value, timestamp)
+
+        if not self.progress_tracker.finished:
             if self.status_bar is not None:
-                self.status_bar.change_status_message(Status.BOT_STOPPED_UPDATING_FILE)
-        self.button_update.config(state=NORMAL)
+                self.status_bar.show_progress(self.progress_tracker)
+            self.master.after(self.PROGRESS_POLL_INTERVAL_MS, self.poll_progress)
+            return
+
+        if self.status == Status.BOT_IS_RUNNING:
+            finished_status = Status.BOT_STOPPED_RUNNING
+            self.button_run.config(state=NORMAL)
+        else:
+            finished_status = Status.BOT_STOPPED_UPDATING_FILE
+            self.button_update.config(state=NORMAL)
+
+        self.status = finished_status if self.progress_tracker.success else Status.BOT_ERROR
+        if self.status_bar is not None:
+            self.status_bar.change_status_message(self.status)
 
     def check_date_format(self):
         """
@@ -278,6 +373,19 @@ class StatusBar:
                                     "Please keep the browser window open when running the bot and make sure you have\n"
                                     "internet connection.")
 
+    def show_progress(self, tracker):
+        """
+        Display the live progress of the running job.
+
+        Parameters
+        ----------
+        tracker: ProgressTracker
+            Counters, rate and ETA of the running job.
+
+        """
+
+        self.status.config(text=tracker.status_message())
+
 
 class DateRangeInvalid(Exception):
     def __init__(self):
@@ -295,8 +403,35 @@ def main():
     status_bar = StatusBar(root)
     run_bot.set_status_bar_object(status_bar)
 
+    benchmark = os.environ.get(STARTUP_BENCHMARK_VARIABLE)
+    if benchmark:
+        root.after_idle(report_startup, root, benchmark)
+
     root.mainloop()
 
 
+def report_startup(root, benchmark):
+    """
+    Print the startup timestamps read by bench_startup.py
+    and close the app.
+
+    """
+
+    root.update()
+    print("window " + repr(time.time()), flush=True)
+
+    if benchmark == "first-page":
+        import page_selectors
+        import web_driver
+        driver = web_driver.start_driver()
+        try:
+            driver.get(page_selectors.SEARCH_URL)
+            print("first-page " + repr(time.time()), flush=True)
+        finally:
+            driver.quit()
+
+    root.destroy()
+
+
 if __name__ == "__main__":
     main()
@@ -1,16 +1,33 @@
 # -*- mode: python ; coding: utf-8 -*-
 
+import os
+
 block_cipher = None
 
+# Reference data of the offline ZIP resolver (see zip_resolver.py). The app
+# refuses to run without it, so don't build one that lacks it.
+if not os.path.exists("dallas_street_zip.csv"):
+    raise SystemExit("ERROR: dallas_street_zip.csv not found. Build it with build_street_zip.py first.")
+datas = [("dallas_street_zip.csv", ".")]
+
 
 a = Analysis(['gui.py'],
              pathex=['/Users/andyx/PycharmProjects/PoolPermitScraper'],
              binaries=[("chromedriver", ".")],
-             datas=[],
+             datas=datas,
              hiddenimports=[],
              hookspath=[],
              runtime_hooks=[],
-             excludes=[],
+             # Only modules the app never imports. pyarrow and zstandard are only
+             # imported by the Parquet, Arrow and compressed JSONL outputs of
+             # permit_output.py, which the app doesn't offer (it never passes
+             # output_formats to run_bot()); the permit store only uses csv and
+             # json. pandas and numpy are only used by reports.py and sqlite3 by
+             # work_queue.py, command line tools the app doesn't import.
+             # BeautifulSoup is always given "html.parser" (scraper.py), and the
+             # rest are optional extras or dev tools.
+             excludes=['pyarrow', 'zstandard', 'pandas', 'numpy', 'sqlite3',
+                       'lxml', 'html5lib', 'matplotlib', 'scipy', 'IPython', 'tkinter.test', 'lib2to3'],
              win_no_prefer_redirects=False,
              win_private_assemblies=False,
              cipher=block_cipher,
@@ -0,0 +1,244 @@
+import argparse
+import os
+import re
+
+from selenium.common.exceptions import NoSuchElementException
+
+
+SEARCH_URL = "https://developdallas.dallascityhall.com/Default.aspx?PossePresentation=ByAppDate"
+ZIP_LOOKUP_URL = "https://tools.usps.com/zip-code-lookup.htm?byaddress"
+
+# Fields of a permit page, read with BeautifulSoup by scraper.py and with
+# XPath by web_driver.py. Each field is a span whose id contains one of
+# these substrings, in order of preference.
+PERMIT_FIELDS = {
+    "status": ["PWebPermitStatus", "PermitStatus"],
+    "address": ["AddressDisplay", "SiteAddress"],
+    "application_date": ["CreatedDate", "ApplicationDate"],
+    "completed_date": ["CompletedDate", "CompleteDate"],
+    "applicant": ["WebApplicantDisplay", "ApplicantDisplay"],
+    "contractor": ["WebContractorDisplay", "ContractorDisplay"],
+    "job_value": ["JobValue"],
+}
+
+# Class of the div holding the full address on the USPS result page
+ZIP_RESULT_CLASS = "zipcode-result-address"
+
+PERMIT_GRID = "//div[@id='ctl00_cphPaneBand_pnlPaneBand'][@class='datazone']"
+
+# Every element the scraper looks for, by name, with fallback XPaths in
+# order of preference. Names starting with "row." are relative to a row
+# of the result grid.
+SELECTORS = {
+    # Permit search form
+    "search.application_date": ["//input[@id='CreatedDate_1209113_S0']",
+                                "//input[contains(@id, 'CreatedDate')][contains(@id, '_S0')]"],
+    "search.application_date_end": ["//input[@id='CreatedDate_1209113_S1']",
+                                    "//input[contains(@id, 'CreatedDate')][contains(@id, '_S1')]"],
+    "search.application_type": ["//select[@name='JobApplicationTypeSearch_1209113_S0']",
+                                "//select[contains(@name, 'JobApplicationTypeSearch')]"],
+    "search.search_button": ["//input[@value='Search']",
+                             "//input[@type='submit'][contains(@value, 'Search')]"],
+
+    # Search results (see EC_permit_result.py)
+    "results.single_title": ["//div[@id='ctl00_cphTitleBand_pnlTitleBand']/div[1]/span[1]",
+                             "//div[contains(@id, 'pnlTitleBand')]//span[contains(., 'Master Permit')]"],
+    "results.search_again_button": ["//input[@value='Search Again']",
+                                    "//input[contains(@value, 'Search Again')]"],
+    "results.no_result": ["//center[@class='posseerror']",
+                          "//center[contains(@class, 'posseerror')]"],
+    "results.grid": [PERMIT_GRID,
+                     "//div[contains(@id, 'pnlPaneBand')][contains(@class, 'datazone')]"],
+    "results.rows": [PERMIT_GRID + "//tr[@class='possegrid'][@style='cursor: pointer;']",
+                     "//div[contains(@class, 'datazone')]//tr[contains(@class, 'possegrid')][.//input[@value='View']]"],
+    # The grid is paged by an ASP.NET pager. The link to the next page is
+    # either a "Next"/">" link or the page number after the current page
+    # (rendered as a span instead of a link). The page numbers are either in
+    # a cell each or side by side in one cell. Only links in the pager row
+    # are matched, so nothing is found on the last page.
+    "results.next_page": [PERMIT_GRID + "//tr[contains(@class, 'pager')]//a[normalize-space(.)='Next' or "
+                                        "normalize-space(.)='>']",
+                          PERMIT_GRID + "//tr[contains(@class, 'pager')]//span/ancestor::td[1]/following-sibling::td[1]/a",
+                          PERMIT_GRID + "//tr[contains(@class, 'pager')]//span/following-sibling::a[1]"],
+    # Shown instead of (or above) the grid when a search has too many results
+    "results.truncated": ["//*[contains(@class, 'posseerror') or contains(@class, 'possewarning')]"
+                          "[contains(., 'more than') or contains(., 'exceed') or contains(., 'narrow your search')]"],
+    "row.status": [".//span[contains(@id, 'PWebPermitStatus')]", ".//span[contains(@id, 'PermitStatus')]"],
+    "row.street_name": [".//span[contains(@id, 'StreetName')]"],
+    "row.view_button": [".//input[@value='View']", ".//input[contains(@onclick, 'location.href')]"],
+
+    # USPS ZIP code lookup form and results (see EC_zip_code_result.py)
+    "zip.address": ["//input[@id='tAddress']", "//input[@name='tAddress']"],
+    "zip.city": ["//input[@id='tCity']", "//input[contains(@name, 'City')]"],
+    "zip.state": ["//select[@id='tState']", "//select[contains(@name, 'State')]"],
+    "zip.find_button": ["//a[@id='zip-by-address']", "//a[contains(@id, 'zip-by-address')]"],
+    "zip.error": ["//div[@class='server-error address-tAddress help-block']",
+                  "//div[contains(@class, 'server-error')][contains(@class, 'address-tAddress')]"],
+    "zip.result": ["//div[@class='" + ZIP_RESULT_CLASS + "']",
+                   "//div[contains(@class, '" + ZIP_RESULT_CLASS + "')]"],
+}
+SELECTORS.update(("permit." + field, ["//span[contains(@id, '" + id_part + "')]" for id_part in id_parts])
+                 for field, id_parts in PERMIT_FIELDS.items())
+
+# Pages checked by check_layout(): their URL (None if it depends on the
+# permit) and the selectors that must match on them.
+SEARCH_PAGE = "search"
+ZIP_LOOKUP_PAGE = "zip"
+PERMIT_PAGE = "permit"
+PAGES = {
+    SEARCH_PAGE: (SEARCH_URL, ["search.application_date", "search.application_type", "search.search_button"]),
+    ZIP_LOOKUP_PAGE: (ZIP_LOOKUP_URL, ["zip.address", "zip.city", "zip.state", "zip.find_button"]),
+    PERMIT_PAGE: (None, ["results.single_title", "permit.status", "permit.application_date",
+                         "permit.completed_date"]),
+}
+
+# Index of the XPath that last matched, by selector name. Tried first the
+# next time, so a fallback that works is used straight away from then on.
+preferred = {}
+
+
+class LayoutChanged(NoSuchElementException):
+    def __init__(self, page, missing):
+        super().__init__("Layout of the " + page + " page has changed. Not found: " + ", ".join(missing))
+        self.page = page
+        self.missing = missing
+
+
+def ordered_xpaths(name):
+    xpaths = SELECTORS[name]
+    first = preferred.get(name, 0)
+    return [xpaths[first]] + xpaths[:first] + xpaths[first + 1:]
+
+
+def find(context, name):
+    """
+    Find the element of selector @name, trying its
+    XPaths in order.
+
+    Parameters
+    ----------
+    context: WebDriver or WebElement
+        Where to search. Must be an element for the
+        "row." selectors.
+    name: str
+        Key of SELECTORS.
+
+    Raises
+    ------
+    NoSuchElementException
+        If none of the XPaths match.
+
+    """
+
+    elements = find_all(context, name)
+    if not elements:
+        raise NoSuchElementException("No element found for selector " + name)
+    return elements[0]
+
+
+def find_all(context, name):
+    """
+    Find the elements of the first XPath of selector
+    @name that matches anything. Doesn't wait: an
+    empty list is returned straight away if nothing
+    matches.
+
+    """
+
+    for xpath in ordered_xpaths(name):
+        elements = context.find_elements_by_xpath(xpath)
+        if elements:
+            preferred[name] = SELECTORS[name].index(xpath)
+            return elements
+    return []
+
+
+def find_span(soup, field):
+    """
+    Find a field of a permit page in the BeautifulSoup
+    of the page, trying the id parts of @field in order.
+
+    Returns
+    -------
+    Tag
+        The span, or None if none matches.
+
+    """
+
+    for id_part in PERMIT_FIELDS[field]:
+        span = soup.find("span", id=re.compile(re.escape(id_part)))
+        if span is not None:
+            return span
+    return None
+
+
+def missing_selectors(driver, page):
+    """
+    Names of the required selectors of @page that
+    match nothing on the page currently displayed.
+
+    """
+
+    _, names = PAGES[page]
+    return [name for name in names if not find_all(driver, name)]
+
+
+def check_layout(driver, page, url=None):
+    """
+    Load @page and check that its required selectors
+    all match, so a run fails in about a second if the
+    site's layout has changed, instead of waiting for a
+    timeout on every page.
+
+    Parameters
+    ----------
+    driver: WebDriver
+    page: str
+        One of the keys of PAGES.
+    url: str
+        URL to load instead of the page's URL, e.g.
+        the URL of a permit or a recorded copy of the
+        page (file:///...).
+
+    Raises
+    ------
+    LayoutChanged
+        If a required selector matches nothing.
+
+    """
+
+    driver.get(url or PAGES[page][0])
+    missing = missing_selectors(driver, page)
+    if missing:
+        raise LayoutChanged(page, missing)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Check the selectors against the live site or recorded pages.")
+    parser.add_argument("--recorded", nargs=2, action="append", default=[], metavar=("PAGE", "HTML_FILE"),
+                        help="Check a saved copy of a page (" + ", ".join(PAGES) + ") instead of the live one.")
+    parser.add_argument("--permit-url", help="URL of a permit page to check.")
+    args = parser.parse_args()
+
+    import web_driver
+
+    urls = {SEARCH_PAGE: None, ZIP_LOOKUP_PAGE: None}
+    if args.permit_url:
+        urls[PERMIT_PAGE] = args.permit_url
+    for page, html_file in args.recorded:
+        urls[page] = "file://" + os.path.abspath(html_file)
+
+    driver = web_driver.start_driver()
+    try:
+        for page, url in urls.items():
+            try:
+                check_layout(driver, page, url)
+                print(page + ": OK")
+            except LayoutChanged as error:
+                print(page + ": " + error.msg)
+    finally:
+        web_driver.close_driver(driver)
+
+
+if __name__ == "__main__":
+    main()
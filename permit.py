@@ -0,0 +1,227 @@
+import datetime
+import re
+
+from address import canonical_address
+
+
+# Columns of the permit csv files, in order
+COLUMNS = ["Application Date", "Completed Date", "Address", "Applicant", "Contractor", "Job Value Cost", "Permit URL",
+           "Permit Type"]
+
+# Value of the "Application Type" search field for pool permits. Files
+# written before the "Permit Type" column existed only contain these.
+DEFAULT_PERMIT_TYPE = "Swimming Pool Permit"
+
+# Dates are displayed on the permit pages as: mmm dd, yyyy
+DATE_FORMAT = "%b %d, %Y"
+
+# Other date formats seen in the date columns (e.g. files edited in Excel).
+# Dates in these formats are kept as text in a Permit, so the file is
+# written back unchanged, but as_date() still reads them.
+DATE_FORMATS = (DATE_FORMAT, "%B %d, %Y", "%m/%d/%Y", "%Y-%m-%d")
+
+ZIP_CODE_PATTERN = re.compile(r"\b(\d{5})(?:-\d{4})?\s*$")
+
+
+def parse_date(text):
+    """
+    Parse a date column of the csv file.
+
+    Parameters
+    ----------
+    text: str
+        Date as displayed on the permit page.
+
+    Returns
+    -------
+    datetime.date or str
+        None if @text is empty. The parsed date if it
+        formats back to exactly @text, otherwise @text
+        itself so no information is lost.
+
+    """
+
+    if text == "":
+        return None
+    try:
+        date = datetime.datetime.strptime(text, DATE_FORMAT).date()
+    except ValueError:
+        return text
+    return date if date.strftime(DATE_FORMAT) == text else text
+
+
+def as_date(value):
+    """
+    Read a date of a Permit as a datetime.date.
+
+    Parameters
+    ----------
+    value: datetime.date or str
+        A parsed date, or a date kept as text by
+        parse_date().
+
+    Returns
+    -------
+    datetime.date
+        The date, or None if @value is missing
+        or not in one of DATE_FORMATS.
+
+    """
+
+    if isinstance(value, datetime.date):
+        return value
+    if not value:
+        return None
+
+    text = value.strip()
+    for date_format in DATE_FORMATS:
+        try:
+            return datetime.datetime.strptime(text, date_format).date()
+        except ValueError:
+            continue
+    return None
+
+
+def format_date(value):
+    if value is None:
+        return ""
+    if isinstance(value, datetime.date):
+        return value.strftime(DATE_FORMAT)
+    return value
+
+
+def parse_job_value(text):
+    """
+    Parse the "Job Value Cost" column, e.g. "$12,500.00".
+
+    Returns
+    -------
+    float or str
+        None if @text is empty. The dollar amount if it
+        formats back to exactly @text, otherwise @text
+        itself so no information is lost.
+
+    """
+
+    if text == "":
+        return None
+    try:
+        value = float(text.replace("$", "").replace(",", ""))
+    except ValueError:
+        return text
+    return value if format_job_value(value) == text else text
+
+
+def format_job_value(value):
+    if value is None:
+        return ""
+    if isinstance(value, float):
+        return "${:,.2f}".format(value)
+    return value
+
+
+class Permit:
+    """
+    A single permit. Uses __slots__ so the tens of
+    thousands of permits of a multi-year master file
+    take far less memory than one dict per row.
+
+    Dates are datetime.date and the job value is a
+    float whenever the csv text can be reproduced
+    exactly from them. Otherwise (unexpected formats)
+    the original text is kept, so to_row() always
+    gives back the row that from_row() was given.
+
+    """
+
+    __slots__ = ("application_date", "completed_date", "address", "applicant", "contractor", "job_value", "url",
+                 "permit_type")
+
+    def __init__(self, application_date, completed_date, address, applicant, contractor, job_value, url,
+                 permit_type=DEFAULT_PERMIT_TYPE):
+        self.application_date = application_date
+        self.completed_date = completed_date
+        self.address = address
+        self.applicant = applicant
+        self.contractor = contractor
+        self.job_value = job_value
+        self.url = url
+        self.permit_type = permit_type
+
+    @classmethod
+    def from_row(cls, row):
+        """
+        Create a Permit from a csv row.
+
+        Parameters
+        ----------
+        row: dict
+            A row with the csv columns as keys. The
+            "Permit Type" column may be missing.
+
+        """
+
+        return cls(parse_date(row["Application Date"]),
+                   parse_date(row["Completed Date"]),
+                   row["Address"],
+                   row["Applicant"],
+                   row["Contractor"],
+                   parse_job_value(row["Job Value Cost"]),
+                   row["Permit URL"],
+                   row.get("Permit Type") or DEFAULT_PERMIT_TYPE)
+
+    def to_row(self):
+        """
+        Convert the Permit back to a csv row.
+
+        Returns
+        -------
+        dict
+            A row with the csv columns as keys.
+
+        """
+
+        return {
+            "Application Date": format_date(self.application_date),
+            "Completed Date": format_date(self.completed_date),
+            "Address": self.address,
+            "Applicant": self.applicant,
+            "Contractor": self.contractor,
+            "Job Value Cost": format_job_value(self.job_value),
+            "Permit URL": self.url,
+            "Permit Type": self.permit_type
+        }
+
+    @property
+    def is_completed(self):
+        return self.completed_date is not None
+
+    def set_completed_date(self, text):
+        self.completed_date = parse_date(text)
+
+    @property
+    def normalized_address(self):
+        return canonical_address(self.address)
+
+    @property
+    def zip_code(self):
+        """
+        The 5-digit ZIP code at the end of the address,
+        or None if the address doesn't have one (yet).
+
+        """
+
+        match = ZIP_CODE_PATTERN.search(self.address)
+        return match.group(1) if match else None
+
+    def __eq__(self, other):
+        if not isinstance(other, Permit):
+            return NotImplemented
+        return all(getattr(self, name) == getattr(other, name) for name in self.__slots__)
+
+    # Permits are updated in place (address, completed date), so they are
+    # intentionally unhashable. Key sets and dicts by permit_id(permit.url).
+    __hash__ = None
+
+    def __repr__(self):
+        return "Permit(" + repr(self.url) + ")"
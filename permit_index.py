@@ -0,0 +1,126 @@
+import csv
+import os
+from urllib.parse import parse_qs
+from urllib.parse import urlparse
+
+
+def permit_id(permit_url):
+    """
+    Return the identity of a permit from its URL.
+
+    Permit pages are addressed by their POSSE object id
+    (the PosseObjectId query parameter), which stays the
+    same between runs even if the rest of the URL (e.g.
+    the presentation name) differs. URLs without an
+    object id are identified by the URL itself.
+
+    Parameters
+    ----------
+    permit_url: str
+        The URL displaying the permit info.
+
+    Returns
+    -------
+    str
+        The permit's identity.
+
+    """
+
+    permit_url = permit_url.strip()
+    query = parse_qs(urlparse(permit_url).query)
+    for key, values in query.items():
+        if key.lower() == "posseobjectid" and values:
+            return values[0]
+    return permit_url
+
+
+class PermitIndex:
+    def __init__(self, permit_ids=()):
+        """
+        Initialize a PermitIndex object. The index is
+        the set of permits already saved in a master
+        file or store (see for_master()), so a run that
+        adds to the master can skip fetching them.
+
+        Parameters
+        ----------
+        permit_ids: iterable
+            Identities of the permits (see permit_id()).
+
+        """
+
+        self.permit_ids = set(permit_ids)
+
+    @classmethod
+    def for_master(cls, filename, start_date=None, end_date=None):
+        """
+        Index the permits of a master csv file or of a
+        PartitionedStore. Only the permit ids are kept
+        in memory.
+
+        Parameters
+        ----------
+        filename: str
+            Path to the master csv file, or to a store
+            directory or its manifest.json. None gives
+            an empty index.
+        start_date, end_date: datetime.date
+            Only needed for a store: only the shards of
+            the months between them are read, since a
+            search only finds permits with an application
+            date in its range.
+
+        """
+
+        from permit_store import PartitionedStore
+        from permit_store import is_store
+
+        index = cls()
+        if filename is None:
+            return index
+        if is_store(filename):
+            index.add_permits(PartitionedStore(filename).iter_permits(start_date, end_date))
+        elif os.path.exists(filename):
+            index.add_permits_from_csv(filename)
+        return index
+
+    def __contains__(self, permit_url):
+        return permit_id(permit_url) in self.permit_ids
+
+    def __len__(self):
+        return len(self.permit_ids)
+
+    def add(self, permit_url):
+        self.permit_ids.add(permit_id(permit_url))
+
+    def add_permits(self, permits):
+        for permit in permits:
+            self.add(permit.url)
+
+    def add_permits_from_csv(self, csv_filename):
+        """
+        Add every permit of an existing csv file (e.g.
+        a master file) to the index.
+
+        """
+
+        with open(csv_filename, mode="r") as file:
+            for row in csv.DictReader(file):
+                self.add(row["Permit URL"])
+
+    def filter_unseen(self, links):
+        """
+        Return the links from @links whose permits
+        aren't in the index yet, without duplicates.
+
+        """
+
+        unseen = []
+        seen_in_links = set()
+        for link in links:
+            identity = permit_id(link)
+            if identity in self.permit_ids or identity in seen_in_links:
+                continue
+            seen_in_links.add(identity)
+            unseen.append(link)
+        return unseen
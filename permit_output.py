@@ -0,0 +1,303 @@
+import abc
+import csv
+import datetime
+import importlib.util
+import io
+import json
+import os
+
+from permit import COLUMNS
+
+
+# Output formats, chosen by the extension of the output file
+CSV = ".csv"
+PARQUET = ".parquet"
+ARROW = ".arrow"
+JSONL_ZSTD = ".jsonl.zst"
+FORMATS = (CSV, PARQUET, ARROW, JSONL_ZSTD)
+
+# Optional module needed by each format
+REQUIREMENTS = {PARQUET: "pyarrow", ARROW: "pyarrow", JSONL_ZSTD: "zstandard"}
+
+DEFAULT_BATCH_SIZE = 10000
+
+
+def permit_record(permit):
+    """
+    Convert a permit to a typed record: dates as ISO
+    strings (or None) and the job value as a number
+    (or None). Dates or job values that couldn't be
+    parsed from the permit page are None.
+
+    """
+
+    def iso(value):
+        return value.isoformat() if isinstance(value, datetime.date) else None
+
+    return {
+        "application_date": iso(permit.application_date),
+        "completed_date": iso(permit.completed_date),
+        "address": permit.address,
+        "zip_code": permit.zip_code,
+        "applicant": permit.applicant,
+        "contractor": permit.contractor,
+        "job_value": permit.job_value if isinstance(permit.job_value, float) else None,
+        "permit_url": permit.url,
+        "permit_type": permit.permit_type,
+    }
+
+
+class PermitOutput(abc.ABC):
+    def __init__(self, filename, batch_size=DEFAULT_BATCH_SIZE):
+        """
+        Base class of the output writers. Permits are
+        buffered and handed to write_batch() every
+        @batch_size permits, so a long run writes as it
+        goes and never holds more than one batch.
+
+        Parameters
+        ----------
+        filename: str
+            Path to the output file.
+        batch_size: int
+            Number of permits per batch (row group
+            for the columnar formats).
+
+        """
+
+        self.filename = filename
+        self.batch_size = batch_size
+        self.batch = []
+
+    def write(self, permit):
+        self.batch.append(permit)
+        if len(self.batch) >= self.batch_size:
+            self.flush()
+
+    def write_permits(self, permits):
+        for permit in permits:
+            self.write(permit)
+
+    def flush(self):
+        if self.batch:
+            self.write_batch(self.batch)
+            self.batch = []
+
+    @abc.abstractmethod
+    def write_batch(self, permits):
+        pass
+
+    def close(self):
+        self.flush()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+
+class CsvOutput(PermitOutput):
+    def __init__(self, filename, batch_size=DEFAULT_BATCH_SIZE):
+        super().__init__(filename, batch_size)
+        self.file = open(filename, mode="w", newline="")
+        self.writer = csv.DictWriter(self.file, fieldnames=COLUMNS)
+        self.writer.writeheader()
+
+    def write_batch(self, permits):
+        self.writer.writerows(permit.to_row() for permit in permits)
+
+    def close(self):
+        super().close()
+        self.file.close()
+
+
+def _import_pyarrow():
+    try:
+        import pyarrow
+    except ImportError:
+        raise ImportError("Parquet and Arrow output need pyarrow. Install it with: pip install pyarrow")
+    return pyarrow
+
+
+class _ArrowOutput(PermitOutput):
+    def __init__(self, filename, batch_size=DEFAULT_BATCH_SIZE):
+        super().__init__(filename, batch_size)
+        self.pa = _import_pyarrow()
+        self.schema = self.pa.schema([
+            ("application_date", self.pa.date32()),
+            ("completed_date", self.pa.date32()),
+            ("address", self.pa.string()),
+            ("zip_code", self.pa.string()),
+            ("applicant", self.pa.string()),
+            ("contractor", self.pa.string()),
+            ("job_value", self.pa.float64()),
+            ("permit_url", self.pa.string()),
+            ("permit_type", self.pa.string()),
+        ])
+
+    def to_record_batch(self, permits):
+        def date_or_none(value):
+            return value if isinstance(value, datetime.date) else None
+
+        columns = [
+            [date_or_none(permit.application_date) for permit in permits],
+            [date_or_none(permit.completed_date) for permit in permits],
+            [permit.address for permit in permits],
+            [permit.zip_code for permit in permits],
+            [permit.applicant for permit in permits],
+            [permit.contractor for permit in permits],
+            [permit.job_value if isinstance(permit.job_value, float) else None for permit in permits],
+            [permit.url for permit in permits],
+            [permit.permit_type for permit in permits],
+        ]
+        return self.pa.record_batch([self.pa.array(column, type=field.type)
+                                     for column, field in zip(columns, self.schema)], schema=self.schema)
+
+
+class ParquetOutput(_ArrowOutput):
+    def __init__(self, filename, batch_size=DEFAULT_BATCH_SIZE):
+        super().__init__(filename, batch_size)
+        import pyarrow.parquet
+        self.writer = pyarrow.parquet.ParquetWriter(filename, self.schema, compression="zstd")
+
+    def write_batch(self, permits):
+        # Each batch becomes one row group
+        self.writer.write_table(self.pa.Table.from_batches([self.to_record_batch(permits)]))
+
+    def close(self):
+        super().close()
+        self.writer.close()
+
+
+class ArrowOutput(_ArrowOutput):
+    def __init__(self, filename, batch_size=DEFAULT_BATCH_SIZE):
+        super().__init__(filename, batch_size)
+        import pyarrow.ipc
+        self.sink = self.pa.OSFile(filename, "wb")
+        self.writer = pyarrow.ipc.new_file(self.sink, self.schema)
+
+    def write_batch(self, permits):
+        self.writer.write_batch(self.to_record_batch(permits))
+
+    def close(self):
+        super().close()
+        self.writer.close()
+        self.sink.close()
+
+
+class JsonlZstdOutput(PermitOutput):
+    def __init__(self, filename, batch_size=DEFAULT_BATCH_SIZE, level=10):
+        super().__init__(filename, batch_size)
+        try:
+            import zstandard
+        except ImportError:
+            raise ImportError("Compressed JSONL output needs zstandard. Install it with: pip install zstandard")
+
+        self.file = open(filename, mode="wb")
+        self.stream = zstandard.ZstdCompressor(level=level).stream_writer(self.file)
+
+    def write_batch(self, permits):
+        lines = "".join(json.dumps(permit_record(permit)) + "\n" for permit in permits)
+        self.stream.write(lines.encode("utf-8"))
+
+    def close(self):
+        super().close()
+        self.stream.close()  # Also closes self.file
+
+
+OUTPUTS = {CSV: CsvOutput, PARQUET: ParquetOutput, ARROW: ArrowOutput, JSONL_ZSTD: JsonlZstdOutput}
+
+
+def open_output(filename, batch_size=DEFAULT_BATCH_SIZE):
+    """
+    Open an output writer for @filename. The format is
+    chosen by the file's extension, one of FORMATS.
+
+    Raises
+    ------
+    ValueError
+        If the extension isn't a known format.
+
+    """
+
+    for extension, output in OUTPUTS.items():
+        if filename.endswith(extension):
+            return output(filename, batch_size)
+    raise ValueError("Unknown output format for " + os.path.basename(filename) +
+                     ". Use one of: " + ", ".join(FORMATS))
+
+
+def iter_records(filename):
+    """
+    Read back a file written by open_output(), one
+    record at a time (the whole table for the
+    columnar formats).
+
+    Yields
+    ------
+    dict
+        The records of the permits, as given by
+        permit_record().
+
+    """
+
+    if filename.endswith(CSV):
+        from PoolPermitReaderWriter import iter_permits
+
+        for _, permit in iter_permits(filename):
+            yield permit_record(permit)
+    elif filename.endswith(PARQUET) or filename.endswith(ARROW):
+        pa = _import_pyarrow()
+        if filename.endswith(PARQUET):
+            import pyarrow.parquet
+            table = pyarrow.parquet.read_table(filename)
+        else:
+            import pyarrow.ipc
+            with pa.OSFile(filename, "rb") as source:
+                table = pyarrow.ipc.open_file(source).read_all()
+        for record in table.to_pylist():
+            for column in ("application_date", "completed_date"):
+                if record[column] is not None:
+                    record[column] = record[column].isoformat()
+            yield record
+    elif filename.endswith(JSONL_ZSTD):
+        try:
+            import zstandard
+        except ImportError:
+            raise ImportError("Compressed JSONL output needs zstandard. Install it with: pip install zstandard")
+        with open(filename, mode="rb") as file:
+            for line in io.TextIOWrapper(zstandard.ZstdDecompressor().stream_reader(file), encoding="utf-8"):
+                yield json.loads(line)
+    else:
+        raise ValueError("Unknown output format for " + os.path.basename(filename) +
+                         ". Use one of: " + ", ".join(FORMATS))
+
+
+def check_formats(formats):
+    """
+    Check that every format in @formats is known and
+    that the module it needs is installed, without
+    importing it. A job can then fail before it runs
+    instead of after it has saved its csv file.
+
+    Parameters
+    ----------
+    formats: iterable
+        Extensions, e.g. (".parquet", ".jsonl.zst").
+
+    Raises
+    ------
+    ValueError
+        If a format isn't one of FORMATS.
+    ImportError
+        If the module a format needs is missing.
+
+    """
+
+    for output_format in formats:
+        if output_format not in FORMATS:
+            raise ValueError("Unknown output format " + output_format + ". Use one of: " + ", ".join(FORMATS))
+        module = REQUIREMENTS.get(output_format)
+        if module is not None and importlib.util.find_spec(module) is None:
+            raise ImportError(output_format + " output needs " + module + ". Install it with: pip install " + module)
@@ -0,0 +1,92 @@
+import datetime
+import json
+import os
+
+
+class PermitStateStore:
+    def __init__(self, csv_filename):
+        """
+        Initialize a PermitStateStore object. The store
+        keeps bookkeeping data for each permit (keyed by
+        its Permit URL) that doesn't belong in the csv
+        file itself: when the permit was last checked
+        on the website, and the HTTP cache validators
+        (ETag/Last-Modified) of the permit page if the
+        server sent any, for conditional GETs.
+
+        The data lives in a json file next to the csv
+        file: <name>.csv -> <name>.state.json
+
+        Parameters
+        ----------
+        csv_filename: str
+            Path to the csv file the state belongs to.
+            None gives an empty store that is only kept
+            in memory and never saved.
+
+        """
+
+        self.filename = None
+        self.entries = {}
+        if csv_filename is None:
+            return
+
+        root, _ = os.path.splitext(csv_filename)
+        self.filename = root + ".state.json"
+        if os.path.exists(self.filename):
+            with open(self.filename, mode="r") as file:
+                self.entries = json.load(file)
+
+    def get(self, permit_url):
+        return self.entries.get(permit_url, {})
+
+    def last_checked(self, permit_url):
+        """
+        Return the datetime at which the permit was
+        last checked, or None if it never was.
+
+        """
+
+        timestamp = self.get(permit_url).get("last_checked")
+        return datetime.datetime.fromisoformat(timestamp) if timestamp else None
+
+    def mark_checked(self, permit_url, checked_at=None):
+        checked_at = checked_at or datetime.datetime.now()
+        self.entries.setdefault(permit_url, {})["last_checked"] = checked_at.isoformat(timespec="seconds")
+
+    def validators(self, permit_url):
+        """
+        Return a dict of request headers for a
+        conditional GET of the permit page. Empty if
+        the server never sent any cache validators.
+
+        """
+
+        entry = self.get(permit_url)
+        headers = {}
+        if entry.get("etag"):
+            headers["If-None-Match"] = entry["etag"]
+        if entry.get("last_modified"):
+            headers["If-Modified-Since"] = entry["last_modified"]
+        return headers
+
+    def set_validators(self, permit_url, etag=None, last_modified=None):
+        entry = self.entries.setdefault(permit_url, {})
+        entry["etag"] = etag
+        entry["last_modified"] = last_modified
+
+    def save(self):
+        """
+        Write the state to a temporary file and then
+        swap it in, so an interrupted save never
+        leaves a half-written state file behind.
+
+        """
+
+        if self.filename is None:
+            return
+
+        temp_filename = self.filename + ".tmp"
+        with open(temp_filename, mode="w") as file:
+            json.dump(self.entries, file)
+        os.replace(temp_filename, self.filename)
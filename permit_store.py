@@ -0,0 +1,289 @@
+import argparse
+import csv
+import json
+import os
+import stat
+from collections import Counter
+
+from permit import COLUMNS
+from permit import as_date
+from permit_index import permit_id
+from PoolPermitReaderWriter import iter_permits
+from PoolPermitReaderWriter import merge_updates
+
+
+# Layout of a partitioned permit store:
+# -------------------------------------
+# <store>/manifest.json          - one entry per shard, see PartitionedStore
+# <store>/permits_<yyyy-mm>.csv  - permits whose application date is in that month
+# <store>/permits_unknown.csv    - permits without a readable application date
+MANIFEST_FILENAME = "manifest.json"
+UNKNOWN_PARTITION = "unknown"
+
+
+def partition_key(permit):
+    application_date = as_date(permit.application_date)
+    if application_date is not None:
+        return application_date.strftime("%Y-%m")
+    return UNKNOWN_PARTITION
+
+
+def days_to_completion(permit):
+    application_date = as_date(permit.application_date)
+    completed_date = as_date(permit.completed_date)
+    if application_date is not None and completed_date is not None:
+        return max((completed_date - application_date).days, 0)
+    return None
+
+
+def is_store(path):
+    """
+    Return True if @path is a store directory or
+    the manifest file of one.
+
+    """
+
+    if os.path.basename(path) == MANIFEST_FILENAME:
+        return os.path.isfile(path)
+    return os.path.isfile(os.path.join(path, MANIFEST_FILENAME))
+
+
+class PartitionedStore:
+    def __init__(self, path):
+        """
+        Open (or create) a partitioned permit store.
+
+        The store keeps one csv shard per application
+        month. The manifest records for each shard how
+        many permits it has, how many are still open
+        (no completed date) and the days-to-completion
+        counts of its completed permits, so a refresh
+        only has to open shards with open permits.
+        Shards without open permits are made read-only
+        and are never rewritten.
+
+        Parameters
+        ----------
+        path: str
+            The store directory, or its manifest file.
+
+        """
+
+        if os.path.basename(path) == MANIFEST_FILENAME:
+            path = os.path.dirname(path)
+        self.directory = path
+        self.manifest_filename = os.path.join(self.directory, MANIFEST_FILENAME)
+        self.shards = {}
+
+        if os.path.exists(self.manifest_filename):
+            with open(self.manifest_filename, mode="r") as file:
+                self.shards = json.load(file)["shards"]
+        else:
+            os.makedirs(self.directory, exist_ok=True)
+
+    @property
+    def name(self):
+        return os.path.basename(os.path.normpath(self.directory))
+
+    def shard_filename(self, key):
+        return os.path.join(self.directory, "permits_" + key + ".csv")
+
+    def open_shards(self):
+        return sorted(key for key, shard in self.shards.items() if shard["open"] > 0)
+
+    def add_permits(self, permits):
+        """
+        Append permits to their shards. Permits already in
+        the store (same permit identity) are skipped; only
+        the shards that receive permits are read for that.
+        A read-only shard that receives a new open permit
+        becomes writable again.
+
+        Parameters
+        ----------
+        permits: iterable
+            Permits to add, e.g. from a CSVReaderWriter
+            or iter_permits().
+
+        Returns
+        -------
+        int
+            The number of permits added.
+
+        """
+
+        added = 0
+        files = {}
+        permit_ids = {}  # Shard key -> ids of the permits in the shard
+        try:
+            for permit in permits:
+                key = partition_key(permit)
+                if key not in permit_ids:
+                    permit_ids[key] = self._read_permit_ids(key)
+                identity = permit_id(permit.url)
+                if identity in permit_ids[key]:
+                    continue
+                permit_ids[key].add(identity)
+
+                if key not in files:
+                    files[key] = self._open_for_append(key)
+                files[key][1].writerow(permit.to_row())
+                added += 1
+
+                shard = self.shards[key]
+                shard["total"] += 1
+                days = days_to_completion(permit)
+                if days is not None:
+                    shard["days_to_completion"][str(days)] = shard["days_to_completion"].get(str(days), 0) + 1
+                if not permit.is_completed:
+                    shard["open"] += 1
+        finally:
+            for file, _ in files.values():
+                file.close()
+
+        self._update_read_only(files)
+        self.save_manifest()
+        return added
+
+    def import_csv(self, csv_filename):
+        return self.add_permits(permit for _, permit in iter_permits(csv_filename))
+
+    def _read_permit_ids(self, key):
+        if key not in self.shards:
+            return set()
+        return set(permit_id(permit.url) for _, permit in iter_permits(self.shard_filename(key)))
+
+    def _open_for_append(self, key):
+        filename = self.shard_filename(key)
+        if key not in self.shards:
+            self.shards[key] = {"total": 0, "open": 0, "read_only": False, "days_to_completion": {}}
+        if self.shards[key]["read_only"]:
+            os.chmod(filename, stat.S_IRUSR | stat.S_IWUSR | stat.S_IRGRP | stat.S_IROTH)
+            self.shards[key]["read_only"] = False
+
+        new_file = not os.path.exists(filename)
+        file = open(filename, mode="a", newline="")
+        writer = csv.DictWriter(file, fieldnames=COLUMNS)
+        if new_file:
+            writer.writeheader()
+        return file, writer
+
+    def _update_read_only(self, keys):
+        """
+        Make shards without open permits read-only.
+
+        """
+
+        for key in keys:
+            shard = self.shards[key]
+            if shard["open"] == 0 and not shard["read_only"]:
+                os.chmod(self.shard_filename(key), stat.S_IRUSR | stat.S_IRGRP | stat.S_IROTH)
+                shard["read_only"] = True
+
+    def iter_permits(self, start_date=None, end_date=None):
+        """
+        Lazily read every permit of every shard, or only
+        of the shards of the months from @start_date to
+        @end_date (datetime.date) if given. The shard of
+        permits without a readable date is always read.
+
+        """
+
+        start_key = start_date.strftime("%Y-%m") if start_date is not None else ""
+        end_key = end_date.strftime("%Y-%m") if end_date is not None else "9999-99"
+        for key in sorted(self.shards):
+            if key != UNKNOWN_PARTITION and not start_key <= key <= end_key:
+                continue
+            for _, permit in iter_permits(self.shard_filename(key)):
+                yield permit
+
+    def iter_uncompleted_permits(self):
+        """
+        Lazily read the uncompleted permits, opening
+        only the shards that still have any.
+
+        Yields
+        ------
+        tuple
+            A 2-tuple containing the location of the
+            permit, (shard key, row index), and the
+            permit itself.
+
+        """
+
+        for key in self.open_shards():
+            for idx, permit in iter_permits(self.shard_filename(key)):
+                if not permit.is_completed:
+                    yield (key, idx), permit
+
+    def days_to_completion(self):
+        """
+        Days-to-completion of every completed permit
+        in the store, read from the manifest alone.
+
+        Returns
+        -------
+        Counter
+            Maps a number of days to the number of
+            permits completed after that many days.
+
+        """
+
+        counts = Counter()
+        for shard in self.shards.values():
+            for days, count in shard["days_to_completion"].items():
+                counts[int(days)] += count
+        return counts
+
+    def apply_updates(self, updated_permits):
+        """
+        Merge permits updated with a completed date back
+        into their shards. Only the shards that contain
+        an updated permit are rewritten.
+
+        Parameters
+        ----------
+        updated_permits: list
+            2-tuples containing the location of the
+            permit, as given by iter_uncompleted_permits(),
+            and the updated permit.
+
+        """
+
+        by_shard = {}
+        for (key, idx), permit in updated_permits:
+            by_shard.setdefault(key, {})[idx] = permit
+
+        for key, updates in by_shard.items():
+            merge_updates(self.shard_filename(key), updates)
+            shard = self.shards[key]
+            for permit in updates.values():
+                shard["open"] -= 1
+                days = days_to_completion(permit)
+                if days is not None:
+                    shard["days_to_completion"][str(days)] = shard["days_to_completion"].get(str(days), 0) + 1
+
+        self._update_read_only(by_shard)
+        self.save_manifest()
+
+    def save_manifest(self):
+        temp_filename = self.manifest_filename + ".tmp"
+        with open(temp_filename, mode="w") as file:
+            json.dump({"shards": self.shards}, file, indent=1, sort_keys=True)
+        os.replace(temp_filename, self.manifest_filename)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Create a partitioned permit store or add csv files to one.")
+    parser.add_argument("store", help="The store directory. Created if it doesn't exist.")
+    parser.add_argument("csv_files", nargs="+", help="Permit csv files to add, e.g. run_bot() outputs.")
+    args = parser.parse_args()
+
+    store = PartitionedStore(args.store)
+    for csv_filename in args.csv_files:
+        print(str(store.import_csv(csv_filename)) + " new permits added from " + csv_filename)
+    print("Store: " + store.manifest_filename)
+
+
+if __name__ == "__main__":
+    main()
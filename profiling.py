@@ -0,0 +1,305 @@
+import functools
+import os
+import sys
+import threading
+import time
+import tracemalloc
+from collections import Counter
+from urllib.parse import parse_qs
+from urllib.parse import urlparse
+
+
+# Profiling is opt-in: pass profile=True to a @profiled job, or set this
+# environment variable (e.g. on an office machine running the app).
+PROFILE_VARIABLE = "POOL_PERMIT_PROFILE"
+# tracemalloc slows down allocation-heavy code (BeautifulSoup parsing) a
+# lot, so memory is only traced if this variable is set as well.
+MEMORY_VARIABLE = "POOL_PERMIT_PROFILE_MEMORY"
+
+SAMPLE_INTERVAL = 0.005  # Seconds between stack samples
+TRACEMALLOC_FRAMES = 1  # Only the allocating line is reported
+TOP = 20
+
+# Where the time goes. A sample is put in the first category matched by
+# its stack, walking from the innermost frame out, so e.g. a socket read
+# under selenium counts as a WebDriver round trip.
+CATEGORIES = [
+    ("Waiting for pages (WebDriverWait polling)", ["selenium/webdriver/support/wait.py"]),
+    ("WebDriver round trips", ["selenium/"]),
+    ("BeautifulSoup parsing", ["bs4/"]),
+    ("USPS HTTP lookups", ["requests/", "usps_client.py"]),
+    ("Permit HTTP fetches", ["aiohttp/", "async_fetch.py"]),
+    ("CSV I/O", ["PoolPermitReaderWriter.py", "permit_store.py", "permit_output.py", "permit_state.py",
+                 "permit_index.py", "change_feed.py", "csv.py"]),
+]
+OTHER = "Other Python code"
+
+# The profiler of the job running now, if any
+active = None
+
+
+class JobProfiler:
+    def __init__(self, name, trace_memory=False):
+        """
+        Profile one job (a run of run_bot(), update_file()
+        or update_files()):
+
+        - A sampling profiler records the stacks of the
+          job's threads every SAMPLE_INTERVAL seconds.
+          Unlike cProfile it sees every thread (e.g. the
+          browser pool) and costs little enough for a
+          production run.
+        - If @trace_memory is true, tracemalloc records
+          where memory is allocated.
+        - Every WebDriver command is counted and timed,
+          per page, by wrapping the drivers' execute().
+
+        Parameters
+        ----------
+        name: str
+            Name of the job, shown in the report.
+        trace_memory: bool
+
+        """
+
+        self.name = name
+        self.trace_memory = trace_memory
+        self.output_filename = None
+        self.lock = threading.Lock()
+        self.self_samples = Counter()
+        self.total_samples = Counter()
+        self.category_samples = Counter()
+        self.samples = 0
+        self.commands = Counter()
+        self.command_seconds = Counter()
+        self.page_commands = Counter()
+        self.pages = Counter()
+        self.current_page = threading.local()
+        self.stopped = threading.Event()
+        self.sampler = threading.Thread(target=self.sample, daemon=True)
+        self.ignored_threads = set()
+        self.start_time = None
+        self.duration = None
+        self.snapshot = None
+        self.peak_memory = None
+
+    def start(self):
+        # Threads already running (e.g. the Tk main loop) aren't part of the job
+        self.ignored_threads = set(sys._current_frames()) - {threading.get_ident()}
+        if self.trace_memory:
+            tracemalloc.start(TRACEMALLOC_FRAMES)
+        self.start_time = time.perf_counter()
+        self.sampler.start()
+        self.ignored_threads.add(self.sampler.ident)
+
+    def stop(self):
+        self.stopped.set()
+        self.sampler.join()
+        self.duration = time.perf_counter() - self.start_time
+        if self.trace_memory:
+            self.snapshot = tracemalloc.take_snapshot()
+            self.peak_memory = tracemalloc.get_traced_memory()[1]
+            tracemalloc.stop()
+
+    def sample(self):
+        while not self.stopped.wait(SAMPLE_INTERVAL):
+            for thread_id, frame in sys._current_frames().items():
+                if thread_id in self.ignored_threads:
+                    continue
+
+                functions = []
+                while frame is not None:
+                    code = frame.f_code
+                    functions.append((code.co_filename, code.co_firstlineno, code.co_name))
+                    frame = frame.f_back
+
+                self.samples += 1
+                self.self_samples[functions[0]] += 1
+                self.total_samples.update(set(functions))  # Recursion counts once
+                self.category_samples[categorize(functions)] += 1
+
+    def attach(self, driver):
+        """
+        Count the commands @driver sends to chromedriver.
+        Each "get" command starts a new page.
+
+        """
+
+        execute = driver.execute
+
+        def counted_execute(driver_command, params=None):
+            if driver_command == "get":
+                self.current_page.kind = page_kind(params.get("url", "") if params else "")
+                with self.lock:
+                    self.pages[self.current_page.kind] += 1
+
+            start = time.perf_counter()
+            try:
+                return execute(driver_command, params)
+            finally:
+                seconds = time.perf_counter() - start
+                with self.lock:
+                    self.commands[driver_command] += 1
+                    self.command_seconds[driver_command] += seconds
+                    self.page_commands[(getattr(self.current_page, "kind", "(start)"), driver_command)] += 1
+
+        driver.execute = counted_execute
+
+    def report(self):
+        """
+        Returns
+        -------
+        str
+            The ranked report.
+
+        """
+
+        lines = ["Profile of " + self.name, "=" * (11 + len(self.name)),
+                 "Duration: {:.1f} s, {} stack samples every {:.0f} ms".format(self.duration, self.samples,
+                                                                              SAMPLE_INTERVAL * 1000),
+                 ""]
+
+        lines += ["Where the time goes (share of samples of the job's threads)", "-" * 60]
+        for category, count in self.category_samples.most_common():
+            lines.append("{:6.1%}  {}".format(count / max(self.samples, 1), category))
+
+        lines += ["", "WebDriver commands", "-" * 18,
+                  "{:>8} {:>10} {:>9}  {}".format("count", "total (s)", "mean (ms)", "command")]
+        for command, count in self.commands.most_common():
+            seconds = self.command_seconds[command]
+            lines.append("{:>8} {:>10.2f} {:>9.1f}  {}".format(count, seconds, seconds / count * 1000, command))
+
+        lines += ["", "WebDriver commands per page", "-" * 27]
+        for kind, pages in self.pages.most_common():
+            per_page = Counter({command: count / pages for (page, command), count in self.page_commands.items()
+                                if page == kind})
+            lines.append("{} ({} pages, {:.1f} commands per page)".format(kind, pages, sum(per_page.values())))
+            for command, count in per_page.most_common(8):
+                lines.append("  {:>8.1f}  {}".format(count, command))
+
+        lines += ["", "Hottest functions (self)", "-" * 24]
+        lines += self.format_functions(self.self_samples)
+        lines += ["", "Hottest functions (including callees)", "-" * 37]
+        lines += self.format_functions(self.total_samples)
+
+        lines += ["", "Memory (tracemalloc)", "-" * 20]
+        if self.snapshot is None:
+            lines.append("Not traced. Set " + MEMORY_VARIABLE + " to trace it.")
+            return "\n".join(lines) + "\n"
+
+        lines += ["Peak traced: {:.1f} MB".format(self.peak_memory / 2 ** 20), "Still allocated at the end, by line:"]
+        for statistic in self.snapshot.statistics("lineno")[:TOP]:
+            frame = statistic.traceback[0]
+            lines.append("{:>10.1f} KB {:>8}  {}:{}".format(statistic.size / 1024, statistic.count,
+                                                           short_path(frame.filename), frame.lineno))
+        return "\n".join(lines) + "\n"
+
+    def format_functions(self, samples):
+        return ["{:6.1%}  {} ({}:{})".format(count / max(self.samples, 1), name, short_path(filename), lineno)
+                for (filename, lineno, name), count in samples.most_common(TOP)]
+
+    def save(self):
+        """
+        Save the report next to the job's output csv file
+        (see set_output_filename()), or on the desktop if
+        the job failed before it had one.
+
+        Returns
+        -------
+        str
+            Path to the report.
+
+        """
+
+        if self.output_filename is not None:
+            filename = os.path.splitext(self.output_filename)[0] + ".profile.txt"
+        else:
+            filename = os.path.expanduser("~/Desktop/") + self.name + ".profile.txt"
+        with open(filename, mode="w") as file:
+            file.write(self.report())
+        return filename
+
+
+def categorize(functions):
+    for filename, _, _ in functions:
+        filename = filename.replace("\\", "/")
+        for category, patterns in CATEGORIES:
+            if any(pattern in filename for pattern in patterns):
+                return category
+    return OTHER
+
+
+def page_kind(url):
+    """
+    Group pages by site and POSSE presentation, e.g.
+    "developdallas.dallascityhall.com PermitDetail".
+
+    """
+
+    parsed = urlparse(url)
+    presentation = parse_qs(parsed.query).get("PossePresentation", [""])[0]
+    return (parsed.netloc + " " + presentation).strip() or url
+
+
+def short_path(filename):
+    parts = filename.replace("\\", "/").split("/")
+    return "/".join(parts[-2:])
+
+
+def attach(driver):
+    """
+    Count the commands of @driver if a job is being
+    profiled. Called by web_driver.start_driver().
+
+    """
+
+    if active is not None:
+        active.attach(driver)
+
+
+def set_output_filename(filename):
+    """
+    Tell the profiler of the running job (if any)
+    which csv file the job writes.
+
+    """
+
+    if active is not None:
+        active.output_filename = filename
+
+
+def profiled(function):
+    """
+    Add a keyword-only @profile argument to a job
+    function. If true (or if None and the
+    POOL_PERMIT_PROFILE environment variable is set),
+    the job is profiled and the report is saved next
+    to its output csv file. Memory is only traced if
+    the POOL_PERMIT_PROFILE_MEMORY environment variable
+    is set too.
+
+    """
+
+    @functools.wraps(function)
+    def wrapper(*args, profile=None, **kwargs):
+        global active
+
+        if profile is None:
+            profile = bool(os.environ.get(PROFILE_VARIABLE))
+        if not profile or active is not None:
+            return function(*args, **kwargs)
+
+        active = JobProfiler(function.__name__, bool(os.environ.get(MEMORY_VARIABLE)))
+        active.start()
+        try:
+            return function(*args, **kwargs)
+        finally:
+            profiler, active = active, None
+            profiler.stop()
+            # Don't let a failed report hide the job's own result or error
+            try:
+                print("Profile saved to " + profiler.save())
+            except OSError as error:
+                print("PROFILE ERROR: could not save the profile: " + str(error))
+
+    return wrapper
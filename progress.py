@@ -0,0 +1,226 @@
+import queue
+import time
+from collections import deque
+from enum import Enum
+
+
+# Progress reporting between the bot and the GUI:
+# -----------------------------------------------
+# The bot runs in a worker thread, and Tk widgets may only be touched from
+# the thread running the Tk main loop. The worker therefore never updates a
+# widget itself. It publishes ProgressEvents onto a ProgressReporter (a
+# thread-safe queue), and the GUI drains that queue with after() and feeds
+# the events into a ProgressTracker, which keeps the counters, rate and ETA.
+
+
+class ProgressEvent(Enum):
+    STAGE_STARTED = 1       # value: (stage name, number of units of work in the stage)
+    DAY_COMPLETED = 2       # value: None
+    PERMITS_FOUND = 3       # value: number of permits found
+    PAGE_LOADED = 4         # value: None
+    ZIP_LOOKUP_COMPLETED = 5  # value: None
+    PERMIT_CHECKED = 6      # value: None
+    FINISHED = 7            # value: True if the job succeeded, False otherwise
+
+
+class Stage:
+    SEARCH = "Searching permits"
+    ZIP_LOOKUP = "Looking up ZIP codes"
+    UPDATE = "Checking permits for completion"
+
+
+class ProgressReporter:
+    def __init__(self):
+        """
+        Initialize a ProgressReporter object. Events
+        published by the worker thread are held in
+        a queue until the GUI thread drains them.
+
+        """
+
+        self.events = queue.Queue()
+
+    def publish(self, event, value=None):
+        self.events.put((event, value, time.monotonic()))
+
+    def stage_started(self, stage, total):
+        self.publish(ProgressEvent.STAGE_STARTED, (stage, total))
+
+    def day_completed(self):
+        self.publish(ProgressEvent.DAY_COMPLETED)
+
+    def permits_found(self, count=1):
+        self.publish(ProgressEvent.PERMITS_FOUND, count)
+
+    def page_loaded(self):
+        self.publish(ProgressEvent.PAGE_LOADED)
+
+    def zip_lookup_completed(self):
+        self.publish(ProgressEvent.ZIP_LOOKUP_COMPLETED)
+
+    def permit_checked(self):
+        self.publish(ProgressEvent.PERMIT_CHECKED)
+
+    def finished(self, success):
+        self.publish(ProgressEvent.FINISHED, success)
+
+    def drain(self):
+        """
+        Remove and return every event currently in
+        the queue without blocking.
+
+        Returns
+        -------
+        list
+            List of 3-tuples containing the event,
+            its value and the time it was published.
+
+        """
+
+        events = []
+        while True:
+            try:
+                events.append(self.events.get_nowait())
+            except queue.Empty:
+                return events
+
+
+class NullProgressReporter(ProgressReporter):
+    """
+    Reporter used when nobody is listening (e.g. running
+    web_driver from a script). Events are discarded so
+    the queue doesn't grow for the whole run.
+
+    """
+
+    def publish(self, event, value=None):
+        pass
+
+
+NULL_REPORTER = NullProgressReporter()
+
+
+class ProgressTracker:
+    # Rate is computed over the page loads seen in this many seconds
+    RATE_WINDOW_SECONDS = 30
+
+    def __init__(self):
+        self.stage = None
+        self.stage_total = 0
+        self.stage_done = 0
+        self.days_total = 0
+        self.days_done = 0
+        self.permits_found = 0
+        self.zip_lookups_remaining = 0
+        self.pages_loaded = 0
+        self.finished = False
+        self.success = None
+        self.start_time = time.monotonic()
+        self.stage_start_time = self.start_time
+        self.last_event_time = self.start_time
+        self.page_times = deque()
+
+    def apply(self, event, value, timestamp):
+        """
+        Update the counters with a single event
+        drained from a ProgressReporter.
+
+        """
+
+        self.last_event_time = timestamp
+
+        if event == ProgressEvent.STAGE_STARTED:
+            self.stage, self.stage_total = value
+            self.stage_done = 0
+            self.stage_start_time = timestamp
+            if self.stage == Stage.SEARCH:
+                self.days_total = self.stage_total
+            elif self.stage == Stage.ZIP_LOOKUP:
+                self.zip_lookups_remaining = self.stage_total
+        elif event == ProgressEvent.DAY_COMPLETED:
+            self.days_done += 1
+            self.stage_done += 1
+        elif event == ProgressEvent.PERMITS_FOUND:
+            self.permits_found += value
+        elif event == ProgressEvent.PAGE_LOADED:
+            self.pages_loaded += 1
+            self.page_times.append(timestamp)
+        elif event == ProgressEvent.ZIP_LOOKUP_COMPLETED:
+            self.zip_lookups_remaining = max(self.zip_lookups_remaining - 1, 0)
+            self.stage_done += 1
+        elif event == ProgressEvent.PERMIT_CHECKED:
+            self.stage_done += 1
+        elif event == ProgressEvent.FINISHED:
+            self.finished = True
+            self.success = value
+
+    def pages_per_second(self, now=None):
+        """
+        Page loads per second over the last
+        RATE_WINDOW_SECONDS seconds.
+
+        """
+
+        now = time.monotonic() if now is None else now
+        while self.page_times and now - self.page_times[0] > self.RATE_WINDOW_SECONDS:
+            self.page_times.popleft()
+
+        if not self.page_times:
+            return 0.0
+        elapsed = min(now - self.start_time, self.RATE_WINDOW_SECONDS)
+        return len(self.page_times) / elapsed if elapsed > 0 else 0.0
+
+    def eta_seconds(self, now=None):
+        """
+        Estimated number of seconds left in the
+        current stage, based on the stage's
+        average rate so far. Return None if
+        there isn't enough data yet.
+
+        """
+
+        now = time.monotonic() if now is None else now
+        if self.stage_done == 0 or self.stage_total == 0:
+            return None
+
+        elapsed = now - self.stage_start_time
+        remaining = max(self.stage_total - self.stage_done, 0)
+        return elapsed / self.stage_done * remaining
+
+    def seconds_since_last_event(self, now=None):
+        now = time.monotonic() if now is None else now
+        return now - self.last_event_time
+
+    def status_message(self, now=None):
+        """
+        Build the multi-line message shown in the
+        GUI's status bar while a job is running.
+
+        """
+
+        now = time.monotonic() if now is None else now
+        if self.stage is None:
+            return "Starting browser...\nPlease wait..."
+
+        lines = [self.stage + ": " + str(self.stage_done) + "/" + str(self.stage_total)]
+        if self.stage == Stage.SEARCH or self.stage == Stage.ZIP_LOOKUP:
+            lines.append("Days searched: " + str(self.days_done) + "/" + str(self.days_total) +
+                         "    Permits found: " + str(self.permits_found) +
+                         "    ZIP lookups remaining: " + str(self.zip_lookups_remaining))
+
+        eta = self.eta_seconds(now)
+        lines.append("Rate: " + format(self.pages_per_second(now), ".2f") + " pages/sec" +
+                     "    ETA: " + (format_duration(eta) if eta is not None else "estimating...") +
+                     "    Last activity: " + format_duration(self.seconds_since_last_event(now)) + " ago")
+        return "\n".join(lines)
+
+
+def format_duration(seconds):
+    seconds = int(round(seconds))
+    hours, seconds = divmod(seconds, 3600)
+    minutes, seconds = divmod(seconds, 60)
+    if hours > 0:
+        return "%dh %02dm %02ds" % (hours, minutes, seconds)
+    if minutes > 0:
+        return "%dm %02ds" % (minutes, seconds)
+    return "%ds" % seconds
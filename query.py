@@ -0,0 +1,226 @@
+import bisect
+import datetime
+import heapq
+
+from PoolPermitReaderWriter import iter_permits
+
+
+def contractor_key(text):
+    """
+    The contractor column holds the company name followed
+    by its address on separate lines. Permits are grouped
+    by the (case-insensitive) name only.
+
+    """
+
+    lines = text.strip().splitlines()
+    return " ".join(lines[0].upper().split()) if lines else ""
+
+
+class SortedIndex:
+    def __init__(self, values):
+        """
+        A sorted index over one column.
+
+        Parameters
+        ----------
+        values: list
+            The column's value for every permit, by
+            position. None and unparsed values are
+            left out of the index.
+
+        """
+
+        pairs = sorted((value, pos) for pos, value in enumerate(values) if value is not None)
+        self.keys = [value for value, _ in pairs]
+        self.positions = [pos for _, pos in pairs]
+
+    def range(self, low=None, high=None):
+        """
+        Return the positions of the permits whose value is
+        between @low and @high (inclusive). Either bound
+        may be None for an open range.
+
+        """
+
+        start = 0 if low is None else bisect.bisect_left(self.keys, low)
+        end = len(self.keys) if high is None else bisect.bisect_right(self.keys, high)
+        return self.positions[start:end]
+
+    def descending(self):
+        return reversed(self.positions)
+
+    def ascending(self):
+        return iter(self.positions)
+
+
+class PermitQuery:
+    def __init__(self, permits):
+        """
+        Build the indexes for querying @permits:
+
+        - hash indexes on contractor name and ZIP code
+        - sorted indexes on application date, completed
+          date and job value
+
+        Parameters
+        ----------
+        permits: list
+            Permits, e.g. CSVReaderWriter.permits.
+
+        """
+
+        self.permits = list(permits)
+
+        self.by_contractor = {}
+        self.by_zip_code = {}
+        self.completed = set()
+        for pos, permit in enumerate(self.permits):
+            self.by_contractor.setdefault(contractor_key(permit.contractor), []).append(pos)
+            self.by_zip_code.setdefault(permit.zip_code, []).append(pos)
+            if permit.is_completed:
+                self.completed.add(pos)
+
+        def dates(attribute):
+            return [value if isinstance(value, datetime.date) else None
+                    for value in (getattr(permit, attribute) for permit in self.permits)]
+
+        self.sorted_indexes = {
+            "application_date": SortedIndex(dates("application_date")),
+            "completed_date": SortedIndex(dates("completed_date")),
+            "job_value": SortedIndex([permit.job_value if isinstance(permit.job_value, float) else None
+                                      for permit in self.permits]),
+        }
+
+    @classmethod
+    def from_csv(cls, csv_filename):
+        return cls(permit for _, permit in iter_permits(csv_filename))
+
+    def contractors(self):
+        """
+        Return the contractors and their number of
+        permits, most permits first.
+
+        """
+
+        return sorted(((name, len(positions)) for name, positions in self.by_contractor.items()),
+                      key=lambda item: (-item[1], item[0]))
+
+    def _positions(self, contractor=None, zip_code=None, min_job_value=None, max_job_value=None,
+                   applied_from=None, applied_to=None, completed_from=None, completed_to=None):
+        """
+        Intersect the indexed constraints. Returns None if
+        there is no indexed constraint (every permit).
+
+        """
+
+        candidates = []
+        if contractor is not None:
+            candidates.append(self.by_contractor.get(contractor_key(contractor), []))
+        if zip_code is not None:
+            candidates.append(self.by_zip_code.get(zip_code, []))
+        if min_job_value is not None or max_job_value is not None:
+            candidates.append(self.sorted_indexes["job_value"].range(min_job_value, max_job_value))
+        if applied_from is not None or applied_to is not None:
+            candidates.append(self.sorted_indexes["application_date"].range(applied_from, applied_to))
+        if completed_from is not None or completed_to is not None:
+            candidates.append(self.sorted_indexes["completed_date"].range(completed_from, completed_to))
+
+        if not candidates:
+            return None
+
+        # Start from the most selective constraint
+        candidates.sort(key=len)
+        positions = set(candidates[0])
+        for other in candidates[1:]:
+            if not positions:
+                break
+            positions.intersection_update(other)
+        return positions
+
+    def _matches(self, pos, applicant, completed):
+        if completed is not None and (pos in self.completed) != completed:
+            return False
+        if applicant is not None and applicant.upper() not in self.permits[pos].applicant.upper():
+            return False
+        return True
+
+    def filter(self, applicant=None, completed=None, **indexed):
+        """
+        Return the permits matching every given constraint,
+        in their original order.
+
+        Parameters
+        ----------
+        contractor: str
+            Contractor name (case-insensitive).
+        zip_code: str
+            5-digit ZIP code.
+        min_job_value, max_job_value: float
+            Job value range (inclusive).
+        applied_from, applied_to: datetime.date
+            Application date range (inclusive).
+        completed_from, completed_to: datetime.date
+            Completed date range (inclusive).
+        applicant: str
+            Case-insensitive substring of the applicant.
+        completed: bool
+            True for completed permits only, False for
+            uncompleted permits only.
+
+        Returns
+        -------
+        list
+            The matching permits.
+
+        """
+
+        positions = self._positions(**indexed)
+        if positions is None:
+            positions = range(len(self.permits))
+        return [self.permits[pos] for pos in sorted(positions) if self._matches(pos, applicant, completed)]
+
+    def top(self, n, by="job_value", descending=True, applicant=None, completed=None, **indexed):
+        """
+        Return the first @n permits matching the constraints
+        (same as filter()), ordered by @by. Permits whose
+        @by value is missing are left out.
+
+        Parameters
+        ----------
+        n: int
+        by: str
+            One of "job_value", "application_date"
+            or "completed_date".
+        descending: bool
+            Largest/latest first if true.
+
+        Returns
+        -------
+        list
+            At most @n permits.
+
+        """
+
+        if n <= 0:
+            return []
+
+        index = self.sorted_indexes[by]
+        positions = self._positions(**indexed)
+
+        if positions is None:
+            # Walk the sorted index and stop after n matches
+            ordered = index.descending() if descending else index.ascending()
+            top_positions = []
+            for pos in ordered:
+                if self._matches(pos, applicant, completed):
+                    top_positions.append(pos)
+                    if len(top_positions) == n:
+                        break
+            return [self.permits[pos] for pos in top_positions]
+
+        keyed = [(getattr(self.permits[pos], by), pos) for pos in positions
+                 if self._matches(pos, applicant, completed) and
+                 isinstance(getattr(self.permits[pos], by), (float, datetime.date))]
+        select = heapq.nlargest if descending else heapq.nsmallest
+        return [self.permits[pos] for _, pos in select(n, keyed)]
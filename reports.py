@@ -0,0 +1,246 @@
+import argparse
+import os
+
+try:
+    import numpy as np
+    import pandas as pd
+except ImportError:
+    raise ImportError("Reports need pandas and numpy. Install them with: pip install pandas numpy")
+
+from permit import DATE_FORMATS
+
+
+DEFAULT_CHUNK_SIZE = 50000
+
+# Job values are summarized with a fixed histogram so memory doesn't grow
+# with the number of permits: 1000 log-spaced bins from $1 to $100M give
+# percentiles within about 2% of the exact value.
+JOB_VALUE_BIN_EDGES = np.concatenate(([0.0], np.logspace(0, 8, 1001)))
+PERCENTILES = (10, 25, 50, 75, 90, 95, 99)
+
+
+class PermitReport:
+    def __init__(self):
+        """
+        Aggregates accumulated over the chunks of one or
+        more permit csv files. Every aggregate is bounded
+        by the number of months, ZIP codes, contractors
+        or days-to-completion, never by the number of
+        permits.
+
+        """
+
+        self.total_permits = 0
+        self.per_month_zip = None
+        self.contractor_permits = None
+        self.contractor_job_value = None
+        self.job_value_histogram = np.zeros(len(JOB_VALUE_BIN_EDGES) - 1, dtype=np.int64)
+        self.job_values_above_range = 0
+        self.days_to_completion = np.zeros(0, dtype=np.int64)
+
+    def add_chunk(self, chunk):
+        """
+        Add a chunk of csv rows (as read by pandas, all
+        columns as strings) to the aggregates.
+
+        """
+
+        self.total_permits += len(chunk)
+
+        application_date = parse_dates(chunk["Application Date"])
+        completed_date = parse_dates(chunk["Completed Date"])
+        job_value = pd.to_numeric(chunk["Job Value Cost"].str.replace(r"[$,]", "", regex=True), errors="coerce")
+        zip_code = chunk["Address"].str.extract(r"(\d{5})(?:-\d{4})?\s*$", expand=False).fillna("unknown")
+        contractor = (chunk["Contractor"].str.strip().str.split("\n").str[0]
+                      .str.upper().str.split().str.join(" ").fillna(""))
+        month = application_date.dt.strftime("%Y-%m").fillna("unknown")
+
+        # Permits per month and ZIP code
+        counts = pd.DataFrame({"month": month, "zip_code": zip_code}).value_counts()
+        self.per_month_zip = accumulate(self.per_month_zip, counts)
+
+        # Contractor market share
+        self.contractor_permits = accumulate(self.contractor_permits, contractor.value_counts())
+        self.contractor_job_value = accumulate(self.contractor_job_value, job_value.fillna(0).groupby(contractor).sum())
+
+        # Job value distribution
+        values = job_value.dropna().to_numpy()
+        self.job_value_histogram += np.histogram(values, bins=JOB_VALUE_BIN_EDGES)[0]
+        self.job_values_above_range += int((values > JOB_VALUE_BIN_EDGES[-1]).sum())
+
+        # Time to completion distribution (whole days)
+        days = (completed_date - application_date).dt.days.dropna()
+        days = days[days >= 0].to_numpy(dtype=np.int64)
+        if len(days) > 0:
+            counts = np.bincount(days)
+            if len(counts) > len(self.days_to_completion):
+                counts[:len(self.days_to_completion)] += self.days_to_completion
+                self.days_to_completion = counts
+            else:
+                self.days_to_completion[:len(counts)] += counts
+
+    def permits_per_month_and_zip(self):
+        """
+        Returns
+        -------
+        DataFrame
+            Months as rows, ZIP codes as columns.
+
+        """
+
+        if self.per_month_zip is None:
+            return pd.DataFrame()
+        return self.per_month_zip.unstack(fill_value=0).sort_index()
+
+    def job_value_percentiles(self, percentiles=PERCENTILES):
+        """
+        Approximate job value percentiles, interpolated
+        within the histogram bins.
+
+        Returns
+        -------
+        Series
+            Job value by percentile.
+
+        """
+
+        cumulative = np.cumsum(self.job_value_histogram)
+        if len(cumulative) == 0 or cumulative[-1] == 0:
+            return pd.Series(np.nan, index=list(percentiles))
+
+        # Interpolate on the cumulative counts at the bin edges
+        cumulative_at_edges = np.concatenate(([0], cumulative)) / cumulative[-1] * 100
+        values = np.interp(percentiles, cumulative_at_edges, JOB_VALUE_BIN_EDGES)
+        return pd.Series(values, index=list(percentiles))
+
+    def contractor_market_share(self, top=20):
+        """
+        Returns
+        -------
+        DataFrame
+            The @top contractors (all if None) by number of permits,
+            with their permit count, share of permits
+            and total and share of job value.
+
+        """
+
+        if self.contractor_permits is None:
+            return pd.DataFrame(columns=["permits", "job_value", "permit_share", "job_value_share"])
+
+        share = pd.DataFrame({"permits": self.contractor_permits,
+                              "job_value": self.contractor_job_value.reindex(self.contractor_permits.index,
+                                                                             fill_value=0)})
+        share["permit_share"] = share["permits"] / max(share["permits"].sum(), 1)
+        share["job_value_share"] = share["job_value"] / max(share["job_value"].sum(), 1)
+        share = share.sort_values("permits", ascending=False)
+        return share if top is None else share.head(top)
+
+    def time_to_completion(self, percentiles=PERCENTILES):
+        """
+        Returns
+        -------
+        Series
+            Days from application to completion
+            by percentile (exact).
+
+        """
+
+        total = self.days_to_completion.sum()
+        if total == 0:
+            return pd.Series(np.nan, index=list(percentiles))
+
+        cumulative = np.cumsum(self.days_to_completion) / total * 100
+        days = np.searchsorted(cumulative, percentiles, side="left")
+        return pd.Series(days, index=list(percentiles))
+
+    def summary(self):
+        lines = ["Permits: " + str(self.total_permits),
+                 "",
+                 "Job value percentiles:",
+                 self.job_value_percentiles().map("${:,.0f}".format).to_string(),
+                 "",
+                 "Days to completion percentiles (" + str(int(self.days_to_completion.sum())) + " completed):",
+                 self.time_to_completion().to_string(),
+                 "",
+                 "Top contractors:",
+                 self.contractor_market_share().to_string(),
+                 "",
+                 "Permits per month and ZIP code:",
+                 self.permits_per_month_and_zip().to_string()]
+        return "\n".join(lines)
+
+
+def parse_dates(column):
+    """
+    Vectorized permit.as_date(): parse a date column
+    with each of DATE_FORMATS in turn. Dates in none
+    of them are NaT.
+
+    """
+
+    column = column.str.strip()
+    dates = pd.to_datetime(column, format=DATE_FORMATS[0], errors="coerce")
+    for date_format in DATE_FORMATS[1:]:
+        if not dates.isna().any():
+            break
+        dates = dates.fillna(pd.to_datetime(column, format=date_format, errors="coerce"))
+    return dates
+
+
+def accumulate(total, counts):
+    """
+    Add the per-key @counts of a chunk to the running
+    @total (None before the first chunk).
+
+    """
+
+    if total is None:
+        return counts
+    return total.add(counts, fill_value=0).astype(counts.dtype)
+
+
+def build_report(csv_filenames, chunk_size=DEFAULT_CHUNK_SIZE):
+    """
+    Read one or more permit csv files chunk by chunk and
+    compute the aggregates of PermitReport.
+
+    Parameters
+    ----------
+    csv_filenames: list
+        Paths to permit csv files (or store shards).
+    chunk_size: int
+        Number of rows read at a time.
+
+    Returns
+    -------
+    PermitReport
+
+    """
+
+    report = PermitReport()
+    for csv_filename in csv_filenames:
+        for chunk in pd.read_csv(csv_filename, dtype=str, keep_default_na=False, chunksize=chunk_size):
+            report.add_chunk(chunk)
+    return report
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Summary report over one or more permit csv files.")
+    parser.add_argument("csv_filenames", nargs="+")
+    parser.add_argument("--chunk-size", type=int, default=DEFAULT_CHUNK_SIZE)
+    parser.add_argument("--output-dir", help="Also save each table as a csv file in this directory.")
+    args = parser.parse_args()
+
+    report = build_report(args.csv_filenames, args.chunk_size)
+    print(report.summary())
+
+    if args.output_dir:
+        os.makedirs(args.output_dir, exist_ok=True)
+        report.permits_per_month_and_zip().to_csv(os.path.join(args.output_dir, "permits_per_month_and_zip.csv"))
+        report.job_value_percentiles().to_csv(os.path.join(args.output_dir, "job_value_percentiles.csv"))
+        report.contractor_market_share(top=None).to_csv(os.path.join(args.output_dir, "contractor_market_share.csv"))
+        report.time_to_completion().to_csv(os.path.join(args.output_dir, "time_to_completion.csv"))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,173 @@
+import datetime
+import itertools
+import time
+from collections import Counter
+
+from permit import as_date
+
+
+class CompletionScheduler:
+    # Below this many completed permits, the learned distribution is too
+    # noisy and DEFAULT_DAYS_TO_COMPLETION is used instead.
+    MIN_SAMPLES = 20
+    DEFAULT_DAYS_TO_COMPLETION = [30, 60, 90, 120, 180, 270, 365]
+
+    # Permits older than every completion we have seen can still complete;
+    # they keep a small chance so they are eventually re-checked.
+    TAIL_PROBABILITY = 0.01
+
+    def __init__(self, days_to_completion, max_pages=None, max_seconds=None):
+        """
+        Initialize a CompletionScheduler object. The
+        scheduler decides which uncompleted permits
+        to re-check first and when to stop.
+
+        Parameters
+        ----------
+        days_to_completion: iterable
+            Observed number of days between the
+            application date and the completed
+            date of completed permits.
+        max_pages: int
+            Maximum number of permit pages to load.
+            None means no limit.
+        max_seconds: float
+            Maximum number of seconds to spend
+            re-checking permits. None means no limit.
+
+        """
+
+        counts = Counter(days_to_completion)
+        if sum(counts.values()) < self.MIN_SAMPLES:
+            counts = Counter(self.DEFAULT_DAYS_TO_COMPLETION)
+
+        # completed_within[d] is the number of permits completed within d days.
+        # Its size depends on the longest completion time, not on the number
+        # of permits, so the distribution can be learned while streaming.
+        self.completed_within = list(itertools.accumulate(counts.get(day, 0) for day in range(max(counts) + 1)))
+        self.total = self.completed_within[-1]
+        self.max_pages = max_pages
+        self.max_seconds = max_seconds
+        self.start_time = None
+
+    @classmethod
+    def from_permits(cls, permits, max_pages=None, max_seconds=None):
+        """
+        Learn the time-to-completion distribution from
+        the completed permits in @permits.
+
+        Parameters
+        ----------
+        permits: iterable
+            Permits from a CSVReaderWriter object or
+            from iter_permits(). Only read once.
+
+        """
+
+        def days_to_completion():
+            for permit in permits:
+                application_date = as_date(permit.application_date)
+                completed_date = as_date(permit.completed_date)
+                if application_date is not None and completed_date is not None:
+                    yield max((completed_date - application_date).days, 0)
+
+        return cls(days_to_completion(), max_pages, max_seconds)
+
+    def survival(self, age_days):
+        """
+        Fraction of permits that are still uncompleted
+        @age_days days after their application date.
+
+        """
+
+        if age_days < 0:
+            return 1.0
+        completed = self.completed_within[min(age_days, len(self.completed_within) - 1)]
+        return 1 - completed / self.total
+
+    def completion_probability(self, permit, last_checked, today):
+        """
+        Probability that @permit has completed since it
+        was last checked, given it was still uncompleted
+        at that time.
+
+        Parameters
+        ----------
+        permit: Permit
+            An uncompleted permit.
+        last_checked: datetime.date
+            When the permit was last checked. None
+            if it has never been re-checked.
+        today: datetime.date
+
+        Returns
+        -------
+        float
+
+        """
+
+        application_date = as_date(permit.application_date)
+        if application_date is None:
+            return 1.0  # No way to tell, so don't starve it
+
+        age_now = (today - application_date).days
+        age_then = (last_checked - application_date).days if last_checked else 0
+        if age_now <= age_then:
+            return 0.0  # Checked today already
+
+        survived_then = self.survival(age_then)
+        if survived_then == 0:
+            return self.TAIL_PROBABILITY
+        probability = (survived_then - self.survival(age_now)) / survived_then
+        return max(probability, self.TAIL_PROBABILITY)
+
+    def schedule(self, uncompleted_permits, state, today=None):
+        """
+        Order the uncompleted permits so the ones most
+        likely to have completed are checked first, and
+        cap the list at the page budget.
+
+        Parameters
+        ----------
+        uncompleted_permits: list
+            List of 2-tuples containing the index of the
+            uncompleted permit and the permit itself, as
+            given by get_list_of_uncompleted_permits().
+        state: PermitStateStore
+            Provides when each permit was last checked.
+        today: datetime.date
+
+        Returns
+        -------
+        list
+            The re-ordered (and possibly shortened)
+            list of 2-tuples.
+
+        """
+
+        today = today or datetime.date.today()
+        scored = []
+        for idx, permit in uncompleted_permits:
+            last_checked = state.last_checked(permit.url)
+            last_checked = last_checked.date() if last_checked else None
+            scored.append((self.completion_probability(permit, last_checked, today), idx, permit))
+
+        # Highest probability first; ties keep file order
+        scored.sort(key=lambda item: (-item[0], item[1]))
+        if self.max_pages is not None:
+            scored = scored[:self.max_pages]
+        return [(idx, permit) for _, idx, permit in scored]
+
+    def start(self):
+        self.start_time = time.monotonic()
+
+    def out_of_time(self):
+        """
+        Return True if the time budget has been used up.
+        start() must be called before the first check.
+
+        """
+
+        if self.max_seconds is None or self.start_time is None:
+            return False
+        return time.monotonic() - self.start_time >= self.max_seconds
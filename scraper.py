@@ -2,8 +2,50 @@ import re
 
 from bs4 import BeautifulSoup
 
+from address import normalize_full_address
+from page_selectors import ZIP_RESULT_CLASS
+from page_selectors import find_span
+from permit import DEFAULT_PERMIT_TYPE
+from permit import Permit
+
+
+# Title of a permit page, same as checked by EC_permit_result.PermitResult
+PERMIT_PAGE_TITLE = "Master Permit"
+
+
+class NotAPermitPage(ValueError):
+    """
+    Raised when a page that should show a permit
+    doesn't (e.g. a login, error or maintenance page
+    served instead of the permit).
+
+    """
+
+
+def parse_permit_page(source):
+    """
+    Parse a permit page, checking first that it is
+    one: it must have the "Master Permit" title and
+    a permit status.
+
+    Returns
+    -------
+    BeautifulSoup
+
+    Raises
+    ------
+    NotAPermitPage
 
-def get_permit_info(source, permit_url, csv):
+    """
+
+    soup = BeautifulSoup(source, "html.parser")
+    title = soup.find(id=re.compile("pnlTitleBand"))
+    if title is None or PERMIT_PAGE_TITLE not in title.text or find_span(soup, "status") is None:
+        raise NotAPermitPage
+    return soup
+
+
+def get_permit_info(source, permit_url, csv, permit_type=DEFAULT_PERMIT_TYPE):
     """
     Extracts necessary information from the HTML source and
     saves it into a csv file. The source must only contain
@@ -26,23 +68,39 @@ def get_permit_info(source, permit_url, csv):
         The URL displaying the permit info.
     csv: CSVReaderWriter
         Instance of CSVReaderWriter object.
+    permit_type: str
+        The application type the permit was
+        searched for. Saved with the permit.
+
+    Returns
+    -------
+    bool
+        True if a permit was saved, False if the
+        permit was skipped or already saved.
+
+    Raises
+    ------
+    NotAPermitPage
+        If @source isn't a permit page.
 
     """
 
-    soup = BeautifulSoup(source, "html.parser")
+    soup = parse_permit_page(source)
 
-    application_status = soup.find("span", id=re.compile("PWebPermitStatus"))
-    street_address = soup.find("span", id=re.compile("AddressDisplay"))
+    application_status = find_span(soup, "status")
+    street_address = find_span(soup, "address")
     if street_address is None or application_status is None:
-        return
+        return False
     if street_address.text == "" or application_status.text == "Application Cancelled":
-        return
+        return False
 
-    application_date = soup.find("span", id=re.compile("CreatedDate"))
-    completed_date = soup.find("span", id=re.compile("CompletedDate"))
-    applicant = soup.find("span", id=re.compile("WebApplicantDisplay"))
-    contractor = soup.find("span", id=re.compile("WebContractorDisplay"))
-    job_value = soup.find("span", id=re.compile("JobValue"))
+    application_date = find_span(soup, "application_date")
+    completed_date = find_span(soup, "completed_date")
+    applicant = find_span(soup, "applicant")
+    contractor = find_span(soup, "contractor")
+    job_value = find_span(soup, "job_value")
+    if None in (application_date, completed_date, applicant, contractor, job_value):
+        raise NotAPermitPage
 
     # Replace <br> tags with newline
     for br in street_address("br"):
@@ -50,17 +108,18 @@ def get_permit_info(source, permit_url, csv):
     for br in contractor("br"):
         br.replace_with("\n")
 
-    permit_data = {
+    permit = Permit.from_row({
         "Application Date": application_date.text,
         "Completed Date": completed_date.text,
         "Address": street_address.text,
         "Applicant": applicant.text,
         "Contractor": contractor.text,
         "Job Value Cost": job_value.text,
-        "Permit URL": permit_url
-    }
+        "Permit URL": permit_url,
+        "Permit Type": permit_type
+    })
 
-    csv.write_permit_to_csv(permit_data)
+    return csv.write_permit_to_csv(permit)
 
     # ---------------------------------------------------
     #                       DEBUG
@@ -89,10 +148,17 @@ def get_permit_completion_date(source):
         date. No completion date is signified by an
         empty string.
 
+    Raises
+    ------
+    NotAPermitPage
+        If @source isn't a permit page.
+
     """
 
-    soup = BeautifulSoup(source, "html.parser")
-    return soup.find("span", id=re.compile("CompletedDate")).text
+    completed_date = find_span(parse_permit_page(source), "completed_date")
+    if completed_date is None:
+        raise NotAPermitPage
+    return completed_date.text
 
 
 def get_address_with_zip_code(source):
@@ -109,10 +175,11 @@ def get_address_with_zip_code(source):
     Returns
     -------
     str
-        The address with zip code.
+        The address with zip code, in the format
+        of address.format_full_address().
 
     """
 
     soup = BeautifulSoup(source, "html.parser")
-    return soup.find("div", class_="zipcode-result-address").text.strip()
+    return normalize_full_address(soup.find("div", class_=ZIP_RESULT_CLASS).text)
 
@@ -0,0 +1,181 @@
+import argparse
+import datetime
+import html
+import itertools
+import os
+import random
+
+from address import format_full_address
+from permit import DEFAULT_PERMIT_TYPE
+from permit import Permit
+from permit import format_date
+from permit import format_job_value
+
+
+# Realistic-looking values for synthetic permits. Nothing here is real data.
+STREET_NAMES = ["MAIN", "ELM", "COMMERCE", "PRESTON", "HILLCREST", "INWOOD", "LOVERS", "MOCKINGBIRD", "NORTHWEST",
+                "ROYAL", "FOREST", "WALNUT HILL", "SKILLMAN", "ABRAMS", "GREENVILLE", "BECKLEY", "KIEST", "LEDBETTER",
+                "CAMP WISDOM", "MARSH", "WEBB CHAPEL", "MIDWAY", "DEL NORTE", "SAN LEANDRO", "VILLAGE GREEN"]
+STREET_SUFFIXES = ["ST", "AVE", "DR", "LN", "RD", "BLVD", "CIR", "CT", "PL", "TRL", "PKWY", "WAY"]
+DIRECTIONALS = ["", "", "", "N ", "S ", "E ", "W "]
+DALLAS_ZIP_CODES = ["75201", "75204", "75205", "75206", "75209", "75214", "75218", "75219", "75220", "75225",
+                    "75228", "75229", "75230", "75231", "75232", "75238", "75240", "75243", "75248", "75252"]
+FIRST_NAMES = ["JAMES", "MARIA", "ROBERT", "LINDA", "MICHAEL", "SUSAN", "DAVID", "KAREN", "JOSE", "NANCY"]
+LAST_NAMES = ["SMITH", "GARCIA", "JOHNSON", "MARTINEZ", "BROWN", "LOPEZ", "DAVIS", "NGUYEN", "WILSON", "PATEL"]
+CONTRACTORS = ["BLUE HAVEN POOLS", "ANTHONY & SYLVAN POOLS", "PREMIER POOLS", "CLAFFEY POOLS", "PLATINUM POOLS",
+               "SUN COUNTRY POOLS", "MORGAN POOLS", "RIVIERA POOLS", "CHAMPION POOLS", "TEXAS POOL CRAFTERS",
+               "SOUTHWEST POOLS", "LONE STAR POOL BUILDERS"]
+
+PERMIT_URL = "https://developdallas.dallascityhall.com/Default.aspx?PossePresentation=PermitDetail&PosseObjectId="
+FIRST_OBJECT_ID = 90000000
+
+# Most permits complete within a few months (log-normal days to completion,
+# median about 90 days); some are never completed.
+MEDIAN_DAYS_TO_COMPLETION = 90
+NEVER_COMPLETED = 0.1
+
+
+def random_street(rng):
+    return str(rng.randint(100, 19999)) + " " + rng.choice(DIRECTIONALS) + rng.choice(STREET_NAMES) + " " + \
+        rng.choice(STREET_SUFFIXES)
+
+
+def generate_permits(count, start_date, end_date, today=None, seed=0):
+    """
+    Generate synthetic permits with the columns and
+    formats of the permits saved by run_bot(), i.e.
+    after the ZIP code lookup.
+
+    Parameters
+    ----------
+    count: int
+    start_date, end_date: datetime.date
+        Range of the application dates.
+    today: datetime.date
+        Permits aren't completed after this date.
+        Defaults to @end_date.
+    seed: int
+        The same seed gives the same permits.
+
+    Yields
+    ------
+    Permit
+        In order of application date.
+
+    """
+
+    rng = random.Random(seed)
+    today = today or end_date
+    span = (end_date - start_date).days + 1
+    days = sorted(rng.randrange(span) for _ in range(count))
+
+    for idx, day in enumerate(days):
+        application_date = start_date + datetime.timedelta(days=day)
+        completed_date = None
+        if rng.random() >= NEVER_COMPLETED:
+            days_to_completion = int(rng.lognormvariate(0, 0.6) * MEDIAN_DAYS_TO_COMPLETION)
+            if application_date + datetime.timedelta(days=days_to_completion) <= today:
+                completed_date = application_date + datetime.timedelta(days=days_to_completion)
+
+        zip_code = rng.choice(DALLAS_ZIP_CODES)
+        address = format_full_address(random_street(rng), "DALLAS", "TX",
+                                      zip_code + "-" + "{:04d}".format(rng.randrange(10000)))
+        applicant = rng.choice(FIRST_NAMES) + " " + rng.choice(LAST_NAMES)
+        contractor = rng.choice(CONTRACTORS) + "\n" + random_street(rng) + "\nDALLAS TX " + zip_code
+        job_value = float(round(rng.lognormvariate(10.6, 0.5), -2))
+
+        yield Permit(application_date, completed_date, address, applicant, contractor, job_value,
+                     PERMIT_URL + str(FIRST_OBJECT_ID + idx), DEFAULT_PERMIT_TYPE)
+
+
+def write_csv(filename, permits):
+    from permit_output import CsvOutput
+
+    with CsvOutput(filename) as output:
+        output.write_permits(permits)
+
+
+def permit_page_html(permit, street_line=None):
+    """
+    A permit page in the style of the POSSE permit detail
+    page, with the elements read by scraper.get_permit_info()
+    and PermitResult. Useful to replay scraping offline and
+    to check the selectors (page_selectors.py --recorded).
+
+    Parameters
+    ----------
+    permit: Permit
+    street_line: str
+        Address shown on the page, before the ZIP code
+        lookup. Defaults to the street part of the
+        permit's address.
+
+    Returns
+    -------
+    str
+
+    """
+
+    def span(id_part, text):
+        lines = [html.escape(line) for line in text.split("\n")]
+        return "<span id=\"" + id_part + "_1209113_0\">" + "<br>".join(lines) + "</span>"
+
+    if street_line is None:
+        street_line = permit.address.split("\n")[0]
+    status = "Completed" if permit.is_completed else "Issued"
+
+    return "\n".join([
+        "<html><head><title>Permit Detail</title></head><body>",
+        "<div id=\"ctl00_cphTitleBand_pnlTitleBand\"><div><span>Master Permit</span></div></div>",
+        "<div id=\"ctl00_cphPaneBand_pnlPaneBand\" class=\"datazone\"><table>",
+        "<tr><td>Status</td><td>" + span("PWebPermitStatus", status) + "</td></tr>",
+        "<tr><td>Address</td><td>" + span("AddressDisplay", street_line + "\nDALLAS, TX") + "</td></tr>",
+        "<tr><td>Application Date</td><td>" + span("CreatedDate", format_date(permit.application_date)) + "</td></tr>",
+        "<tr><td>Completed Date</td><td>" + span("CompletedDate", format_date(permit.completed_date)) + "</td></tr>",
+        "<tr><td>Applicant</td><td>" + span("WebApplicantDisplay", permit.applicant) + "</td></tr>",
+        "<tr><td>Contractor</td><td>" + span("WebContractorDisplay", permit.contractor) + "</td></tr>",
+        "<tr><td>Job Value</td><td>" + span("JobValue", format_job_value(permit.job_value)) + "</td></tr>",
+        "</table></div></body></html>",
+    ])
+
+
+def write_html_pages(directory, permits):
+    """
+    Write one permit page per permit, named by the
+    permit's object id.
+
+    """
+
+    from permit_index import permit_id
+
+    os.makedirs(directory, exist_ok=True)
+    for permit in permits:
+        with open(os.path.join(directory, permit_id(permit.url) + ".html"), mode="w") as file:
+            file.write(permit_page_html(permit))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Generate a synthetic permit file (and permit pages).")
+    parser.add_argument("count", type=int)
+    parser.add_argument("-o", "--output", required=True, help="Path to the csv file.")
+    parser.add_argument("--start", default="01/01/2015", help="First application date (mm/dd/yyyy).")
+    parser.add_argument("--end", default="12/31/2019", help="Last application date (mm/dd/yyyy).")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--html-dir", help="Also write permit pages to this directory.")
+    parser.add_argument("--html-count", type=int, default=100, help="Number of permit pages to write.")
+    args = parser.parse_args()
+
+    start = datetime.datetime.strptime(args.start, "%m/%d/%Y").date()
+    end = datetime.datetime.strptime(args.end, "%m/%d/%Y").date()
+    write_csv(args.output, generate_permits(args.count, start, end, seed=args.seed))
+    print(str(args.count) + " permits written to " + args.output)
+
+    if args.html_dir:
+        # The same permits as the first rows of the csv file
+        permits = itertools.islice(generate_permits(args.count, start, end, seed=args.seed), args.html_count)
+        write_html_pages(args.html_dir, permits)
+        print(str(min(args.html_count, args.count)) + " permit pages written to " + args.html_dir)
+
+
+if __name__ == "__main__":
+    main()
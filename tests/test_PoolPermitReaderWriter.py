@@ -0,0 +1,76 @@
+import csv
+import datetime
+
+import pytest
+
+from permit import COLUMNS
+from permit import DEFAULT_PERMIT_TYPE
+from PoolPermitReaderWriter import CSVReaderWriter
+from PoolPermitReaderWriter import append_permits_to_csv
+from PoolPermitReaderWriter import iter_permits
+from PoolPermitReaderWriter import merge_updates
+from synthetic_permits import generate_permits
+
+
+# Master files written before the "Permit Type" column existed
+OLD_COLUMNS = [column for column in COLUMNS if column != "Permit Type"]
+
+
+@pytest.fixture
+def permits():
+    return list(generate_permits(4, datetime.date(2019, 1, 1), datetime.date(2019, 1, 31), seed=3))
+
+
+@pytest.fixture
+def old_csv(tmp_path, permits):
+    filename = str(tmp_path / "master.csv")
+    with open(filename, mode="w", newline="") as file:
+        writer = csv.DictWriter(file, fieldnames=OLD_COLUMNS, extrasaction="ignore")
+        writer.writeheader()
+        for permit in permits[:3]:
+            writer.writerow(permit.to_row())
+    return filename
+
+
+def read_header(filename):
+    with open(filename, mode="r", newline="") as file:
+        return next(csv.reader(file))
+
+
+def test_old_file_reads_as_pool_permits(old_csv):
+    assert [permit.permit_type for _, permit in iter_permits(old_csv)] == [DEFAULT_PERMIT_TYPE] * 3
+
+
+def test_merge_updates_keeps_old_columns(old_csv, permits):
+    updated = permits[1]
+    updated.completed_date = datetime.date(2019, 6, 1)
+    merge_updates(old_csv, {1: updated})
+
+    assert read_header(old_csv) == OLD_COLUMNS
+    rows = [permit for _, permit in iter_permits(old_csv)]
+    assert rows[1].completed_date == datetime.date(2019, 6, 1)
+    assert [permit.url for permit in rows] == [permit.url for permit in permits[:3]]
+
+
+def test_append_keeps_old_columns(old_csv, permits):
+    append_permits_to_csv(old_csv, permits[3:])
+
+    assert read_header(old_csv) == OLD_COLUMNS
+    assert len(list(iter_permits(old_csv))) == 4
+
+
+def test_save_csv_keeps_old_columns(old_csv, permits):
+    csv_rw = CSVReaderWriter(old_csv, create_new_file=False)
+    csv_rw.write_permit_to_csv(permits[3])
+    csv_rw.save_csv()
+    csv_rw.close_csv()
+
+    assert read_header(old_csv) == OLD_COLUMNS
+    assert len(list(iter_permits(old_csv))) == 4
+
+
+def test_new_file_has_permit_type(tmp_path, permits):
+    filename = str(tmp_path / "new.csv")
+    append_permits_to_csv(filename, permits)
+
+    assert read_header(filename) == COLUMNS
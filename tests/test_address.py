@@ -0,0 +1,32 @@
+from address import CanonicalAddress
+from address import canonical_address
+from address import parse_address
+from zip_resolver import ZipResolver
+
+
+def test_equivalent_spellings_have_one_canonical_form():
+    assert canonical_address("1234  north Main Street\nApt. 5") == "1234 N MAIN ST APT 5"
+    assert canonical_address("1234 N Main St, Apartment 5") == "1234 N MAIN ST APT 5"
+
+
+def test_letter_suffix_is_kept():
+    assert parse_address("123A Main St") == CanonicalAddress(123, "A", "MAIN ST", "")
+    assert canonical_address("123a main street") == "123A MAIN ST"
+    assert canonical_address("123A Main St") != canonical_address("123 Main St")
+
+
+def test_fraction_is_kept():
+    assert parse_address("123 1/2 Main St") == CanonicalAddress(123, "1/2", "MAIN ST", "")
+    assert canonical_address("123 1/2 main street") == "123 1/2 MAIN ST"
+    assert canonical_address("123 1/2 Main St") != canonical_address("123 Main St")
+
+
+def test_address_without_house_number():
+    assert parse_address("Main St") is None
+    assert canonical_address("  main st ") == "MAIN ST"
+
+
+def test_resolver_keeps_suffix_and_fraction():
+    resolver = ZipResolver([("Main St", 100, 199, "O", "75201-1234")])
+    assert resolver.resolve("123A Main Street") == "123A MAIN ST\nDALLAS TX 75201-1234"
+    assert resolver.resolve("123 1/2 Main Street") == "123 1/2 MAIN ST\nDALLAS TX 75201-1234"
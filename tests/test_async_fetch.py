@@ -0,0 +1,138 @@
+import asyncio
+import datetime
+import threading
+import time
+from http.server import BaseHTTPRequestHandler
+from http.server import ThreadingHTTPServer
+
+import pytest
+
+pytest.importorskip("aiohttp")
+pytest.importorskip("bs4")
+pytest.importorskip("selenium")
+
+import async_fetch
+from async_fetch import FetchError
+from permit_state import PermitStateStore
+from scheduler import CompletionScheduler
+from synthetic_permits import generate_permits
+from synthetic_permits import permit_page_html
+from work_queue import PermitCollector
+
+
+LOGIN_PAGE = "<html><body><form id=\"login\"><input name=\"user\"></form></body></html>"
+ETAG = "\"v1\""
+
+
+class StandInHandler(BaseHTTPRequestHandler):
+    # Set by the fixture
+    pages = {}
+    delay = 0
+
+    def do_GET(self):
+        time.sleep(self.delay)
+        if self.headers.get("If-None-Match") == ETAG:
+            self.send_response(304)
+            self.end_headers()
+            return
+
+        body = self.pages.get(self.path, LOGIN_PAGE).encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", "text/html")
+        self.send_header("Content-Length", str(len(body)))
+        self.send_header("ETag", ETAG)
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+@pytest.fixture
+def server():
+    permits = list(generate_permits(30, datetime.date(2019, 1, 1), datetime.date(2019, 3, 31)))
+    server = ThreadingHTTPServer(("127.0.0.1", 0), StandInHandler)
+    base_url = "http://127.0.0.1:" + str(server.server_address[1])
+    for idx, permit in enumerate(permits):
+        permit.url = base_url + "/permit/" + str(idx)
+        StandInHandler.pages["/permit/" + str(idx)] = permit_page_html(permit)
+    StandInHandler.delay = 0
+
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield base_url, permits
+    server.shutdown()
+    server.server_close()
+
+
+def test_queued_requests_do_not_time_out(server):
+    base_url, permits = server
+    StandInHandler.delay = 0.05
+
+    async def fetch_all():
+        # 30 requests 4 at a time take longer than the timeout of one request
+        return [page async for page in async_fetch.fetch_pages([permit.url for permit in permits],
+                                                                limit_per_host=4, timeout=0.3)]
+
+    assert len(asyncio.run(fetch_all())) == len(permits)
+
+
+def test_get_permit_from_links(server):
+    _, permits = server
+    collector = PermitCollector()
+    async_fetch.get_permit_from_links([permit.url for permit in permits], collector)
+    assert sorted(permit.url for permit in collector.permits) == sorted(permit.url for permit in permits)
+
+
+def test_login_page_raises_fetch_error(server, tmp_path):
+    base_url, _ = server
+    with pytest.raises(FetchError):
+        async_fetch.get_permit_from_links([base_url + "/login"], PermitCollector())
+    with pytest.raises(FetchError):
+        async_fetch.update_permit_completion_date([(0, permits_at(base_url + "/login"))], PermitStateStore(str(tmp_path / "permits.csv")),
+                                                  CompletionScheduler([]))
+
+
+def test_time_budget_is_checked_for_not_modified_pages(server, tmp_path):
+    _, permits = server
+    state = PermitStateStore(str(tmp_path / "permits.csv"))
+    for permit in permits:
+        state.set_validators(permit.url, ETAG)  # Every page answers 304
+
+    updated_permits = async_fetch.update_permit_completion_date(list(enumerate(permits)), state,
+                                                                CompletionScheduler([], max_seconds=0))
+    assert updated_permits == []
+    assert all(state.last_checked(permit.url) is None for permit in permits)
+
+
+def permits_at(url):
+    permit = next(generate_permits(1, datetime.date(2019, 1, 1), datetime.date(2019, 1, 1)))
+    permit.url = url
+    permit.completed_date = None
+    return permit
+
+
+def test_update_file_over_http_does_not_start_a_browser(server, tmp_path, monkeypatch):
+    import web_driver
+    from synthetic_permits import write_csv
+
+    _, permits = server
+    filename = str(tmp_path / "master.csv")
+    write_csv(filename, permits)
+
+    # One uncompleted permit has completed since
+    idx, permit = next((idx, permit) for idx, permit in enumerate(permits) if not permit.is_completed)
+    permit.completed_date = datetime.date(2019, 6, 1)
+    StandInHandler.pages["/permit/" + str(idx)] = permit_page_html(permit)
+
+    def start_driver():
+        raise AssertionError("The browser was started")
+
+    saved = []
+    monkeypatch.setattr(web_driver, "start_driver", start_driver)
+    monkeypatch.setattr(web_driver, "save_updates", lambda *args: saved.append(args))
+
+    assert web_driver.update_file(filename, use_http=True)
+    _, store, csv_filename, updated_permits = saved[0]
+    assert (store, csv_filename) == (None, "master.csv")
+    assert [(idx, permit.completed_date) for idx, permit in updated_permits] == [(idx, datetime.date(2019, 6, 1))]
@@ -0,0 +1,90 @@
+import datetime
+import json
+
+import pytest
+
+import change_feed
+from PoolPermitReaderWriter import iter_permits
+from synthetic_permits import generate_permits
+from synthetic_permits import write_csv
+
+
+def read_feed(filename):
+    with open(filename) as file:
+        return [json.loads(line) for line in file]
+
+
+@pytest.fixture
+def desktop(tmp_path, monkeypatch):
+    monkeypatch.setenv("HOME", str(tmp_path))
+    desktop = tmp_path / "Desktop"
+    desktop.mkdir()
+    return desktop
+
+
+def test_diff():
+    permits = list(generate_permits(3, datetime.date(2019, 1, 1), datetime.date(2019, 1, 31), seed=1))
+    master = permits[:2]
+    new = [permits[1], permits[2]]
+    changes = list(change_feed.diff(master, new, scope=(datetime.date(2019, 1, 1), datetime.date(2019, 1, 31))))
+    assert [change["op"] for change in changes] == [change_feed.DELETE, change_feed.INSERT]
+
+    # Without a scope nothing is deleted
+    assert [change["op"] for change in change_feed.diff(master, new)] == [change_feed.INSERT]
+
+
+def test_empty_feed_replaces_a_stale_one(tmp_path):
+    filename = str(tmp_path / "changes.jsonl")
+    with open(filename, mode="w") as file:
+        file.write(json.dumps({"op": change_feed.INSERT, "id": "1", "record": {}}) + "\n")
+
+    assert change_feed.write_change_feed([None], filename) == 0
+    assert read_feed(filename) == []
+
+
+def test_refresh_without_updates_writes_an_empty_feed(tmp_path, desktop):
+    pytest.importorskip("selenium")
+    import web_driver
+
+    filename = str(tmp_path / "master.csv")
+    write_csv(filename, generate_permits(3, datetime.date(2019, 1, 1), datetime.date(2019, 1, 31), seed=2))
+    feed = desktop / "changes_master.jsonl"
+    feed.write_text(json.dumps({"op": change_feed.UPDATE, "id": "1", "changes": {}}) + "\n")
+
+    web_driver.save_updates(filename, None, "master.csv", [])
+    assert read_feed(str(feed)) == []
+
+
+def test_run_bot_writes_inserts_for_new_permits(tmp_path, desktop, monkeypatch):
+    pytest.importorskip("selenium")
+    import web_driver
+
+    master_filename = str(tmp_path / "master.csv")
+    master = list(generate_permits(3, datetime.date(2019, 1, 1), datetime.date(2019, 1, 31), seed=3))
+    write_csv(master_filename, master)
+    new = list(generate_permits(2, datetime.date(2019, 2, 1), datetime.date(2019, 2, 28), seed=4))
+
+    def get_permits(driver, csv_rw, *args):
+        for permit in new:
+            csv_rw.write_permit_to_csv(permit)
+
+    class NoUsps:
+        def close(self):
+            pass
+
+    monkeypatch.setattr(web_driver.ZipResolver, "load_default", classmethod(lambda cls: None))
+    monkeypatch.setattr(web_driver, "start_driver", lambda: None)
+    monkeypatch.setattr(web_driver, "close_driver", lambda driver: None)
+    monkeypatch.setattr(web_driver.page_selectors, "check_layout", lambda driver, page: None)
+    monkeypatch.setattr(web_driver, "get_permits", get_permits)
+    monkeypatch.setattr(web_driver, "get_full_address_for_permits", lambda driver, permits, *args: permits)
+    monkeypatch.setattr(web_driver, "UspsZipClient", NoUsps)
+
+    start = datetime.datetime(2019, 2, 1)
+    end = datetime.datetime(2019, 2, 28)
+    assert web_driver.run_bot(start, end, end - start, master_filename=master_filename)
+
+    feed = read_feed(str(desktop / "changes_Feb 01, 2019_to_Feb 28, 2019_permits.jsonl"))
+    assert [change["op"] for change in feed] == [change_feed.INSERT] * 2
+    assert [change["record"] for change in feed] == [permit.to_row() for permit in new]
+    assert len(list(iter_permits(master_filename))) == 5
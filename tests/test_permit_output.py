@@ -0,0 +1,69 @@
+import datetime
+
+import pytest
+
+from permit import Permit
+from permit_output import ARROW
+from permit_output import CSV
+from permit_output import JSONL_ZSTD
+from permit_output import PARQUET
+from permit_output import check_formats
+from permit_output import iter_records
+from permit_output import open_output
+from permit_output import permit_record
+from synthetic_permits import generate_permits
+
+
+@pytest.fixture(scope="module")
+def permits():
+    permits = list(generate_permits(25, datetime.date(2019, 1, 1), datetime.date(2019, 12, 31), seed=5))
+    # Values that couldn't be parsed from the permit page
+    permits.append(Permit("", None, "1 MAIN ST", "", "", "N/A", "https://example.com/?PosseObjectId=1"))
+    return permits
+
+
+@pytest.mark.parametrize("output_format, module", [(CSV, None), (PARQUET, "pyarrow"), (ARROW, "pyarrow"),
+                                                    (JSONL_ZSTD, "zstandard")])
+def test_round_trip(tmp_path, permits, output_format, module):
+    if module is not None:
+        pytest.importorskip(module)
+
+    filename = str(tmp_path / ("permits" + output_format))
+    # Small batches, so the permits are written in several batches (row groups)
+    with open_output(filename, batch_size=10) as output:
+        output.write_permits(permits)
+
+    records = list(iter_records(filename))
+    assert records == [permit_record(permit) for permit in permits]
+    assert records[0]["application_date"] == permits[0].application_date.isoformat()
+    assert records[-1]["application_date"] is None and records[-1]["job_value"] is None
+
+
+def test_parquet_row_groups(tmp_path, permits):
+    parquet = pytest.importorskip("pyarrow.parquet")
+
+    filename = str(tmp_path / "permits.parquet")
+    with open_output(filename, batch_size=10) as output:
+        output.write_permits(permits)
+    assert parquet.ParquetFile(filename).num_row_groups == 3
+
+
+def test_unknown_format(tmp_path):
+    with pytest.raises(ValueError):
+        open_output(str(tmp_path / "permits.xlsx"))
+    with pytest.raises(ValueError):
+        list(iter_records(str(tmp_path / "permits.xlsx")))
+    with pytest.raises(ValueError):
+        check_formats([CSV, ".xlsx"])
+
+
+def test_check_formats_reports_missing_modules(monkeypatch):
+    import permit_output
+
+    check_formats([CSV])
+    monkeypatch.setattr(permit_output.importlib.util, "find_spec", lambda name: None)
+    check_formats([CSV])
+    with pytest.raises(ImportError, match="pyarrow"):
+        check_formats([CSV, PARQUET])
+    with pytest.raises(ImportError, match="zstandard"):
+        check_formats([JSONL_ZSTD])
@@ -0,0 +1,103 @@
+import datetime
+import os
+import stat
+
+import pytest
+
+from permit import Permit
+from permit_store import PartitionedStore
+from permit_store import is_store
+
+
+BASE_URL = "https://developdallas.dallascityhall.com/Default.aspx?PossePresentation=PermitDetail&PosseObjectId="
+
+
+def permit(object_id, application_date, completed_date=None):
+    return Permit(application_date, completed_date, "1 MAIN ST", "", "", 0.0, BASE_URL + str(object_id))
+
+
+def is_read_only(filename):
+    return not os.stat(filename).st_mode & stat.S_IWUSR
+
+
+@pytest.fixture
+def store(tmp_path):
+    store = PartitionedStore(str(tmp_path / "store"))
+    store.add_permits([
+        permit(1, datetime.date(2019, 1, 5), datetime.date(2019, 1, 15)),
+        permit(2, datetime.date(2019, 1, 20), datetime.date(2019, 2, 19)),
+        permit(3, datetime.date(2019, 2, 1)),
+        permit(4, datetime.date(2019, 3, 1), datetime.date(2019, 3, 11)),
+        permit(5, None),
+    ])
+    return store
+
+
+def test_shards_and_manifest(store):
+    assert is_store(store.directory) and is_store(store.manifest_filename)
+    assert sorted(store.shards) == ["2019-01", "2019-02", "2019-03", "unknown"]
+    assert store.shards["2019-01"]["total"] == 2
+    assert store.open_shards() == ["2019-02", "unknown"]
+    assert store.days_to_completion() == {10: 2, 30: 1}
+
+    # The manifest is read back when the store is opened again
+    assert PartitionedStore(store.manifest_filename).shards == store.shards
+
+
+def test_add_permits_skips_permits_already_in_the_store(store):
+    # Same permit identity, even with another URL spelling
+    same_permit = permit(1, datetime.date(2019, 1, 5))
+    same_permit.url = same_permit.url.replace("PossePresentation=PermitDetail&", "") + "&PossePresentation=PermitDetail"
+    assert store.add_permits([same_permit, permit(3, datetime.date(2019, 2, 1)),
+                              permit(6, datetime.date(2019, 1, 7)), permit(6, datetime.date(2019, 1, 7))]) == 1
+    assert store.shards["2019-01"]["total"] == 3
+    assert len(list(store.iter_permits())) == 6
+
+
+def test_read_only_shard_reopens_for_an_open_permit(store):
+    shard = store.shard_filename("2019-03")
+    assert store.shards["2019-03"]["read_only"] and is_read_only(shard)
+
+    store.add_permits([permit(7, datetime.date(2019, 3, 20), datetime.date(2019, 3, 30))])
+    assert store.shards["2019-03"]["read_only"] and is_read_only(shard)
+
+    store.add_permits([permit(8, datetime.date(2019, 3, 21))])
+    assert not store.shards["2019-03"]["read_only"] and not is_read_only(shard)
+    assert store.shards["2019-03"] == {"total": 3, "open": 1, "read_only": False,
+                                       "days_to_completion": {"10": 2}}
+
+    # Read-only again once the open permit has completed
+    ((location, open_permit),) = [(location, permit) for location, permit in store.iter_uncompleted_permits()
+                                  if location[0] == "2019-03"]
+    open_permit.completed_date = datetime.date(2019, 4, 10)
+    store.apply_updates([(location, open_permit)])
+    assert store.shards["2019-03"]["read_only"] and is_read_only(shard)
+
+
+def test_apply_updates_updates_the_manifest(store):
+    uncompleted = list(store.iter_uncompleted_permits())
+    assert [location for location, _ in uncompleted] == [("2019-02", 0), ("unknown", 0)]
+
+    location, updated = uncompleted[0]
+    updated.completed_date = datetime.date(2019, 2, 6)
+    store.apply_updates([(location, updated)])
+
+    assert store.shards["2019-02"]["open"] == 0
+    assert store.shards["2019-02"]["days_to_completion"] == {"5": 1}
+    assert store.days_to_completion() == {10: 2, 30: 1, 5: 1}
+    assert store.open_shards() == ["unknown"]
+    assert PartitionedStore(store.directory).shards["2019-02"]["open"] == 0
+    assert [permit.completed_date for permit in store.iter_permits(datetime.date(2019, 2, 1),
+                                                                   datetime.date(2019, 2, 28))
+            if permit.url.endswith("=3")] == [datetime.date(2019, 2, 6)]
+
+
+def test_iter_permits_reads_the_shards_of_the_range(store):
+    def object_ids(*args):
+        return sorted(permit.url.rsplit("=", 1)[1] for permit in store.iter_permits(*args))
+
+    assert object_ids() == ["1", "2", "3", "4", "5"]
+    assert object_ids(datetime.date(2019, 2, 15), datetime.date(2019, 3, 1)) == ["3", "4", "5"]
+    assert object_ids(datetime.date(2019, 2, 1)) == ["3", "4", "5"]
+    assert object_ids(None, datetime.date(2019, 1, 31)) == ["1", "2", "5"]
+    assert object_ids(datetime.date(2020, 1, 1), datetime.date(2020, 12, 31)) == ["5"]
@@ -0,0 +1,83 @@
+import pytest
+
+import profiling
+
+
+@pytest.fixture(autouse=True)
+def environment(monkeypatch):
+    monkeypatch.delenv(profiling.PROFILE_VARIABLE, raising=False)
+    monkeypatch.delenv(profiling.MEMORY_VARIABLE, raising=False)
+
+
+def stack(*filenames):
+    # Innermost frame first, like JobProfiler.sample()
+    return [(filename, 1, "function") for filename in filenames]
+
+
+def test_categorize():
+    assert profiling.categorize(stack("/lib/python3/socket.py", "/site-packages/selenium/webdriver/remote/"
+                                      "remote_connection.py", "/app/web_driver.py")) == "WebDriver round trips"
+    assert profiling.categorize(stack("/site-packages/selenium/webdriver/support/wait.py",
+                                      "/site-packages/selenium/webdriver/remote/webdriver.py")) == \
+        "Waiting for pages (WebDriverWait polling)"
+    assert profiling.categorize(stack("C:\\Python\\Lib\\site-packages\\bs4\\element.py")) == "BeautifulSoup parsing"
+    assert profiling.categorize(stack("/lib/python3/csv.py", "/app/PoolPermitReaderWriter.py")) == "CSV I/O"
+    assert profiling.categorize(stack("/app/scheduler.py", "/app/web_driver.py")) == profiling.OTHER
+
+
+def test_page_kind():
+    assert profiling.page_kind("https://developdallas.dallascityhall.com/Default.aspx?PossePresentation=Permit"
+                               "&PosseObjectId=1") == "developdallas.dallascityhall.com Permit"
+    assert profiling.page_kind("https://tools.usps.com/zip-code-lookup.htm?byaddress") == "tools.usps.com"
+    assert profiling.page_kind("about:blank") == "about:blank"
+
+
+def test_not_profiled_without_the_environment_variable(monkeypatch):
+    def job_profiler(*args):
+        raise AssertionError("The job was profiled")
+
+    monkeypatch.setattr(profiling, "JobProfiler", job_profiler)
+
+    @profiling.profiled
+    def job(value):
+        assert profiling.active is None
+        return value
+
+    assert job(1) == 1
+    assert job(2, profile=False) == 2
+
+
+def test_profile_is_saved_next_to_the_output(tmp_path, monkeypatch):
+    monkeypatch.setenv(profiling.PROFILE_VARIABLE, "1")
+
+    class Driver:
+        def execute(self, driver_command, params=None):
+            return driver_command
+
+    @profiling.profiled
+    def run_bot():
+        driver = Driver()
+        profiling.attach(driver)
+        profiling.set_output_filename(str(tmp_path / "permits.csv"))
+        driver.execute("get", {"url": "https://tools.usps.com/zip-code-lookup.htm"})
+        driver.execute("findElement")
+        return True
+
+    assert run_bot()
+    assert profiling.active is None
+    report = (tmp_path / "permits.profile.txt").read_text()
+    assert report.startswith("Profile of run_bot")
+    assert "tools.usps.com (1 pages, 2.0 commands per page)" in report
+
+
+def test_failed_save_does_not_hide_the_job_error(tmp_path, capsys):
+    @profiling.profiled
+    def update_file():
+        # The report can't be saved in a directory that doesn't exist
+        profiling.set_output_filename(str(tmp_path / "missing" / "permits.csv"))
+        raise ValueError("job error")
+
+    with pytest.raises(ValueError, match="job error"):
+        update_file(profile=True)
+    assert profiling.active is None
+    assert "PROFILE ERROR" in capsys.readouterr().out
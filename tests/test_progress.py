@@ -0,0 +1,124 @@
+import threading
+
+from progress import NULL_REPORTER
+from progress import ProgressEvent
+from progress import ProgressReporter
+from progress import ProgressTracker
+from progress import Stage
+from progress import format_duration
+
+
+def tracker_at(start):
+    tracker = ProgressTracker()
+    tracker.start_time = tracker.stage_start_time = tracker.last_event_time = start
+    return tracker
+
+
+def test_drain_returns_events_published_by_another_thread():
+    reporter = ProgressReporter()
+
+    def work():
+        reporter.stage_started(Stage.SEARCH, 2)
+        reporter.page_loaded()
+        reporter.permits_found(3)
+        reporter.day_completed()
+
+    thread = threading.Thread(target=work)
+    thread.start()
+    thread.join()
+
+    events = reporter.drain()
+    assert [(event, value) for event, value, _ in events] == [
+        (ProgressEvent.STAGE_STARTED, (Stage.SEARCH, 2)),
+        (ProgressEvent.PAGE_LOADED, None),
+        (ProgressEvent.PERMITS_FOUND, 3),
+        (ProgressEvent.DAY_COMPLETED, None),
+    ]
+    timestamps = [timestamp for _, _, timestamp in events]
+    assert timestamps == sorted(timestamps)
+    assert reporter.drain() == []
+
+
+def test_null_reporter_keeps_nothing():
+    NULL_REPORTER.page_loaded()
+    NULL_REPORTER.finished(True)
+    assert NULL_REPORTER.drain() == []
+
+
+def test_stage_counters():
+    tracker = tracker_at(0.0)
+    tracker.apply(ProgressEvent.STAGE_STARTED, (Stage.SEARCH, 3), 0.0)
+    tracker.apply(ProgressEvent.DAY_COMPLETED, None, 1.0)
+    tracker.apply(ProgressEvent.PERMITS_FOUND, 4, 1.5)
+    tracker.apply(ProgressEvent.DAY_COMPLETED, None, 2.0)
+    assert (tracker.stage_done, tracker.days_done, tracker.days_total, tracker.permits_found) == (2, 2, 3, 4)
+
+    # A new stage restarts the stage counters but keeps the totals
+    tracker.apply(ProgressEvent.STAGE_STARTED, (Stage.ZIP_LOOKUP, 2), 3.0)
+    tracker.apply(ProgressEvent.ZIP_LOOKUP_COMPLETED, None, 4.0)
+    assert (tracker.stage, tracker.stage_done, tracker.zip_lookups_remaining) == (Stage.ZIP_LOOKUP, 1, 1)
+    assert (tracker.days_done, tracker.permits_found) == (2, 4)
+
+    tracker.apply(ProgressEvent.ZIP_LOOKUP_COMPLETED, None, 5.0)
+    tracker.apply(ProgressEvent.ZIP_LOOKUP_COMPLETED, None, 6.0)
+    assert tracker.zip_lookups_remaining == 0
+
+    tracker.apply(ProgressEvent.STAGE_STARTED, (Stage.UPDATE, 10), 7.0)
+    tracker.apply(ProgressEvent.PERMIT_CHECKED, None, 8.0)
+    assert tracker.stage_done == 1
+
+    assert not tracker.finished
+    tracker.apply(ProgressEvent.FINISHED, False, 9.0)
+    assert tracker.finished and tracker.success is False
+    assert tracker.seconds_since_last_event(now=12.0) == 3.0
+
+
+def test_pages_per_second_over_the_window():
+    tracker = tracker_at(0.0)
+    assert tracker.pages_per_second(now=5.0) == 0.0
+
+    for timestamp in range(1, 11):
+        tracker.apply(ProgressEvent.PAGE_LOADED, None, float(timestamp))
+    # Less than a window has passed: rate since the start
+    assert tracker.pages_per_second(now=10.0) == 1.0
+
+    # Pages older than the window are dropped
+    window = ProgressTracker.RATE_WINDOW_SECONDS
+    assert tracker.pages_per_second(now=5.0 + window) == 6 / window
+    assert tracker.pages_per_second(now=100.0 + window) == 0.0
+    assert tracker.pages_loaded == 10
+
+
+def test_eta_from_the_stage_rate():
+    tracker = tracker_at(0.0)
+    assert tracker.eta_seconds(now=1.0) is None
+
+    tracker.apply(ProgressEvent.STAGE_STARTED, (Stage.UPDATE, 10), 10.0)
+    assert tracker.eta_seconds(now=11.0) is None
+    for timestamp in (12.0, 14.0):
+        tracker.apply(ProgressEvent.PERMIT_CHECKED, None, timestamp)
+    assert tracker.eta_seconds(now=14.0) == 16.0
+
+    tracker.apply(ProgressEvent.STAGE_STARTED, (Stage.UPDATE, 0), 20.0)
+    assert tracker.eta_seconds(now=21.0) is None
+
+
+def test_status_message():
+    tracker = tracker_at(0.0)
+    assert tracker.status_message(now=1.0) == "Starting browser...\nPlease wait..."
+
+    tracker.apply(ProgressEvent.STAGE_STARTED, (Stage.SEARCH, 4), 0.0)
+    tracker.apply(ProgressEvent.PAGE_LOADED, None, 1.0)
+    tracker.apply(ProgressEvent.PERMITS_FOUND, 2, 1.0)
+    tracker.apply(ProgressEvent.DAY_COMPLETED, None, 2.0)
+    assert tracker.status_message(now=4.0).splitlines() == [
+        Stage.SEARCH + ": 1/4",
+        "Days searched: 1/4    Permits found: 2    ZIP lookups remaining: 0",
+        "Rate: 0.25 pages/sec    ETA: 12s    Last activity: 2s ago",
+    ]
+
+
+def test_format_duration():
+    assert format_duration(5.4) == "5s"
+    assert format_duration(65) == "1m 05s"
+    assert format_duration(3725) == "1h 02m 05s"
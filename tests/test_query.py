@@ -0,0 +1,62 @@
+import datetime
+
+import pytest
+
+from query import PermitQuery
+from query import contractor_key
+from synthetic_permits import generate_permits
+
+
+START = datetime.date(2018, 1, 1)
+END = datetime.date(2019, 12, 31)
+
+
+@pytest.fixture(scope="module")
+def permits():
+    return list(generate_permits(2000, START, END, seed=7))
+
+
+@pytest.fixture(scope="module")
+def query(permits):
+    return PermitQuery(permits)
+
+
+def test_filter_matches_a_scan(permits, query):
+    applied_from, applied_to = datetime.date(2018, 6, 1), datetime.date(2018, 9, 30)
+    expected = [permit for permit in permits
+                if applied_from <= permit.application_date <= applied_to and permit.job_value >= 50000 and
+                not permit.is_completed]
+    assert query.filter(applied_from=applied_from, applied_to=applied_to, min_job_value=50000.0,
+                        completed=False) == expected
+
+
+def test_filter_by_contractor_and_zip_code(permits, query):
+    contractor = permits[0].contractor.splitlines()[0].lower()
+    expected = [permit for permit in permits
+                if contractor_key(permit.contractor) == contractor.upper() and permit.zip_code == permits[0].zip_code]
+    assert expected
+    assert query.filter(contractor=contractor, zip_code=permits[0].zip_code) == expected
+
+
+def test_filter_without_constraints_returns_every_permit(permits, query):
+    assert query.filter() == permits
+
+
+@pytest.mark.parametrize("indexed", [{}, {"zip_code": "75205"}])
+def test_top_matches_a_sort(permits, query, indexed):
+    matching = [permit for permit in permits if permit.is_completed and
+                all(getattr(permit, name) == value for name, value in indexed.items())]
+    expected = sorted((permit.job_value for permit in matching), reverse=True)[:10]
+    assert [permit.job_value for permit in query.top(10, completed=True, **indexed)] == expected
+
+
+@pytest.mark.parametrize("indexed", [{}, {"zip_code": "75205"}])
+def test_top_zero_or_negative_returns_nothing(query, indexed):
+    assert query.top(0, **indexed) == []
+    assert query.top(-1, **indexed) == []
+
+
+def test_top_oldest_applications(permits, query):
+    oldest = query.top(5, by="application_date", descending=False)
+    assert [permit.application_date for permit in oldest] == \
+        sorted(permit.application_date for permit in permits)[:5]
@@ -0,0 +1,89 @@
+import csv
+
+import pytest
+
+pd = pytest.importorskip("pandas")
+pytest.importorskip("numpy")
+
+from permit import COLUMNS
+from reports import PermitReport
+from reports import build_report
+from reports import parse_dates
+
+
+def row(application_date, completed_date, zip_code, contractor, job_value):
+    return {"Application Date": application_date, "Completed Date": completed_date,
+            "Address": "1 MAIN ST, DALLAS, TX " + zip_code, "Applicant": "", "Contractor": contractor,
+            "Job Value Cost": job_value, "Permit URL": "", "Permit Type": ""}
+
+
+ROWS = [
+    row("Jan 05, 2019", "Jan 15, 2019", "75201", "Blue Pools\n123 Elm St", "$10,000.00"),
+    # Dates as written back by Excel or other tools
+    row("1/20/2019", "1/30/2019", "75201", "BLUE  POOLS", "$20,000.00"),
+    row("February 3, 2019", "", "75205", "Red Pools", "$30,000.00"),
+    row("2019-02-10", " 2019-03-12 ", "75201", "Blue Pools", "N/A"),
+    row("not a date", "", "75205", "Red Pools", "$40,000.00"),
+]
+
+
+def write_csv(path, rows):
+    with open(path, mode="w", newline="") as file:
+        writer = csv.DictWriter(file, fieldnames=COLUMNS)
+        writer.writeheader()
+        writer.writerows(rows)
+    return str(path)
+
+
+def test_parse_dates_accepts_all_date_formats():
+    dates = parse_dates(pd.Series(["Jan 05, 2019", "January 5, 2019", "1/5/2019", "01/05/2019", "2019-01-05",
+                                   " Jan 05, 2019 ", "", "Feb 30, 2019"]))
+    assert dates[:6].tolist() == [pd.Timestamp(2019, 1, 5)] * 6
+    assert dates[6:].isna().all()
+
+
+def test_report(tmp_path):
+    report = build_report([write_csv(tmp_path / "permits.csv", ROWS)])
+    assert report.total_permits == 5
+
+    per_month_zip = report.permits_per_month_and_zip()
+    assert per_month_zip.loc["2019-01", "75201"] == 2
+    assert per_month_zip.loc["2019-02", "75201"] == 1
+    assert per_month_zip.loc["2019-02", "75205"] == 1
+    assert per_month_zip.loc["unknown", "75205"] == 1
+
+    share = report.contractor_market_share()
+    assert share.loc["BLUE POOLS", "permits"] == 3
+    assert share.loc["BLUE POOLS", "job_value"] == 30000
+    assert share.loc["RED POOLS", "permit_share"] == pytest.approx(0.4)
+    assert share.loc["RED POOLS", "job_value_share"] == pytest.approx(0.7)
+
+    # 10, 10 and 30 days to completion
+    assert report.days_to_completion.sum() == 3
+    assert report.time_to_completion(percentiles=(50, 100)).tolist() == [10, 30]
+
+    # Within a bin of the smallest and largest of the 4 job values
+    percentiles = report.job_value_percentiles(percentiles=(10, 90))
+    assert percentiles[10] == pytest.approx(10000, rel=0.02)
+    assert percentiles[90] == pytest.approx(40000, rel=0.02)
+
+
+def test_chunks_accumulate(tmp_path):
+    filename = write_csv(tmp_path / "permits.csv", ROWS)
+    whole = build_report([filename])
+    chunked = build_report([filename, filename], chunk_size=2)
+
+    assert chunked.total_permits == 2 * whole.total_permits
+    assert chunked.permits_per_month_and_zip().equals(2 * whole.permits_per_month_and_zip())
+    assert (chunked.contractor_market_share()["permits"] == 2 * whole.contractor_market_share()["permits"]).all()
+    assert (chunked.days_to_completion == 2 * whole.days_to_completion).all()
+    assert (chunked.job_value_histogram == 2 * whole.job_value_histogram).all()
+
+
+def test_empty_report():
+    report = PermitReport()
+    assert report.permits_per_month_and_zip().empty
+    assert report.contractor_market_share().empty
+    assert report.time_to_completion().isna().all()
+    assert report.job_value_percentiles().isna().all()
+    assert "Permits: 0" in report.summary()
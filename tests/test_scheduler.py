@@ -0,0 +1,105 @@
+import datetime
+
+import pytest
+
+from permit import Permit
+from scheduler import CompletionScheduler
+
+
+TODAY = datetime.date(2020, 6, 1)
+
+
+class State:
+    def __init__(self, last_checked=None):
+        self.checked = last_checked or {}
+
+    def last_checked(self, url):
+        return self.checked.get(url)
+
+
+def permit(url, days_old, completed_after=None):
+    application_date = TODAY - datetime.timedelta(days=days_old)
+    completed_date = application_date + datetime.timedelta(days=completed_after) if completed_after else ""
+    return Permit(application_date, completed_date, "1 MAIN ST", "", "", 0.0, url)
+
+
+@pytest.fixture
+def scheduler():
+    # Half the permits complete within 10 days, the rest within 20
+    return CompletionScheduler([10] * 20 + [20] * 20)
+
+
+def test_survival(scheduler):
+    assert scheduler.survival(-1) == 1.0
+    assert scheduler.survival(0) == 1.0
+    assert scheduler.survival(9) == 1.0
+    assert scheduler.survival(10) == 0.5
+    assert scheduler.survival(19) == 0.5
+    assert scheduler.survival(20) == 0.0
+    assert scheduler.survival(1000) == 0.0
+
+
+def test_too_few_samples_use_the_default_distribution():
+    scheduler = CompletionScheduler([5] * (CompletionScheduler.MIN_SAMPLES - 1))
+    defaults = CompletionScheduler.DEFAULT_DAYS_TO_COMPLETION
+    assert scheduler.total == len(defaults)
+    assert scheduler.survival(defaults[0]) == 1 - 1 / len(defaults)
+
+
+def test_from_permits_learns_completed_permits_only():
+    permits = [permit(str(idx), 100, 10) for idx in range(30)] + [permit("open", 100)]
+    scheduler = CompletionScheduler.from_permits(iter(permits))
+    assert scheduler.total == 30
+    assert scheduler.survival(9) == 1.0
+    assert scheduler.survival(10) == 0.0
+
+
+def test_completion_probability(scheduler):
+    # Never checked, past the first wave
+    assert scheduler.completion_probability(permit("a", 15), None, TODAY) == 0.5
+    # Checked at day 12: nothing completes until day 20
+    checked = TODAY - datetime.timedelta(days=3)
+    assert scheduler.completion_probability(permit("a", 15), checked, TODAY) == scheduler.TAIL_PROBABILITY
+    # Checked at day 12, now past day 20: every remaining permit has completed
+    assert scheduler.completion_probability(permit("a", 25), TODAY - datetime.timedelta(days=13), TODAY) == 1.0
+    # Older than every completion seen
+    assert scheduler.completion_probability(permit("a", 50), TODAY - datetime.timedelta(days=10),
+                                            TODAY) == scheduler.TAIL_PROBABILITY
+    # Already checked today
+    assert scheduler.completion_probability(permit("a", 25), TODAY, TODAY) == 0.0
+    # Unparsed application date
+    assert scheduler.completion_probability(Permit("", "", "", "", "", 0.0, "b"), None, TODAY) == 1.0
+
+
+def test_schedule_orders_by_probability_then_file_order(scheduler):
+    permits = [permit("young", 5), permit("first wave", 15), permit("done", 25), permit("second wave", 15)]
+    state = State({"done": datetime.datetime.combine(TODAY - datetime.timedelta(days=13), datetime.time())})
+    ordered = scheduler.schedule(list(enumerate(permits)), state, TODAY)
+    assert [permit.url for _, permit in ordered] == ["done", "first wave", "second wave", "young"]
+    assert [idx for idx, _ in ordered] == [2, 1, 3, 0]
+
+
+def test_schedule_stops_at_the_page_budget():
+    scheduler = CompletionScheduler([10] * 20 + [20] * 20, max_pages=2)
+    permits = [permit("young", 5), permit("a", 15), permit("b", 15)]
+    assert [permit.url for _, permit in scheduler.schedule(list(enumerate(permits)), State(), TODAY)] == ["a", "b"]
+
+
+def test_out_of_time(monkeypatch):
+    import scheduler as scheduler_module
+
+    now = [100.0]
+    monkeypatch.setattr(scheduler_module.time, "monotonic", lambda: now[0])
+
+    unlimited = CompletionScheduler([], max_seconds=None)
+    unlimited.start()
+    now[0] += 10 ** 6
+    assert not unlimited.out_of_time()
+
+    limited = CompletionScheduler([], max_seconds=60)
+    assert not limited.out_of_time()  # Not started yet
+    limited.start()
+    now[0] += 59
+    assert not limited.out_of_time()
+    now[0] += 1
+    assert limited.out_of_time()
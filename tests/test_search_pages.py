@@ -0,0 +1,231 @@
+import datetime
+import os
+
+import pytest
+
+lxml_html = pytest.importorskip("lxml.html")
+pytest.importorskip("selenium")
+
+from selenium.common.exceptions import StaleElementReferenceException
+
+import page_selectors
+import web_driver
+from EC_permit_result import PermitResult
+from EC_permit_result import ResultType
+from page_selectors import LayoutChanged
+from permit_index import PermitIndex
+
+
+FIXTURES = os.path.join(os.path.dirname(os.path.abspath(__file__)), "fixtures")
+PERMIT_URL = "https://developdallas.dallascityhall.com/Default.aspx?PossePresentation=Permit&PosseObjectId="
+
+
+class FakeElement:
+    """
+    An element of a saved page. Like a WebElement, it
+    goes stale once the driver has loaded another page.
+
+    """
+
+    def __init__(self, driver, page, node):
+        self.driver = driver
+        self.page = page
+        self.node = node
+
+    def check(self):
+        if self.driver.page is not self.page:
+            raise StaleElementReferenceException("The page has been replaced")
+
+    @property
+    def text(self):
+        self.check()
+        return " ".join(self.node.text_content().split())
+
+    def get_attribute(self, name):
+        self.check()
+        return self.node.get(name)
+
+    def is_enabled(self):
+        self.check()
+        return True
+
+    def find_elements_by_xpath(self, xpath):
+        self.check()
+        return [FakeElement(self.driver, self.page, node) for node in self.node.xpath(xpath)]
+
+    def click(self):
+        self.check()
+        # Pager links of the fixtures lead to another fixture
+        self.driver.get(self.node.get("href"))
+
+
+class FakeDriver:
+    """
+    Stands in for a WebDriver: evaluates the XPaths with
+    lxml on the pages saved in tests/fixtures.
+
+    """
+
+    def __init__(self):
+        self.page = None
+        self.current_url = None
+        self.loaded = []
+
+    def get(self, url):
+        self.current_url = url
+        self.loaded.append(os.path.basename(url))
+        self.page = lxml_html.parse(os.path.join(FIXTURES, os.path.basename(url))).getroot()
+
+    def find_elements_by_xpath(self, xpath):
+        return [FakeElement(self, self.page, node) for node in self.page.xpath(xpath)]
+
+
+@pytest.fixture(autouse=True)
+def preferred(monkeypatch):
+    preferred = {}
+    monkeypatch.setattr(page_selectors, "preferred", preferred)
+    return preferred
+
+
+def driver_at(filename):
+    driver = FakeDriver()
+    driver.get(filename)
+    return driver
+
+
+def test_find_falls_back_and_prefers_what_matched(preferred):
+    driver = driver_at("search_page.html")
+    assert page_selectors.find(driver, "search.search_button").get_attribute("value") == "Search"
+    assert preferred["search.search_button"] == 0
+
+    driver.get("search_page_renamed.html")
+    assert page_selectors.find(driver, "search.search_button").get_attribute("value") == "Search Permits"
+    assert page_selectors.find(driver, "search.application_date").get_attribute("id") == "CreatedDate_2000417_S0"
+    assert preferred["search.search_button"] == 1
+    assert page_selectors.find_all(driver, "search.application_date_end") == []
+
+
+def test_preferred_xpath_is_tried_first(preferred):
+    tried = []
+
+    class Context:
+        def find_elements_by_xpath(self, xpath):
+            tried.append(page_selectors.SELECTORS["zip.city"].index(xpath))
+            return ["city"]
+
+    preferred["zip.city"] = 1
+    assert page_selectors.find(Context(), "zip.city") == "city"
+    assert tried == [1]
+    assert page_selectors.ordered_xpaths("zip.city") == page_selectors.SELECTORS["zip.city"][1::-1]
+
+
+def test_check_layout():
+    driver = FakeDriver()
+    page_selectors.check_layout(driver, page_selectors.SEARCH_PAGE, "search_page.html")
+    page_selectors.check_layout(driver, page_selectors.SEARCH_PAGE, "search_page_renamed.html")
+
+    with pytest.raises(LayoutChanged) as error:
+        page_selectors.check_layout(driver, page_selectors.SEARCH_PAGE, "search_page_changed.html")
+    assert error.value.page == page_selectors.SEARCH_PAGE
+    assert error.value.missing == ["search.search_button"]
+
+
+@pytest.mark.parametrize("filename, next_page", [
+    # A page number in a cell each
+    ("results_page_1.html", "results_page_2.html"),
+    # Page numbers side by side in one cell
+    ("results_page_2.html", "results_page_3.html"),
+    # The last page. Its "Next" link is in a permit row, not in the pager.
+    ("results_page_3.html", None),
+    # A "Next" link in the pager
+    ("results_endless.html", "results_endless.html"),
+])
+def test_next_page_link_is_in_the_pager(filename, next_page):
+    links = page_selectors.find_all(driver_at(filename), "results.next_page")
+    assert [link.get_attribute("href") for link in links[:1]] == ([next_page] if next_page else [])
+
+
+def test_links_of_every_result_page():
+    driver = driver_at("results_page_1.html")
+    links = web_driver.get_all_links_to_permits(driver)
+
+    # Cancelled permits and permits without a street are left out, and
+    # permits listed on more than one page are only listed once
+    assert links == [PERMIT_URL + str(object_id) for object_id in (101, 104, 201, 202, 301)]
+    assert driver.loaded == ["results_page_1.html", "results_page_2.html", "results_page_3.html"]
+
+
+def test_pager_that_never_ends_is_capped(capsys):
+    driver = driver_at("results_endless.html")
+    links = web_driver.get_all_links_to_permits(driver, max_pages=5)
+
+    assert links == [PERMIT_URL + "501"]
+    assert len(driver.loaded) == 5
+    assert "WARNING" in capsys.readouterr().out
+
+
+@pytest.mark.parametrize("window_days, results, max_window_days, expected", [
+    (4, 0, 16, 8),     # Quiet: doubles
+    (16, 0, 16, 16),   # ...up to the maximum
+    (1, 0, 1, 1),      # The site only searches single dates
+    (4, 100, 16, 4),   # Neither quiet nor busy
+    (4, 200, 16, 2),   # Busy: halves
+    (1, 200, 16, 1),   # ...down to one day
+])
+def test_next_window_days(window_days, results, max_window_days, expected):
+    assert web_driver.next_window_days(window_days, results, max_window_days) == expected
+
+
+class FakeField:
+    def __init__(self):
+        self.value = None
+
+    def get_attribute(self, name):
+        return self.value
+
+    def clear(self):
+        self.value = None
+
+    def send_keys(self, text):
+        self.value = text
+
+
+def test_truncated_window_is_searched_again_in_halves(monkeypatch):
+    application_date = FakeField()
+    application_date_end = FakeField()
+    searches = []
+
+    class ApplicationType:
+        def select_by_value(self, value):
+            pass
+
+    class SearchButton:
+        def click(self):
+            searches.append((application_date.value, application_date_end.value))
+
+    class Wait:
+        def __init__(self, driver, timeout):
+            pass
+
+        def until(self, condition):
+            return ResultType.MULTIPLE if isinstance(condition, PermitResult) else True
+
+    def is_result_truncated(driver):
+        # The site truncates the results of windows longer than 4 days
+        start, end = (datetime.datetime.strptime(date, "%b %d, %Y") for date in searches[-1])
+        return (end - start).days + 1 > 4
+
+    form = (application_date, application_date_end, ApplicationType(), SearchButton())
+    monkeypatch.setattr(web_driver, "get_form_for_permit_search", lambda driver, reload=True: form)
+    monkeypatch.setattr(web_driver, "WebDriverWait", Wait)
+    monkeypatch.setattr(web_driver, "is_result_truncated", is_result_truncated)
+    monkeypatch.setattr(web_driver, "get_all_links_to_permits", lambda driver, progress: [])
+
+    web_driver.get_permits(None, None, datetime.timedelta(days=15), datetime.datetime(2019, 1, 1), PermitIndex())
+
+    def days(first, last):
+        return ("Jan " + format(first, "02") + ", 2019", "Jan " + format(last, "02") + ", 2019")
+
+    # Quiet windows double; truncated ones are searched again in halves
+    assert searches == [days(1, 1), days(2, 3), days(4, 7), days(8, 15), days(8, 11), days(12, 16),
+                        days(12, 13), days(14, 16)]
@@ -0,0 +1,90 @@
+import json
+import threading
+from http.server import BaseHTTPRequestHandler
+from http.server import ThreadingHTTPServer
+from urllib.parse import parse_qs
+
+import pytest
+
+pytest.importorskip("requests")
+pytest.importorskip("selenium")
+pytest.importorskip("bs4")
+
+import scraper
+from EC_zip_code_result import ZipCodeResultType
+from usps_client import ZIP_BY_ADDRESS_PATH
+from usps_client import UspsZipClient
+
+
+# Answers of the stand-in server, by address1
+ADDRESSES = {
+    "1234 N MAIN ST": {"addressLine1": "1234 N MAIN ST", "city": "DALLAS", "state": "TX",
+                       "zip5": "75201", "zip4": "1234"},
+    "55 ELM ST APT 5": {"addressLine1": "55 ELM ST", "addressLine2": "APT 5", "city": "DALLAS", "state": "TX",
+                        "zip5": "75202", "zip4": "0001"},
+}
+BROKEN_ADDRESS = "500 SERVER ERROR"
+
+
+class StandInHandler(BaseHTTPRequestHandler):
+    def do_POST(self):
+        form = parse_qs(self.rfile.read(int(self.headers["Content-Length"])).decode("utf-8"))
+        address1 = form["address1"][0]
+        if self.path != ZIP_BY_ADDRESS_PATH or address1 == BROKEN_ADDRESS:
+            self.send_response(500)
+            self.end_headers()
+            return
+
+        if address1 in ADDRESSES:
+            result = {"resultStatus": "SUCCESS", "addressList": [ADDRESSES[address1]]}
+        else:
+            result = {"resultStatus": "ADDRESS NOT FOUND"}
+        body = json.dumps(result).encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+@pytest.fixture
+def client():
+    server = ThreadingHTTPServer(("127.0.0.1", 0), StandInHandler)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    client = UspsZipClient("http://127.0.0.1:" + str(server.server_address[1]), timeout=5)
+    yield client
+    client.close()
+    server.shutdown()
+    server.server_close()
+
+
+def test_lookup_found(client):
+    assert client.lookup("1234 N MAIN ST") == (ZipCodeResultType.FOUND, "1234 N MAIN ST\nDALLAS TX 75201-1234")
+
+
+def test_lookup_secondary_line(client):
+    assert client.lookup("55 ELM ST APT 5") == (ZipCodeResultType.FOUND, "55 ELM ST\nAPT 5\nDALLAS TX 75202-0001")
+
+
+def test_lookup_not_found(client):
+    assert client.lookup("1 NOWHERE LN") == (ZipCodeResultType.ERROR, "")
+
+
+def test_lookup_many_keeps_order_and_reports_failures(client):
+    results = list(client.lookup_many(["1 NOWHERE LN", BROKEN_ADDRESS, "1234 N MAIN ST"]))
+    assert results == [(ZipCodeResultType.ERROR, ""), None,
+                       (ZipCodeResultType.FOUND, "1234 N MAIN ST\nDALLAS TX 75201-1234")]
+
+
+def test_same_format_as_browser_lookup(client):
+    # Layout of the zipcode-result-address div on the USPS page
+    page = ("<html><body><div class=\"zipcode-result-address\">\n"
+            "      <p>1234 N MAIN ST</p>\n"
+            "      <p>DALLAS TX <strong>75201-1234</strong></p>\n"
+            "    </div></body></html>")
+    _, full_address = client.lookup("1234 N MAIN ST")
+    assert scraper.get_address_with_zip_code(page) == full_address
@@ -0,0 +1,210 @@
+import datetime
+import time
+
+import pytest
+
+import work_queue
+from work_queue import DONE
+from work_queue import FAILED
+from work_queue import LEASED
+from work_queue import PENDING
+from work_queue import REFRESH
+from work_queue import SEARCH
+from work_queue import Heartbeat
+from work_queue import ProgressWatchdog
+from work_queue import WorkQueue
+
+
+class Clock:
+    def __init__(self):
+        self.now = 1000000.0
+
+    def __call__(self):
+        return self.now
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = Clock()
+    monkeypatch.setattr(work_queue.time, "time", clock)
+    return clock
+
+
+@pytest.fixture
+def queue(tmp_path):
+    queue = WorkQueue(str(tmp_path / "queue.sqlite"), lease_seconds=60, max_attempts=2)
+    yield queue
+    queue.close()
+
+
+def state(queue, task_id):
+    return queue.connection.execute("SELECT state FROM tasks WHERE id = ?", (task_id,)).fetchone()[0]
+
+
+def test_lease_oldest_task_once(queue, clock):
+    queue.enqueue(SEARCH, {"n": 1})
+    queue.enqueue(REFRESH, {"n": 2})
+    queue.enqueue(SEARCH, {"n": 3})
+
+    assert queue.lease("a", [REFRESH]).payload == {"n": 2}
+    first = queue.lease("a")
+    second = queue.lease("b")
+    assert (first.payload, second.payload) == ({"n": 1}, {"n": 3})
+    assert first.attempts == 1
+    assert queue.lease("c") is None
+
+    assert queue.complete(first.id, "a", {"permits": []})
+    assert state(queue, first.id) == DONE
+    assert list(queue.results(SEARCH)) == [{"permits": []}]
+    assert not queue.is_finished(SEARCH)
+
+
+def test_heartbeat_keeps_the_lease(queue, clock):
+    queue.enqueue(SEARCH, {})
+    task = queue.lease("a")
+
+    clock.now += 50
+    assert queue.heartbeat(task.id, "a")
+    clock.now += 50
+    assert queue.lease("b") is None
+    assert not queue.heartbeat(task.id, "b")
+
+
+def test_expired_lease_goes_to_the_next_worker(queue, clock):
+    queue.enqueue(SEARCH, {})
+    task = queue.lease("a")
+
+    clock.now += 61
+    retry = queue.lease("b")
+    assert retry.id == task.id
+    assert retry.attempts == 2
+
+    # The first worker can neither renew nor complete it anymore
+    assert not queue.heartbeat(task.id, "a")
+    assert not queue.complete(task.id, "a", {})
+    assert queue.complete(task.id, "b", {})
+
+
+def test_expired_lease_without_attempts_left_fails(queue, clock):
+    queue.enqueue(SEARCH, {})
+    task = queue.lease("a")
+    clock.now += 61
+    queue.lease("b")
+    clock.now += 61
+
+    assert queue.lease("c") is None
+    assert state(queue, task.id) == FAILED
+    assert queue.is_finished(SEARCH)
+
+
+def test_requeue_expired(queue, clock):
+    queue.enqueue(SEARCH, {})
+    queue.enqueue(SEARCH, {})
+    first = queue.lease("a")
+    queue.fail(first.id, "a", "error")
+    first = queue.lease("a")
+    second = queue.lease("a")
+
+    clock.now += 61
+    assert queue.requeue_expired() == 2
+    assert state(queue, first.id) == FAILED
+    assert state(queue, second.id) == PENDING
+
+
+def test_failed_task_is_retried_until_max_attempts(queue, clock):
+    queue.enqueue(SEARCH, {})
+    task = queue.lease("a")
+    queue.fail(task.id, "a", "first error")
+    assert state(queue, task.id) == PENDING
+
+    task = queue.lease("b")
+    assert task.attempts == 2
+    queue.fail(task.id, "b", "second error")
+    assert state(queue, task.id) == FAILED
+    assert queue.lease("c") is None
+
+
+def wait_for(heartbeat, seconds=5):
+    heartbeat.join(seconds)
+    assert not heartbeat.is_alive()
+
+
+def test_heartbeat_stops_when_the_task_stalls(queue):
+    queue.enqueue(SEARCH, {})
+    task = queue.lease("a")
+
+    heartbeat = Heartbeat(queue.path, task.id, "a", 0.01, ProgressWatchdog(0.05))
+    heartbeat.start()
+    wait_for(heartbeat)
+    assert heartbeat.stalled
+    assert not heartbeat.lease_lost
+    assert state(queue, task.id) == LEASED
+
+
+def test_heartbeat_renews_while_the_task_progresses(queue):
+    queue.enqueue(SEARCH, {})
+    task = queue.lease("a")
+    expires = queue.connection.execute("SELECT lease_expires FROM tasks").fetchone()[0]
+
+    watchdog = ProgressWatchdog(0.5)
+    heartbeat = Heartbeat(queue.path, task.id, "a", 0.01, watchdog)
+    heartbeat.start()
+    for _ in range(10):
+        watchdog.page_loaded()
+        time.sleep(0.02)
+    heartbeat.stop()
+
+    assert not heartbeat.stalled
+    assert queue.connection.execute("SELECT lease_expires FROM tasks").fetchone()[0] > expires
+
+
+def test_heartbeat_renews_for_the_queue_lease(queue):
+    queue.enqueue(SEARCH, {})
+    task = queue.lease("a")
+
+    watchdog = ProgressWatchdog(0.5)
+    heartbeat = Heartbeat(queue.path, task.id, "a", 0.01, watchdog, queue.lease_seconds)
+    heartbeat.start()
+    time.sleep(0.05)
+    heartbeat.stop()
+
+    # Renewed for the queue's 60 seconds, not the default 300
+    expires = queue.connection.execute("SELECT lease_expires FROM tasks").fetchone()[0]
+    assert time.time() < expires <= time.time() + 60
+
+
+def test_refresh_state_is_merged_into_the_master(queue, tmp_path, monkeypatch):
+    pytest.importorskip("selenium")
+    import web_driver
+    from permit_state import PermitStateStore
+    from synthetic_permits import generate_permits
+    from synthetic_permits import write_csv
+
+    master_filename = str(tmp_path / "master.csv")
+    permits = list(generate_permits(4, datetime.date(2019, 1, 1), datetime.date(2019, 1, 31), seed=1))
+    for permit in permits:
+        permit.completed_date = None
+    write_csv(master_filename, permits)
+    state = PermitStateStore(master_filename)
+    state.mark_checked(permits[0].url, datetime.datetime(2019, 2, 1))
+    state.save()
+
+    work_queue.enqueue_refresh(queue, master_filename, permits_per_task=4)
+    task = queue.lease("a")
+    assert task.payload["state"] == {permits[0].url: {"last_checked": "2019-02-01T00:00:00"}}
+
+    def update_permit_completion_date(driver, uncompleted_permits, state, scheduler, progress):
+        # The worker sees the master's state
+        assert state.last_checked(permits[0].url) == datetime.datetime(2019, 2, 1)
+        for _, permit in uncompleted_permits:
+            state.mark_checked(permit.url, datetime.datetime(2019, 3, 1))
+        idx, permit = uncompleted_permits[1]
+        permit.completed_date = datetime.date(2019, 2, 15)
+        return [(idx, permit)]
+
+    monkeypatch.setattr(web_driver, "update_permit_completion_date", update_permit_completion_date)
+    assert queue.complete(task.id, "a", work_queue.run_task(None, task, ProgressWatchdog(60)))
+    assert work_queue.merge_refresh_results(queue, master_filename) == 1
+
+    state = PermitStateStore(master_filename)
+    assert all(state.last_checked(permit.url) == datetime.datetime(2019, 3, 1) for permit in permits)
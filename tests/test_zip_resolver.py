@@ -0,0 +1,147 @@
+import csv
+import struct
+from types import SimpleNamespace
+
+import pytest
+
+import build_street_zip
+from zip_resolver import MissingReferenceData
+from zip_resolver import REFERENCE_FILENAME
+from zip_resolver import ZipResolver
+
+
+@pytest.fixture
+def resolver():
+    return ZipResolver([
+        # Both sides of Elm St, one ZIP per side
+        ("Elm Street", 100, 198, "E", "75201-1000"),
+        ("Elm St", 101, 199, "O", "75201-2000"),
+        # A long segment with a shorter one inside it, then two that overlap
+        ("N Main St", 1, 999, "B", "75202-1000"),
+        ("North Main Street", 200, 210, "B", "75202-2000"),
+        ("Oak Ln", 500, 300, "B", "75203-1000"),  # Reversed range
+        ("Oak Lane", 350, 400, "B", "75203-2000"),
+    ])
+
+
+def test_lookup_by_side(resolver):
+    assert resolver.lookup(150, "ELM ST") == {"75201-1000"}
+    assert resolver.lookup(151, "ELM ST") == {"75201-2000"}
+    assert resolver.lookup(200, "ELM ST") == set()
+    assert resolver.lookup(150, "ELM AVE") == set()
+
+
+def test_lookup_overlapping_ranges(resolver):
+    assert resolver.lookup(5, "N MAIN ST") == {"75202-1000"}
+    assert resolver.lookup(205, "N MAIN ST") == {"75202-1000", "75202-2000"}
+    assert resolver.lookup(500, "N MAIN ST") == {"75202-1000"}
+    assert resolver.lookup(300, "OAK LN") == {"75203-1000"}
+    assert resolver.lookup(375, "OAK LN") == {"75203-1000", "75203-2000"}
+    assert resolver.lookup(501, "OAK LN") == set()
+
+
+def test_resolve(resolver):
+    assert resolver.resolve("150 elm street") == "150 ELM ST\nDALLAS TX 75201-1000"
+    assert resolver.resolve("5 North Main St\nApt 2") == "5 N MAIN ST APT 2\nDALLAS TX 75202-1000"
+    # Ambiguous, unknown or unparsed addresses are left to the USPS lookup
+    assert resolver.resolve("205 N Main St") is None
+    assert resolver.resolve("200 Elm St") is None
+    assert resolver.resolve("Elm St") is None
+
+
+class UspsClient:
+    def __init__(self):
+        self.addresses = []
+
+    def lookup_many(self, addresses):
+        self.addresses.extend(addresses)
+        for address in addresses:
+            yield address, address + "\nDALLAS TX 75202-3000"
+
+
+def test_unresolved_addresses_go_to_usps(resolver):
+    pytest.importorskip("selenium")
+    from web_driver import get_full_address_for_permits
+
+    permits = [SimpleNamespace(address="150 Elm St"), SimpleNamespace(address="205 N Main St"),
+               SimpleNamespace(address="205 north main street")]
+    usps_client = UspsClient()
+    permits = get_full_address_for_permits(None, permits, resolver, usps_client)
+
+    # Equivalent addresses are looked up once
+    assert usps_client.addresses == ["205 N MAIN ST"]
+    assert [permit.address for permit in permits] == ["150 ELM ST\nDALLAS TX 75201-1000",
+                                                      "205 N MAIN ST\nDALLAS TX 75202-3000",
+                                                      "205 N MAIN ST\nDALLAS TX 75202-3000"]
+
+
+def write_rows(filename, columns, rows):
+    with open(filename, mode="w", newline="") as file:
+        writer = csv.writer(file)
+        writer.writerow(columns)
+        writer.writerows(rows)
+
+
+def test_load_needs_zip_plus_4(tmp_path):
+    filename = str(tmp_path / "streets.csv")
+    write_rows(filename, ["Street", "From", "To", "Parity", "ZIP", "ZIP4"], [
+        ["Elm St", "100", "198", "E", "75201", "1000"],
+        ["Elm St", "101", "199", "O", "75201-2000", ""],
+        ["Oak Ln", "1", "99", "", "75203", ""],  # No +4
+        ["Pine St", "x", "99", "", "75204", "1000"],  # Malformed
+    ])
+    resolver = ZipResolver.load(filename)
+    assert len(resolver) == 1
+    assert resolver.lookup(150, "ELM ST") == {"75201-1000"}
+    assert resolver.lookup(151, "ELM ST") == {"75201-2000"}
+
+
+def test_load_default_fails_without_data(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    with pytest.raises(MissingReferenceData):
+        ZipResolver.load_default()
+
+    write_rows(REFERENCE_FILENAME, ["Street", "From", "To", "Parity", "ZIP"], [["Elm St", "1", "9", "B", "75201"]])
+    with pytest.raises(MissingReferenceData):
+        ZipResolver.load_default()
+
+
+def write_dbf(filename, fields, records):
+    """
+    Write a minimal dBASE III table, as found in the
+    ADDRFEAT downloads.
+
+    """
+
+    record_length = 1 + sum(length for _, length in fields)
+    header_length = 32 + 32 * len(fields) + 1
+    with open(filename, mode="wb") as file:
+        file.write(struct.pack("<BBBBIHH20x", 3, 123, 1, 1, len(records), header_length, record_length))
+        for name, length in fields:
+            file.write(struct.pack("<11sc4xB15x", name.encode("ascii"), b"C", length))
+        file.write(b"\r")
+        for deleted, values in records:
+            file.write(b"*" if deleted else b" ")
+            for (name, length), value in zip(fields, values):
+                file.write(value.encode("ascii").ljust(length))
+        file.write(b"\x1a")
+
+
+def test_build_from_addrfeat(tmp_path, monkeypatch):
+    fields = [("FULLNAME", 20), ("LFROMHN", 6), ("LTOHN", 6), ("RFROMHN", 6), ("RTOHN", 6),
+              ("ZIPL", 5), ("ZIPR", 5), ("PARITYL", 1), ("PARITYR", 1), ("PLUS4L", 4), ("PLUS4R", 4)]
+    addrfeat = str(tmp_path / "addrfeat.dbf")
+    write_dbf(addrfeat, fields, [
+        (False, ["Elm St", "100", "198", "101", "199", "75201", "75201", "E", "O", "1000", "2000"]),
+        (False, ["Main St", "1", "99", "", "", "75040", "", "B", "", "1000", ""]),  # Garland
+        (True, ["Oak Ln", "1", "99", "", "", "75203", "", "B", "", "1000", ""]),  # Deleted
+    ])
+
+    output = str(tmp_path / REFERENCE_FILENAME)
+    assert build_street_zip.build([addrfeat], output) == (2, 2)
+
+    resolver = ZipResolver.load(output)
+    assert resolver.lookup(150, "ELM ST") == {"75201-1000"}
+    assert resolver.lookup(151, "ELM ST") == {"75201-2000"}
+    assert resolver.lookup(50, "MAIN ST") == set()
+    assert resolver.lookup(50, "OAK LN") == set()
@@ -0,0 +1,150 @@
+from concurrent.futures import ThreadPoolExecutor
+
+import requests
+from requests.adapters import HTTPAdapter
+
+from address import format_full_address
+from EC_zip_code_result import ZipCodeResultType
+
+
+# The USPS ZIP Code Lookup page (tools.usps.com/zip-code-lookup.htm) submits
+# its "by address" form to this endpoint and renders the JSON it returns.
+USPS_BASE_URL = "https://tools.usps.com"
+ZIP_BY_ADDRESS_PATH = "/tools/app/ziplookup/zipByAddress"
+
+HEADERS = {
+    "User-Agent": "Mozilla/5.0 (Macintosh; Intel Mac OS X 10_15_7) AppleWebKit/537.36 "
+                  "(KHTML, like Gecko) Chrome/118.0 Safari/537.36",
+    "Referer": "https://tools.usps.com/zip-code-lookup.htm?byaddress",
+    "Accept": "application/json, text/javascript, */*; q=0.01",
+    "X-Requested-With": "XMLHttpRequest",
+}
+
+
+class UspsZipClient:
+    def __init__(self, base_url=USPS_BASE_URL, max_in_flight=8, timeout=10):
+        """
+        Initialize a UspsZipClient object. Requests share
+        one keep-alive connection pool, and at most
+        @max_in_flight of them run at the same time.
+
+        Parameters
+        ----------
+        base_url: str
+            Scheme and host of the lookup service. Point
+            this at a local stand-in server for testing.
+        max_in_flight: int
+            Maximum number of concurrent requests.
+        timeout: float
+            Seconds to wait for each response, same as
+            the WebDriverWait used by the browser lookup.
+
+        """
+
+        self.url = base_url.rstrip("/") + ZIP_BY_ADDRESS_PATH
+        self.max_in_flight = max_in_flight
+        self.timeout = timeout
+
+        self.session = requests.Session()
+        self.session.headers.update(HEADERS)
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=max_in_flight)
+        self.session.mount("http://", adapter)
+        self.session.mount("https://", adapter)
+
+    def lookup(self, address, city="DALLAS", state="TX"):
+        """
+        Look up the full address (with zip code) of
+        a street address.
+
+        Parameters
+        ----------
+        address: str
+            The street address.
+        city: str
+        state: str
+
+        Returns
+        -------
+        tuple
+            A 2-tuple containing the ZipCodeResultType
+            and the full address. The full address is ""
+            when the result is ZipCodeResultType.ERROR,
+            same as the browser lookup.
+
+        Raises
+        ------
+        requests.RequestException
+            If the request failed or the response
+            isn't a lookup result.
+
+        """
+
+        form = {
+            "companyName": "",
+            "address1": address,
+            "address2": "",
+            "city": city,
+            "state": state,
+            "urbanCode": "",
+            "zip": "",
+        }
+        response = self.session.post(self.url, data=form, timeout=self.timeout)
+        response.raise_for_status()
+
+        try:
+            result = response.json()
+        except ValueError:
+            raise requests.RequestException("USPS returned a response that isn't JSON.")
+
+        addresses = result.get("addressList") or []
+        if result.get("resultStatus") != "SUCCESS" or len(addresses) == 0:
+            return ZipCodeResultType.ERROR, ""
+        return ZipCodeResultType.FOUND, format_usps_address(addresses[0])
+
+    def lookup_many(self, addresses, city="DALLAS", state="TX"):
+        """
+        Look up several street addresses concurrently.
+
+        Parameters
+        ----------
+        addresses: list
+            The street addresses.
+
+        Yields
+        ------
+        tuple
+            One entry per address, in the same order:
+            the 2-tuple given by lookup(), or None if
+            the request for that address failed.
+
+        """
+
+        def lookup_or_none(address):
+            try:
+                return self.lookup(address, city, state)
+            except requests.RequestException:
+                return None
+
+        with ThreadPoolExecutor(max_workers=self.max_in_flight) as executor:
+            for result in executor.map(lookup_or_none, addresses):
+                yield result
+
+    def close(self):
+        self.session.close()
+
+
+def format_usps_address(usps_address):
+    """
+    Format an entry of the USPS addressList the way
+    the ZIP Code Lookup page displays it (see
+    format_full_address()).
+
+    """
+
+    zip_code = usps_address.get("zip5", "")
+    if usps_address.get("zip4"):
+        zip_code += "-" + usps_address["zip4"]
+
+    street = "\n".join(line for line in (usps_address.get("addressLine1", ""), usps_address.get("addressLine2", ""))
+                       if line)
+    return format_full_address(street, usps_address.get("city", ""), usps_address.get("state", ""), zip_code)
@@ -1,26 +1,72 @@
 import datetime
-import platform
+import os
+import queue
 import sys
+import threading
+from collections import Counter
 
 from selenium import webdriver
 from selenium.common.exceptions import NoSuchElementException
 from selenium.common.exceptions import NoSuchWindowException
 from selenium.common.exceptions import TimeoutException
 from selenium.common.exceptions import WebDriverException
+from selenium.webdriver.support import expected_conditions
 from selenium.webdriver.support.ui import Select
 from selenium.webdriver.support.ui import WebDriverWait
 
+import async_fetch
+import change_feed
+import page_selectors
+import profiling
 import scraper
+from address import canonical_address
+from async_fetch import FetchError
+from page_selectors import LayoutChanged
+from progress import NULL_REPORTER
+from progress import Stage
+from scraper import NotAPermitPage
 from EC_permit_result import PermitResult
 from EC_permit_result import ResultType
 from EC_zip_code_result import ZipCodeResult
 from EC_zip_code_result import ZipCodeResultType
 from PoolPermitReaderWriter import CSVReaderWriter
+from PoolPermitReaderWriter import append_permits_to_csv
+from PoolPermitReaderWriter import iter_permits
+from PoolPermitReaderWriter import iter_uncompleted_permits
+from PoolPermitReaderWriter import merge_updates
+from permit import DEFAULT_PERMIT_TYPE
+from permit_index import PermitIndex
+from permit_index import permit_id
+from permit_output import check_formats
+from permit_output import open_output
+from permit_store import PartitionedStore
+from permit_store import is_store
+from permit_store import days_to_completion as permit_days_to_completion
+from permit_state import PermitStateStore
+from scheduler import CompletionScheduler
+from usps_client import UspsZipClient
+from zip_resolver import ZipResolver
+
+
+# Number of browsers update_files() checks permits with
+DEFAULT_POOL_SIZE = 3
+
+# Search windows (in days) adapt to the number of results per search: a
+# window with fewer than QUIET_RESULTS results doubles, one with more than
+# BUSY_RESULTS halves. Only used if the site takes a date range.
+MAX_WINDOW_DAYS = 16
+QUIET_RESULTS = 25
+BUSY_RESULTS = 150
+
+# Most pages of a result grid read by get_all_links_to_permits(), in case
+# the pager never runs out (e.g. its next link leads back to the same page)
+MAX_RESULT_PAGES = 200
 
 
 def get_list_of_links_to_permit(driver):
     """
-    Return a list of links to permits. Permits
+    Return a list of links to permits on the
+    current page of the result grid. Permits
     must not have "Application Cancelled" status
     and no empty address. This function should
     only be called when the web page displays
@@ -40,8 +86,8 @@ def get_list_of_links_to_permit(driver):
     """
 
     try:
-        permit_display_zone = driver.find_element_by_xpath("//div[@id='ctl00_cphPaneBand_pnlPaneBand'][@class='datazone']")
-        permits = permit_display_zone.find_elements_by_xpath(".//tr[@class='possegrid'][@style='cursor: pointer;']")
+        page_selectors.find(driver, "results.grid")
+        permits = page_selectors.find_all(driver, "results.rows")
         links_to_permit = []
     except NoSuchWindowException:
         raise
@@ -52,12 +98,12 @@ def get_list_of_links_to_permit(driver):
 
     for p in permits:
         try:
-            application_status = p.find_element_by_xpath(".//span[contains(@id, 'PWebPermitStatus')]")
-            street_name = p.find_element_by_xpath(".//span[contains(@id, 'StreetName')]")
+            application_status = page_selectors.find(p, "row.status")
+            street_name = page_selectors.find(p, "row.street_name")
             if street_name.text == "" or application_status.text == "Application Cancelled":
                 continue
 
-            link = p.find_element_by_xpath(".//input[@value='View']").get_attribute("onclick")
+            link = page_selectors.find(p, "row.view_button").get_attribute("onclick")
             # Remove single quotes and "location.href=" substring from link
             clean_link = link.replace("'", "").replace("location.href=", "")
             links_to_permit.append(clean_link)
@@ -71,7 +117,90 @@ def get_list_of_links_to_permit(driver):
     return links_to_permit
 
 
-def get_permit_from_links(driver, links, csv_rw):
+def get_all_links_to_permits(driver, progress=NULL_REPORTER, max_pages=MAX_RESULT_PAGES):
+    """
+    Same as get_list_of_links_to_permit(), but
+    follows the grid's pager to read every page
+    of the results, up to @max_pages pages.
+
+    Returns
+    -------
+    list
+        List of links to each permit, without
+        duplicates, in the order of the grid.
+
+    """
+
+    links_to_permit = get_list_of_links_to_permit(driver)
+    pages = 1
+    while True:
+        if pages >= max_pages:
+            print("WARNING: the result grid still had a next page after " + str(pages) +
+                  " pages. Some permits may be missing.")
+            break
+
+        try:
+            next_page = page_selectors.find(driver, "results.next_page")
+        except NoSuchElementException:
+            break
+        except NoSuchWindowException:
+            raise
+        except WebDriverException:
+            raise
+
+        try:
+            grid = page_selectors.find(driver, "results.grid")
+            next_page.click()
+            # The pager posts back, which replaces the grid
+            WebDriverWait(driver, 10).until(expected_conditions.staleness_of(grid))
+            progress.page_loaded()
+            pages += 1
+            links_to_permit.extend(get_list_of_links_to_permit(driver))
+        except NoSuchWindowException:
+            raise
+        except TimeoutException:
+            raise
+        except NoSuchElementException:
+            raise
+        except WebDriverException:
+            raise
+
+    return list(dict.fromkeys(links_to_permit))
+
+
+def is_result_truncated(driver):
+    """
+    Return True if the site says the displayed
+    results don't include every permit found.
+
+    """
+
+    try:
+        return len(page_selectors.find_all(driver, "results.truncated")) > 0
+    except NoSuchWindowException:
+        raise
+    except WebDriverException:
+        raise
+
+
+def next_window_days(window_days, results, max_window_days=MAX_WINDOW_DAYS):
+    """
+    Size of the next search window, given the
+    number of results of the last one (the most
+    of any application type). Quiet windows grow
+    and busy ones shrink, so each search returns
+    a similar number of permits.
+
+    """
+
+    if results < QUIET_RESULTS:
+        return min(window_days * 2, max_window_days)
+    if results > BUSY_RESULTS:
+        return max(window_days // 2, 1)
+    return min(window_days, max_window_days)
+
+
+def get_permit_from_links(driver, links, csv_rw, progress=NULL_REPORTER, permit_type=DEFAULT_PERMIT_TYPE):
     """
     From a list of links, go to each link to
     extract a permit's information. Each permit's
@@ -87,6 +216,12 @@ def get_permit_from_links(driver, links, csv_rw):
         web page that displays a permit's info.
     csv_rw: CSVReaderWriter
         Instance of CSVReaderWriter.
+    progress: ProgressReporter
+        Receives an event for each page loaded
+        and each permit found.
+    permit_type: str
+        The application type the links were
+        found under.
 
     """
 
@@ -100,7 +235,9 @@ def get_permit_from_links(driver, links, csv_rw):
             result = WebDriverWait(driver, 10).until(PermitResult())
             if not result:
                 raise NoSuchElementException
-            scraper.get_permit_info(driver.page_source, driver.current_url, csv_rw)
+            progress.page_loaded()
+            if scraper.get_permit_info(driver.page_source, driver.current_url, csv_rw, permit_type):
+                progress.permits_found()
         except NoSuchWindowException:
             raise
         except TimeoutException:
@@ -109,58 +246,212 @@ def get_permit_from_links(driver, links, csv_rw):
             raise
 
 
-def update_permit_completion_date(driver, csv_rw):
+def update_permit_completion_date(driver, uncompleted_permits, state, scheduler, progress=NULL_REPORTER):
     """
-    Go through each permit without a completed
+    Go through the permits without a completed
     date and check the website to see if the
     permit has been updated with a completed date.
-    Updates the corresponding permit in the
-    csv_rw.permits list if it has been updated
-    with a completed date.
+    Updates the permit in place if it has been
+    updated with a completed date.
+
+    Permits are checked in the order given by
+    @scheduler (most likely to have completed
+    first) until its page or time budget runs out.
 
     Parameters
     ----------
     driver: WebDriver
         Instance of WebDriver provided by Selenium.
-    csv_rw: CSVReaderWriter
-        Instance of CSVReaderWriter.
+    uncompleted_permits: iterable
+        2-tuples containing the index of an
+        uncompleted permit and the permit itself,
+        e.g. from iter_uncompleted_permits().
+    state: PermitStateStore
+        Records when each permit was last checked.
+    scheduler: CompletionScheduler
+        Orders and caps the permits to check.
+    progress: ProgressReporter
+        Receives an event for each permit checked.
 
     Returns
     -------
     list
-        List of permits that have been updated with
-        a completed date.
+        List of 2-tuples containing the index and
+        the permit of each permit that has been
+        updated with a completed date.
 
     """
 
-    uncompleted_permits = csv_rw.get_list_of_uncompleted_permits()
+    uncompleted_permits = scheduler.schedule(uncompleted_permits, state)
+    if uncompleted_permits:
+        # Fail fast if the layout of the permit pages has changed
+        page_selectors.check_layout(driver, page_selectors.PERMIT_PAGE, uncompleted_permits[0][1].url)
+
     updated_permits = []
+    progress.stage_started(Stage.UPDATE, len(uncompleted_permits))
+    scheduler.start()
     for idx, permit in uncompleted_permits:
-        try:
-            driver.get(permit["Permit URL"])
-        except WebDriverException:
-            raise WebDriverException
+        if scheduler.out_of_time():
+            break
 
-        try:
-            result = WebDriverWait(driver, 10).until(PermitResult())
-            if not result:
-                raise NoSuchElementException
-            completion_date = scraper.get_permit_completion_date(driver.page_source)
-            if completion_date == "":
-                continue
-            else:
-                csv_rw.permits[idx]["Completed Date"] = completion_date
-                updated_permits.append(csv_rw.permits[idx])
-        except NoSuchWindowException:
-            raise
-        except TimeoutException:
-            raise
-        except WebDriverException:
-            raise
+        if check_permit_completion(driver, permit, state, progress):
+            updated_permits.append((idx, permit))
+
+    return updated_permits
+
+
+def update_permit_completion_date_with_pool(drivers, uncompleted_permits, state, scheduler, progress=NULL_REPORTER):
+    """
+    Same as update_permit_completion_date(), but the
+    permits are shared out among several browsers
+    that check them concurrently, one thread per
+    browser. Each browser takes the next permit in
+    the scheduled order as soon as it is free.
+
+    Parameters
+    ----------
+    drivers: list
+        Instances of WebDriver provided by Selenium.
+    uncompleted_permits: iterable
+    state: PermitStateStore
+    scheduler: CompletionScheduler
+    progress: ProgressReporter
+
+    Returns
+    -------
+    list
+        Same as update_permit_completion_date(),
+        in no particular order.
+
+    Raises
+    ------
+    Exception
+        The first error raised while checking a
+        permit (usually a WebDriverException). The
+        other browsers stop after the permit they
+        are checking.
+
+    """
+
+    uncompleted_permits = scheduler.schedule(uncompleted_permits, state)
+    if uncompleted_permits:
+        # Fail fast if the layout of the permit pages has changed
+        page_selectors.check_layout(drivers[0], page_selectors.PERMIT_PAGE, uncompleted_permits[0][1].url)
 
+    pending_permits = queue.Queue()
+    for pair in uncompleted_permits:
+        pending_permits.put(pair)
+
+    updated_permits = []
+    errors = []
+    progress.stage_started(Stage.UPDATE, pending_permits.qsize())
+    scheduler.start()
+
+    def check_permits(driver):
+        while not errors and not scheduler.out_of_time():
+            try:
+                idx, permit = pending_permits.get_nowait()
+            except queue.Empty:
+                return
+            try:
+                if check_permit_completion(driver, permit, state, progress):
+                    updated_permits.append((idx, permit))
+            except Exception as error:
+                # Anything else would only end this thread and its error would be lost
+                errors.append(error)
+
+    threads = [threading.Thread(target=check_permits, args=(driver,)) for driver in drivers]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    if errors:
+        raise errors[0]
     return updated_permits
 
 
+def check_permit_completion(driver, permit, state, progress=NULL_REPORTER):
+    """
+    Load the page of an uncompleted permit and set
+    its completed date if the website has one.
+
+    Parameters
+    ----------
+    driver: WebDriver
+        Instance of WebDriver provided by Selenium.
+    permit: Permit
+        The permit to check. Updated in place.
+    state: PermitStateStore
+        Records when the permit was checked.
+    progress: ProgressReporter
+
+    Returns
+    -------
+    bool
+        True if the permit has been updated
+        with a completed date.
+
+    """
+
+    permit_url = permit.url
+    try:
+        driver.get(permit_url)
+    except WebDriverException:
+        raise WebDriverException
+
+    try:
+        result = WebDriverWait(driver, 10).until(PermitResult())
+        if not result:
+            raise NoSuchElementException
+        progress.page_loaded()
+        progress.permit_checked()
+        state.mark_checked(permit_url)
+
+        # Only read the completed date element instead of parsing the whole page source
+        completion_date = get_permit_completion_date(driver)
+        if completion_date == "":
+            return False
+        else:
+            permit.set_completed_date(completion_date)
+            return True
+    except NoSuchWindowException:
+        raise
+    except TimeoutException:
+        raise
+    except WebDriverException:
+        raise
+
+
+def get_permit_completion_date(driver):
+    """
+    Return the completed date of the permit page
+    currently displayed.
+
+    Parameters
+    ----------
+    driver: WebDriver
+        Instance of WebDriver provided by Selenium.
+
+    Returns
+    -------
+    str
+        The completed date as displayed on the page.
+        No completion date is signified by an empty
+        string.
+
+    """
+
+    try:
+        return page_selectors.find(driver, "permit.completed_date").text.strip()
+    except NoSuchWindowException:
+        raise
+    except NoSuchElementException:
+        raise
+    except WebDriverException:
+        raise
+
+
 def write_updated_permits_to_csv(updated_permits, csv_rw):
     """
     Write permits with updated completion date to
@@ -181,9 +472,22 @@ def write_updated_permits_to_csv(updated_permits, csv_rw):
         csv_rw.write_permit_to_csv(permit)
 
 
-def get_permits(driver, csv_rw, delta, start_datetime):
+def get_permits(driver, csv_rw, delta, start_datetime, permit_index, progress=NULL_REPORTER, use_http=False,
+                application_types=(DEFAULT_PERMIT_TYPE,)):
     """
     Get permits from the source given by @driver.
+
+    Every application type in @application_types is
+    searched for each date in the same sweep, sharing
+    the browser session. Each permit is tagged with
+    the type it was found under.
+
+    If the site takes a date range, quiet days are
+    searched together in one window, and the window
+    grows or shrinks with the number of results
+    (see next_window_days()). A window whose results
+    are truncated is searched again in halves. Every
+    page of a paged result grid is read.
     
     Wrapper for get_permit_info() and
     get_permit_from_links().
@@ -200,80 +504,183 @@ def get_permits(driver, csv_rw, delta, start_datetime):
     start_datetime: datetime
         The date from which to start
         extracting permit info.
+    permit_index: PermitIndex
+        Permits already in the master file or
+        store the run adds to. These are skipped
+        without being fetched.
+    progress: ProgressReporter
+        Receives an event for each day searched,
+        page loaded and permit found.
+    use_http: bool
+        If true, the permits listed in multiple
+        results are collected over all dates and
+        fetched concurrently over HTTP at the end,
+        instead of one by one in the browser.
+    application_types: iterable
+        Values of the "Application Type" search
+        field to scrape.
 
     """
 
+    http_links = []
+    http_permit_types = {}
+    seen_links = set()  # Windows that are split are searched again
+    end_datetime = start_datetime + delta
     date = start_datetime
-    for _ in range(delta.days + 1):
-        try:
-            application_date, application_type, search_button = get_form_for_permit_search(driver)
-        except NoSuchWindowException:
-            raise
-        except NoSuchElementException:
-            raise
-        except WebDriverException:
-            raise
-
-        application_date.clear()
-        application_date.send_keys(date.strftime("%b %d, %Y"))  # Date is in the format: mmm dd, yyyy
-        application_type.select_by_value("Swimming Pool Permit")
-        search_button.click()
+    window_days = 1
+    max_window_days = 1
+    form = None
+    progress.stage_started(Stage.SEARCH, delta.days + 1)
+    while date <= end_datetime:
+        window_days = min(window_days, (end_datetime - date).days + 1)
+        window_end = date + datetime.timedelta(days=window_days - 1)
+        busiest = 0
+        truncated = False
+
+        for permit_type in application_types:
+            try:
+                if form is not None:
+                    # The search form stays on the page after a search that didn't open
+                    # a permit, so only the fields that differ need to change
+                    try:
+                        form = get_form_for_permit_search(driver, reload=False)
+                    except NoSuchElementException:
+                        form = None
+                if form is None:
+                    form = get_form_for_permit_search(driver)
+            except NoSuchWindowException:
+                raise
+            except NoSuchElementException:
+                raise
+            except WebDriverException:
+                raise
+
+            application_date, application_date_end, application_type, search_button = form
+
+            # Quiet days are only merged if the site takes a date range
+            max_window_days = MAX_WINDOW_DAYS if application_date_end is not None else 1
+
+            set_search_date(application_date, date)
+            if application_date_end is not None:
+                set_search_date(application_date_end, window_end)
+            application_type.select_by_value(permit_type)
+            search_button.click()
+
+            try:
+                # The search posts back, which replaces the page. Until then the
+                # result of the previous search (e.g. its "no results" message)
+                # is still on the page and would satisfy PermitResult.
+                WebDriverWait(driver, 10).until(expected_conditions.staleness_of(search_button))
+                result = WebDriverWait(driver, 10).until(PermitResult())
+                progress.page_loaded()
+                if result == ResultType.SINGLE:
+                    # print("Single result")
+                    busiest = max(busiest, 1)
+                    if driver.current_url not in permit_index and driver.current_url not in seen_links and \
+                            scraper.get_permit_info(driver.page_source, driver.current_url, csv_rw, permit_type):
+                        progress.permits_found()
+                    seen_links.add(driver.current_url)
+                elif result == ResultType.MULTIPLE:
+                    # print("Multiple result")
+                    if is_result_truncated(driver):
+                        if window_days > 1:
+                            truncated = True
+                            break
+                        print("WARNING: results for " + date.strftime("%b %d, %Y") + " (" + permit_type +
+                              ") were truncated by the site. Some permits may be missing.")
+
+                    links = get_all_links_to_permits(driver, progress)
+                    busiest = max(busiest, len(links))
+                    links = [link for link in permit_index.filter_unseen(links) if link not in seen_links]
+                    seen_links.update(links)
+                    if use_http:
+                        http_links.extend(links)
+                        http_permit_types.update((link, permit_type) for link in links)
+                    else:
+                        get_permit_from_links(driver, links, csv_rw, progress, permit_type)
+                elif result == ResultType.NONE:
+                    # print("No result")
+                    pass
+                else:
+                    raise NoSuchElementException
+            except NoSuchWindowException:
+                raise
+            except TimeoutException:
+                raise
+            except NoSuchElementException:
+                raise
+            except WebDriverException:
+                raise
+
+        if truncated:
+            # Search the same dates again in smaller windows
+            window_days = max(window_days // 2, 1)
+            continue
+
+        for _ in range(window_days):
+            progress.day_completed()
+        date = window_end + datetime.timedelta(days=1)
+        window_days = next_window_days(window_days, busiest, max_window_days)
+
+    if http_links:
+        async_fetch.get_permit_from_links(permit_index.filter_unseen(http_links), csv_rw, progress, http_permit_types)
+
+
+def set_search_date(field, date):
+    """
+    Enter @date into a date field of the search
+    form, unless the field already holds it.
 
-        try:
-            result = WebDriverWait(driver, 10).until(PermitResult())
-            if result == ResultType.SINGLE:
-                # print("Single result")
-                scraper.get_permit_info(driver.page_source, driver.current_url, csv_rw)
-            elif result == ResultType.MULTIPLE:
-                # print("Multiple result")
-                get_permit_from_links(driver, get_list_of_links_to_permit(driver), csv_rw)
-            elif result == ResultType.NONE:
-                # print("No result")
-                pass
-            else:
-                raise NoSuchElementException
-        except NoSuchWindowException:
-            raise
-        except TimeoutException:
-            raise
-        except NoSuchElementException:
-            raise
-        except WebDriverException:
-            raise
+    """
 
-        date = date + datetime.timedelta(days=1)
+    text = date.strftime("%b %d, %Y")  # Date is in the format: mmm dd, yyyy
+    if field.get_attribute("value") != text:
+        field.clear()
+        field.send_keys(text)
 
 
-def get_form_for_permit_search(driver):
+def get_form_for_permit_search(driver, reload=True):
     """
     Navigate to the permit search page and
     extract the entry fields for application
     date and application type, and also extract
     the "Search" button
 
+    POSSE gives range criteria a second field
+    (_S1) for the end of the range. If the page
+    has it, the search can span several days.
+
     Parameters
     ----------
     driver: WebDriver
         An instance of WebDriver from Selenium
+    reload: bool
+        If false, extract the fields from the page
+        that is already loaded (e.g. the results of
+        the previous search) instead. Raises
+        NoSuchElementException if it has no form.
 
     Returns
     -------
     tuple
-        A 3-tuple containing the input fields for
-        the Application Date, Application Type, and
-        the Search Button.
+        A 4-tuple containing the input fields for
+        the Application Date, the end of the
+        Application Date range (None if the site
+        only searches single dates), Application
+        Type, and the Search Button.
 
     """
 
-    try:
-        driver.get("https://developdallas.dallascityhall.com/Default.aspx?PossePresentation=ByAppDate")
-    except WebDriverException:
-        raise WebDriverException
+    if reload:
+        try:
+            driver.get(page_selectors.SEARCH_URL)
+        except WebDriverException:
+            raise WebDriverException
 
     try:
-        application_date = driver.find_element_by_id("CreatedDate_1209113_S0")
-        application_type = Select(driver.find_element_by_name("JobApplicationTypeSearch_1209113_S0"))
-        search_button = driver.find_element_by_xpath("//input[@value='Search']")
+        application_date = page_selectors.find(driver, "search.application_date")
+        application_type = Select(page_selectors.find(driver, "search.application_type"))
+        search_button = page_selectors.find(driver, "search.search_button")
     except NoSuchWindowException:
         raise NoSuchWindowException
     except NoSuchElementException:
@@ -281,7 +688,10 @@ def get_form_for_permit_search(driver):
     except WebDriverException:
         raise WebDriverException
 
-    return application_date, application_type, search_button
+    application_date_end = page_selectors.find_all(driver, "search.application_date_end")
+    application_date_end = application_date_end[0] if application_date_end else None
+
+    return application_date, application_date_end, application_type, search_button
 
 
 def get_form_for_zip_code_lookup(driver):
@@ -308,15 +718,15 @@ def get_form_for_zip_code_lookup(driver):
 
     """
     try:
-        driver.get("https://tools.usps.com/zip-code-lookup.htm?byaddress")
+        driver.get(page_selectors.ZIP_LOOKUP_URL)
     except WebDriverException:
         raise WebDriverException
 
     try:
-        address = driver.find_element_by_xpath("//input[@id='tAddress']")
-        city = driver.find_element_by_xpath("//input[@id='tCity']")
-        state = Select(driver.find_element_by_xpath("//select[@id='tState']"))
-        find_button = driver.find_element_by_xpath("//a[@id='zip-by-address']")
+        address = page_selectors.find(driver, "zip.address")
+        city = page_selectors.find(driver, "zip.city")
+        state = Select(page_selectors.find(driver, "zip.state"))
+        find_button = page_selectors.find(driver, "zip.find_button")
     except NoSuchWindowException:
         raise NoSuchWindowException
     except NoSuchElementException:
@@ -327,12 +737,20 @@ def get_form_for_zip_code_lookup(driver):
     return address, city, state, find_button
 
 
-def get_full_address_for_permits(driver, permits):
+def get_full_address_for_permits(driver, permits, resolver, usps_client=None, progress=NULL_REPORTER):
     """
     Go through all permits in @permits and
     find the full address (with zip code) for
-    the address in each permit. The USPS
-    website is used for zip code lookup.
+    the address in each permit. The offline
+    @resolver is tried first. Addresses it can't
+    resolve to a single ZIP code are looked up
+    on the USPS website, over HTTP with
+    @usps_client if given, and in the browser
+    for any HTTP request that failed.
+
+    Permits are grouped by the canonical form of
+    their address (see address.canonical_address()),
+    and each canonical address is looked up once.
 
     If no valid address is found on the website,
     remove the permit from the list.
@@ -343,6 +761,13 @@ def get_full_address_for_permits(driver, permits):
         An instance of WebDriver from Selenium.
     permits: list
         A list of pool permits from a CSVReaderWriter object.
+    resolver: ZipResolver
+        Offline street-range index of Dallas ZIP codes.
+    usps_client: UspsZipClient
+        HTTP client for the USPS lookup. If None,
+        every lookup goes through the browser.
+    progress: ProgressReporter
+        Receives an event for each ZIP lookup.
 
     Returns
     -------
@@ -350,9 +775,49 @@ def get_full_address_for_permits(driver, permits):
         A list containing pool permits where
         each permit has the full address.
 
+    Raises
+    ------
+    LayoutChanged
+        If some addresses have to be looked up in
+        the browser and the layout of the USPS page
+        has changed.
+
     """
 
+    progress.stage_started(Stage.ZIP_LOOKUP, len(permits))
+    permits_by_address = {}
     for permit in permits:
+        permits_by_address.setdefault(canonical_address(permit.address), []).append(permit)
+
+    def set_full_address(address, full_address):
+        for permit in permits_by_address[address]:
+            permit.address = full_address
+            progress.zip_lookup_completed()
+
+    unresolved_addresses = []
+    for address in permits_by_address:
+        full_address = resolver.resolve(address)
+        if full_address is not None:
+            set_full_address(address, full_address)
+        else:
+            unresolved_addresses.append(address)
+
+    if usps_client is not None:
+        failed_addresses = []
+        results = usps_client.lookup_many(unresolved_addresses)
+        for address, result in zip(unresolved_addresses, results):
+            if result is None:
+                failed_addresses.append(address)  # Retry in the browser below
+                continue
+            _, full_address = result
+            set_full_address(address, full_address)  # "" denotes invalid address from USPS website
+        unresolved_addresses = failed_addresses
+
+    if unresolved_addresses:
+        # Fail fast if the layout of the USPS page has changed
+        page_selectors.check_layout(driver, page_selectors.ZIP_LOOKUP_PAGE)
+
+    for street_address in unresolved_addresses:
         try:
             address, city, state, find_button = get_form_for_zip_code_lookup(driver)
         except NoSuchWindowException:
@@ -363,7 +828,7 @@ def get_full_address_for_permits(driver, permits):
             raise WebDriverException
 
         address.clear()
-        address.send_keys(permit["Address"])
+        address.send_keys(street_address)
         city.clear()
         city.send_keys("DALLAS")
         state.select_by_value("TX")
@@ -371,11 +836,12 @@ def get_full_address_for_permits(driver, permits):
 
         try:
             result = WebDriverWait(driver, 10).until(ZipCodeResult())
+            progress.page_loaded()
             if result == ZipCodeResultType.ERROR:
-                permit["Address"] = ""  # "" denotes invalid address from USPS website
+                set_full_address(street_address, "")  # "" denotes invalid address from USPS website
             elif result == ZipCodeResultType.FOUND:
                 full_address = scraper.get_address_with_zip_code(driver.page_source)
-                permit["Address"] = full_address
+                set_full_address(street_address, full_address)
             else:
                 raise NoSuchElementException
         except NoSuchWindowException:
@@ -388,10 +854,12 @@ def get_full_address_for_permits(driver, permits):
             raise
 
     # Remove permits with empty addresses
-    return [permit for permit in permits if permit["Address"] != ""]
+    return [permit for permit in permits if permit.address != ""]
 
 
-def run_bot(start_datetime, end_datetime, delta):
+@profiling.profiled
+def run_bot(start_datetime, end_datetime, delta, progress=NULL_REPORTER, use_http=False, output_formats=(),
+            application_types=(DEFAULT_PERMIT_TYPE,), master_filename=None):
     """
     The entry point for extracting permit info.
 
@@ -412,6 +880,37 @@ def run_bot(start_datetime, end_datetime, delta):
     delta: timedelta
         The date difference between
         @start_datetime and @end_datetime.
+    progress: ProgressReporter
+        Receives progress events while
+        the bot is running.
+    use_http: bool
+        If true, permit pages are fetched
+        concurrently over HTTP instead of
+        in the browser.
+    output_formats: iterable
+        Extra output formats to save the permits
+        in next to the csv file, e.g. (".parquet",
+        ".jsonl.zst"). See permit_output.FORMATS.
+        They are checked before the run starts.
+    application_types: iterable
+        Values of the "Application Type" search
+        field to scrape in the same run, e.g.
+        ("Swimming Pool Permit", "Fence Permit").
+    master_filename: str
+        Master csv file (or store) to add the new
+        permits to. Permits already in it are skipped
+        without being fetched, so the output csv file
+        only has the new ones. They are also written
+        as inserts to a JSONL change feed
+        (changes_<output name>.jsonl on the desktop).
+        If None, every permit found is saved and
+        nothing is skipped.
+    profile: bool
+        Keyword only. If true, profile the run and
+        save a report next to the output csv file
+        (see profiling.py). None means profile if
+        the POOL_PERMIT_PROFILE environment variable
+        is set.
 
     Returns
     -------
@@ -426,28 +925,45 @@ def run_bot(start_datetime, end_datetime, delta):
 
     """
 
-    # sys._MEIPASS is given by PyInstaller. If this attribut doesn't exist,
-    # then we must we running the script itself, not the deployed application.
     try:
-        path_to_driver = sys._MEIPASS + "/chromedriver"
-    except AttributeError:
-        path_to_driver = "./chromedriver"
+        check_formats(output_formats)
+    except (ValueError, ImportError) as error:
+        print("OUTPUT FORMAT ERROR: " + str(error))
+        return False
 
-    driver = webdriver.Chrome(executable_path=path_to_driver)
+    # Fail before scraping rather than after it
+    try:
+        resolver = ZipResolver.load_default()
+    except OSError as error:
+        print("ZIP DATA ERROR: " + str(error))
+        return False
+
+    driver = start_driver()
 
     start_date = start_datetime.strftime("%b %d, %Y")
     end_date = end_datetime.strftime("%b %d, %Y")
 
     filename = start_date + "_to_" + end_date + "_permits"
     csv_rw = CSVReaderWriter(filename, create_new_file=True)   # Prepare object to interact with csv file
+    profiling.set_output_filename(csv_rw.filename)
+    # Permits already in the master aren't fetched again
+    permit_index = PermitIndex.for_master(master_filename, start_datetime.date(), end_datetime.date())
 
     # Get pool permits starting from the start date
     try:
-        get_permits(driver, csv_rw, delta, start_datetime)
+        # Fail fast if the layout of the site has changed. The USPS page is
+        # checked by get_full_address_for_permits(), if it is needed at all.
+        page_selectors.check_layout(driver, page_selectors.SEARCH_PAGE)
+        get_permits(driver, csv_rw, delta, start_datetime, permit_index, progress, use_http, application_types)
     except NoSuchWindowException:
         print("WINDOW CLOSED ERROR: The browser window has been closed.")
         csv_rw.close_csv()
         return False
+    except LayoutChanged as error:
+        print("LAYOUT CHANGED ERROR: " + error.msg)
+        close_driver(driver)
+        csv_rw.close_csv()
+        return False
     except NoSuchElementException:
         print("NO ELEMENT FOUND ERROR: Could not find necessary element from web page. "
               "Layout of site might have changed, or no internet connection.")
@@ -464,14 +980,31 @@ def run_bot(start_datetime, end_datetime, delta):
         close_driver(driver)
         csv_rw.close_csv()
         return False
+    except FetchError as error:
+        print("HTTP ERROR: could not fetch permit page " + str(error) + ". Check internet connection.")
+        close_driver(driver)
+        csv_rw.close_csv()
+        return False
+    except NotAPermitPage:
+        print("NOT A PERMIT PAGE ERROR: a permit link didn't lead to a permit page. "
+              "Layout of site might have changed.")
+        close_driver(driver)
+        csv_rw.close_csv()
+        return False
 
     # Get full address for each permit
+    usps_client = UspsZipClient()
     try:
-        csv_rw.permits = get_full_address_for_permits(driver, csv_rw.permits)
+        csv_rw.permits = get_full_address_for_permits(driver, csv_rw.permits, resolver, usps_client, progress)
     except NoSuchWindowException:
         print("WINDOW CLOSED ERROR: The browser window has been closed.")
         csv_rw.close_csv()
         return False
+    except LayoutChanged as error:
+        print("LAYOUT CHANGED ERROR: " + error.msg)
+        close_driver(driver)
+        csv_rw.close_csv()
+        return False
     except NoSuchElementException:
         print("NO ELEMENT FOUND ERROR: Could not find necessary element from web page. "
               "Layout of site might have changed, or no internet connection.")
@@ -488,14 +1021,32 @@ def run_bot(start_datetime, end_datetime, delta):
         close_driver(driver)
         csv_rw.close_csv()
         return False
+    finally:
+        usps_client.close()
 
     close_driver(driver)
     csv_rw.save_csv()
     csv_rw.close_csv()
+
+    if master_filename is not None:
+        append_permits(master_filename, csv_rw.permits)
+        # Every permit saved was new to the master
+        change_feed.write_change_feed((change_feed.insert_change(permit.to_row()) for permit in csv_rw.permits),
+                                      change_feed_filename(csv_rw.filename))
+
+    for output_format in output_formats:
+        try:
+            with open_output(os.path.splitext(csv_rw.filename)[0] + output_format) as output:
+                output.write_permits(csv_rw.permits)
+        except (ImportError, OSError) as error:
+            print("OUTPUT ERROR: could not save the " + output_format + " output: " + str(error) +
+                  ". The csv file has been saved.")
+            return False
     return True
 
 
-def update_file(filename):
+@profiling.profiled
+def update_file(filename, progress=NULL_REPORTER, max_pages=None, max_seconds=None, use_http=False):
     """
     The entry point for updating file.
 
@@ -506,12 +1057,44 @@ def update_file(filename):
     
     Otherwise, a new csv file will be created to store the updated
     permits. The master file will also reflect the updates. 
+    The updates are also written as a JSONL change feed
+    (changes_<name>.jsonl on the desktop) for downstream
+    imports.
+
+    The master file is streamed rather than loaded: only its
+    uncompleted permits are held in memory, and the updates
+    are merged back in one pass through a temporary file that
+    replaces the master file, so memory use doesn't grow with
+    the size of the file.
+
+    @filename may also be the manifest of a PartitionedStore.
+    Then only the shards that still have open permits are
+    read and rewritten.
 
     Parameters
     ----------
     filename: str
         The absolute path to the csv file containing
-        the permits.
+        the permits, or to a store's manifest.json.
+    progress: ProgressReporter
+        Receives progress events while
+        the file is being updated.
+    max_pages: int
+        Maximum number of permits to re-check.
+        None means every uncompleted permit.
+    max_seconds: float
+        Stop re-checking permits after this many
+        seconds. None means no time limit.
+    use_http: bool
+        If true, permit pages are fetched
+        concurrently over HTTP instead of
+        in the browser.
+    profile: bool
+        Keyword only. If true, profile the run and
+        save a report next to the output csv file
+        (see profiling.py). None means profile if
+        the POOL_PERMIT_PROFILE environment variable
+        is set.
 
     Returns
     -------
@@ -525,61 +1108,315 @@ def update_file(filename):
 
     """
 
-    # sys._MEIPASS is given by PyInstaller. If this attribut doesn't exist,
-    # then we must we running the script itself, not the deployed application.
+    if is_store(filename):
+        store = PartitionedStore(filename)
+        state = PermitStateStore(os.path.join(store.directory, "permits.csv"))
+        scheduler = CompletionScheduler(store.days_to_completion().elements(), max_pages, max_seconds)
+        uncompleted_permits = store.iter_uncompleted_permits()
+        csv_filename = store.name + ".csv"
+    else:
+        store = None
+        state = PermitStateStore(filename)
+        scheduler = CompletionScheduler.from_permits((permit for _, permit in iter_permits(filename)),
+                                                     max_pages, max_seconds)
+        uncompleted_permits = iter_uncompleted_permits(filename)
+        csv_filename = os.path.basename(filename)
+
+    # The browser is only needed if the permit pages aren't fetched over HTTP
+    driver = None
     try:
-        path_to_driver = sys._MEIPASS + "/chromedriver"
-    except AttributeError:
-        path_to_driver = "./chromedriver"
-
-    driver = webdriver.Chrome(executable_path=path_to_driver)
-    csv_rw_master = CSVReaderWriter(filename, create_new_file=False)
-    
-    # Get the csv file's name
-    names = []
-    if platform.system() == "Windows":
-        names = filename.split("\\")
-    elif platform.system() == "Darwin":  # MacOS
-        names = filename.split("/")
-    csv_filename = names[len(names) - 1]
-
-    try:
-        updated_permits = update_permit_completion_date(driver, csv_rw_master)
+        if use_http:
+            updated_permits = async_fetch.update_permit_completion_date(uncompleted_permits, state, scheduler, progress)
+        else:
+            driver = start_driver()
+            updated_permits = update_permit_completion_date(driver, uncompleted_permits, state, scheduler, progress)
     except NoSuchWindowException:
         print("WINDOW CLOSED ERROR: Browser window has already been closed.")
-        csv_rw_master.close_csv()
+        return False
+    except LayoutChanged as error:
+        print("LAYOUT CHANGED ERROR: " + error.msg)
         return False
     except NoSuchElementException:
         print("NO ELEMENT FOUND ERROR: Could not find necessary element from web page. Layout of site might have changed.")
-        csv_rw_master.close_csv()
-        close_driver(driver)
         return False
     except TimeoutException:
         print("TIMEOUT ERROR: could not find any result in the 10 second time limit. Check internet connection.")
-        csv_rw_master.close_csv()
-        close_driver(driver)
         return False
     except WebDriverException:
         print("INTERNAL ERROR: WebDriver threw an exception. Possibly because user quit the browser window before page was loaded.")
-        csv_rw_master.close_csv()
-        close_driver(driver)
         return False
+    except FetchError as error:
+        print("HTTP ERROR: could not fetch permit page " + str(error) + ". Check internet connection.")
+        return False
+    finally:
+        if driver is not None:
+            close_driver(driver)
+
+    state.save()
+    save_updates(filename, store, csv_filename, updated_permits)
+    return True
+
+
+def save_updates(filename, store, csv_filename, updated_permits):
+    """
+    Save the permits updated by update_file() or
+    update_files(): write them to a new csv file
+    and a JSONL change feed on the desktop, then
+    merge them into the master file or store.
+
+    Parameters
+    ----------
+    filename: str
+        The path to the master csv file or
+        to a store's manifest.json.
+    store: PartitionedStore
+        The store, or None for a csv file.
+    csv_filename: str
+        Name of the master file, used to name
+        the files written on the desktop.
+    updated_permits: list
+        2-tuples containing the index (as given
+        by the file or store) and the updated permit.
+
+    """
 
     # Prepare object to write updated permits to a new csv file
     csv_rw_updated = CSVReaderWriter("updated_" + csv_filename)
+    profiling.set_output_filename(csv_rw_updated.filename)
 
     if len(updated_permits) > 0:
-        write_updated_permits_to_csv(updated_permits, csv_rw_updated)
+        write_updated_permits_to_csv([permit for _, permit in updated_permits], csv_rw_updated)
+
+    # Only permits without a completed date were checked, so that is what they were before
+    changes = (change_feed.update_change(dict(permit.to_row(), **{"Completed Date": ""}), permit.to_row())
+               for _, permit in updated_permits)
+    change_feed.write_change_feed(changes, change_feed_filename(csv_filename))
+
+    if store is not None:
+        store.apply_updates(updated_permits)
+    else:
+        merge_updates(filename, dict(updated_permits))
 
-    # Clean up
-    close_driver(driver)
-    csv_rw_master.save_csv()
-    csv_rw_master.close_csv()
     csv_rw_updated.save_csv()
     csv_rw_updated.close_csv()
+
+
+def change_feed_filename(csv_filename):
+    """
+    Path of the JSONL change feed written on the
+    desktop for the csv file @csv_filename.
+
+    """
+
+    name = os.path.splitext(os.path.basename(csv_filename))[0]
+    return os.path.expanduser("~/Desktop/") + "changes_" + name + ".jsonl"
+
+
+def append_permits(master_filename, permits):
+    """
+    Add the permits of a run_bot() run to a master
+    csv file or store.
+
+    """
+
+    if is_store(master_filename):
+        PartitionedStore(master_filename).add_permits(permits)
+    else:
+        append_permits_to_csv(master_filename, permits)
+
+
+def list_master_files(filenames):
+    """
+    Expand the files to batch update: a directory
+    stands for every master csv file in it and the
+    manifest of a store in it, if any. Files written
+    by previous updates (updated_*.csv) are skipped.
+
+    Parameters
+    ----------
+    filenames: str or list
+        A directory, or a list of csv files,
+        manifests and directories.
+
+    Returns
+    -------
+    list
+
+    """
+
+    if isinstance(filenames, str):
+        filenames = [filenames]
+
+    master_files = []
+    for filename in filenames:
+        if not os.path.isdir(filename):
+            master_files.append(filename)
+            continue
+        for name in sorted(os.listdir(filename)):
+            path = os.path.join(filename, name)
+            if name.endswith(".csv") and not name.startswith(("updated_", ".")) or is_store(path):
+                master_files.append(path)
+    return master_files
+
+
+@profiling.profiled
+def update_files(filenames, progress=NULL_REPORTER, max_pages=None, max_seconds=None, use_http=False,
+                 pool_size=DEFAULT_POOL_SIZE):
+    """
+    The entry point for updating several files at once.
+
+    Permits are usually in more than one master file
+    (one file per campaign), so rather than calling
+    update_file() on each file, the uncompleted permits
+    of every file are gathered, each permit URL is
+    checked once, and the completed dates found are
+    written back to every file that contains the permit.
+
+    Only the uncompleted permits are held in memory.
+    The files are then saved as with update_file():
+    an updated_ csv file and a change feed on the
+    desktop for each file, and a merge into the file.
+
+    Parameters
+    ----------
+    filenames: str or list
+        See list_master_files().
+    progress: ProgressReporter
+    max_pages: int
+        Maximum number of distinct permits to
+        re-check. None means every one.
+    max_seconds: float
+        Stop re-checking permits after this many
+        seconds. None means no time limit.
+    use_http: bool
+        If true, permit pages are fetched
+        concurrently over HTTP instead of
+        in the browsers.
+    pool_size: int
+        Number of browsers checking permits
+        concurrently.
+    profile: bool
+        Keyword only. If true, profile the run and
+        save a report next to the output csv file
+        (see profiling.py). None means profile if
+        the POOL_PERMIT_PROFILE environment variable
+        is set.
+
+    Returns
+    -------
+    bool
+        False if an error occurred when updating
+        permits (no file is changed then), True
+        otherwise.
+
+    """
+
+    master_files = list_master_files(filenames)
+    if not master_files:
+        return True
+
+    # Each permit URL maps to every (file, index, permit) it appears in. The
+    # permit objects are kept per file since other columns may differ.
+    occurrences = {}
+    stores = {}
+    seen_permit_ids = set()
+    days_to_completion = Counter()
+    for filename in master_files:
+        if is_store(filename):
+            stores[filename] = PartitionedStore(filename)
+            uncompleted_permits = stores[filename].iter_uncompleted_permits()
+            days_to_completion.update(stores[filename].days_to_completion())
+        else:
+            uncompleted_permits = iter_uncompleted_permits(filename)
+            for _, permit in iter_permits(filename):
+                if permit_id(permit.url) not in seen_permit_ids:
+                    seen_permit_ids.add(permit_id(permit.url))
+                    days = permit_days_to_completion(permit)
+                    if days is not None:
+                        days_to_completion[days] += 1
+
+        for idx, permit in uncompleted_permits:
+            occurrences.setdefault(permit_id(permit.url), []).append((filename, idx, permit))
+
+    # Check each URL once, using the first permit found for it
+    unique_permits = [(identity, permits[0][2]) for identity, permits in occurrences.items()]
+    directories = [os.path.dirname(os.path.abspath(filename)) for filename in master_files]
+    try:
+        state_directory = os.path.commonpath(directories)
+    except ValueError:
+        # The files are on different drives
+        state_directory = directories[0]
+    state = PermitStateStore(os.path.join(state_directory, "batch_update.csv"))
+    scheduler = CompletionScheduler(days_to_completion.elements(), max_pages, max_seconds)
+
+    drivers = []
+    try:
+        if use_http:
+            updated_permits = async_fetch.update_permit_completion_date(unique_permits, state, scheduler, progress)
+        else:
+            drivers = [start_driver() for _ in range(max(1, min(pool_size, len(unique_permits))))]
+            updated_permits = update_permit_completion_date_with_pool(drivers, unique_permits, state, scheduler,
+                                                                      progress)
+    except NoSuchWindowException:
+        print("WINDOW CLOSED ERROR: Browser window has already been closed.")
+        return False
+    except LayoutChanged as error:
+        print("LAYOUT CHANGED ERROR: " + error.msg)
+        return False
+    except NoSuchElementException:
+        print("NO ELEMENT FOUND ERROR: Could not find necessary element from web page. Layout of site might have changed.")
+        return False
+    except TimeoutException:
+        print("TIMEOUT ERROR: could not find any result in the 10 second time limit. Check internet connection.")
+        return False
+    except WebDriverException:
+        print("INTERNAL ERROR: WebDriver threw an exception. Possibly because user quit the browser window before page was loaded.")
+        return False
+    except FetchError as error:
+        print("HTTP ERROR: could not fetch permit page " + str(error) + ". Check internet connection.")
+        return False
+    finally:
+        for driver in drivers:
+            close_driver(driver)
+
+    # Copy each completed date to every file containing the permit
+    updates_by_file = {filename: [] for filename in master_files}
+    for identity, updated_permit in updated_permits:
+        for filename, idx, permit in occurrences[identity]:
+            permit.completed_date = updated_permit.completed_date
+            updates_by_file[filename].append((idx, permit))
+
+    state.save()
+    for filename in master_files:
+        store = stores.get(filename)
+        csv_filename = store.name + ".csv" if store is not None else os.path.basename(filename)
+        save_updates(filename, store, csv_filename, updates_by_file[filename])
     return True
 
 
+def start_driver():
+    """
+    Start a Chrome WebDriver using the chromedriver
+    bundled with the application.
+
+    Returns
+    -------
+    WebDriver
+
+    """
+
+    # sys._MEIPASS is given by PyInstaller. If this attribut doesn't exist,
+    # then we must we running the script itself, not the deployed application.
+    try:
+        path_to_driver = sys._MEIPASS + "/chromedriver"
+    except AttributeError:
+        path_to_driver = "./chromedriver"
+
+    driver = webdriver.Chrome(executable_path=path_to_driver)
+    profiling.attach(driver)  # Counts its commands if the job is profiled
+    return driver
+
+
 def close_driver(driver):
     try:
         driver.close()
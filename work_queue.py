@@ -0,0 +1,649 @@
+import argparse
+import datetime
+import json
+import socket
+import sqlite3
+import threading
+import time
+import uuid
+from types import SimpleNamespace
+
+from address import canonical_address
+from permit import DEFAULT_PERMIT_TYPE
+from permit import Permit
+from permit_index import permit_id
+from progress import NullProgressReporter
+
+
+# Task kinds and their payloads/results:
+# --------------------------------------
+# search  - payload: {"start": "yyyy-mm-dd", "days": n, "application_types": [...]}
+#           result:  {"permits": [<csv row>, ...]}
+# refresh - payload: {"permits": [[<row index in master file>, <csv row>], ...],
+#                     "state": {<permit url>: <PermitStateStore entry>, ...}}
+#           result:  {"updated": [[<row index in master file>, <csv row>], ...],
+#                     "state": {<permit url>: <PermitStateStore entry>, ...}}
+# zip     - payload: {"addresses": [<address>, ...]}
+#           result:  {"full_addresses": {<canonical address>: <full address, "" if invalid>}}
+SEARCH = "search"
+REFRESH = "refresh"
+ZIP = "zip"
+
+PENDING = "pending"
+LEASED = "leased"
+DONE = "done"
+FAILED = "failed"
+
+DEFAULT_LEASE_SECONDS = 300
+DEFAULT_MAX_ATTEMPTS = 3
+
+
+class Task:
+    __slots__ = ("id", "kind", "payload", "attempts")
+
+    def __init__(self, task_id, kind, payload, attempts):
+        self.id = task_id
+        self.kind = kind
+        self.payload = payload
+        self.attempts = attempts
+
+
+class WorkQueue:
+    def __init__(self, path, lease_seconds=DEFAULT_LEASE_SECONDS, max_attempts=DEFAULT_MAX_ATTEMPTS):
+        """
+        Open (or create) a task queue stored in a SQLite
+        file that every worker host can reach, e.g. on a
+        shared drive.
+
+        A worker leases a task for @lease_seconds and must
+        send heartbeats to keep it. A task whose lease ran
+        out (the worker died or hung) goes back to the
+        queue and is leased by the next worker that asks.
+        A task that fails or loses its lease @max_attempts
+        times is marked failed.
+
+        Parameters
+        ----------
+        path: str
+            Path to the SQLite file.
+        lease_seconds: float
+        max_attempts: int
+
+        """
+
+        self.path = path
+        self.lease_seconds = lease_seconds
+        self.max_attempts = max_attempts
+        self.connection = sqlite3.connect(path, timeout=30, isolation_level=None)
+        self.connection.execute("""
+            CREATE TABLE IF NOT EXISTS tasks (
+                id INTEGER PRIMARY KEY,
+                kind TEXT NOT NULL,
+                payload TEXT NOT NULL,
+                state TEXT NOT NULL,
+                attempts INTEGER NOT NULL DEFAULT 0,
+                lease_owner TEXT,
+                lease_expires REAL,
+                result TEXT,
+                error TEXT
+            )""")
+        self.connection.execute("CREATE INDEX IF NOT EXISTS tasks_state ON tasks (state, kind)")
+
+    def close(self):
+        self.connection.close()
+
+    def enqueue(self, kind, payload):
+        self.connection.execute("INSERT INTO tasks (kind, payload, state) VALUES (?, ?, ?)",
+                                (kind, json.dumps(payload), PENDING))
+
+    def lease(self, worker_id, kinds=None):
+        """
+        Lease the oldest available task, including tasks
+        whose previous lease has expired.
+
+        Parameters
+        ----------
+        worker_id: str
+        kinds: list
+            Only lease tasks of these kinds. All
+            kinds if None.
+
+        Returns
+        -------
+        Task
+            The leased task, or None if there is none.
+
+        """
+
+        now = time.time()
+        kinds = list(kinds or (SEARCH, REFRESH, ZIP))
+        placeholders = ", ".join("?" * len(kinds))
+
+        # BEGIN IMMEDIATE takes the write lock, so two workers can't lease the same task
+        self.connection.execute("BEGIN IMMEDIATE")
+        try:
+            self._expire_leases(now)
+            row = self.connection.execute(
+                "SELECT id, kind, payload, attempts FROM tasks "
+                "WHERE kind IN (" + placeholders + ") AND state = ? ORDER BY id LIMIT 1",
+                kinds + [PENDING]).fetchone()
+            if row is None:
+                self.connection.execute("COMMIT")
+                return None
+
+            task_id, kind, payload, attempts = row
+            self.connection.execute(
+                "UPDATE tasks SET state = ?, lease_owner = ?, lease_expires = ?, attempts = ? WHERE id = ?",
+                (LEASED, worker_id, now + self.lease_seconds, attempts + 1, task_id))
+            self.connection.execute("COMMIT")
+        except BaseException:
+            self.connection.execute("ROLLBACK")
+            raise
+
+        return Task(task_id, kind, json.loads(payload), attempts + 1)
+
+    def heartbeat(self, task_id, worker_id):
+        """
+        Extend the lease of a task.
+
+        Returns
+        -------
+        bool
+            False if the worker no longer holds the
+            lease (it expired and someone else took it).
+
+        """
+
+        cursor = self.connection.execute(
+            "UPDATE tasks SET lease_expires = ? WHERE id = ? AND state = ? AND lease_owner = ?",
+            (time.time() + self.lease_seconds, task_id, LEASED, worker_id))
+        return cursor.rowcount == 1
+
+    def complete(self, task_id, worker_id, result):
+        cursor = self.connection.execute(
+            "UPDATE tasks SET state = ?, result = ?, lease_expires = NULL "
+            "WHERE id = ? AND state = ? AND lease_owner = ?",
+            (DONE, json.dumps(result), task_id, LEASED, worker_id))
+        return cursor.rowcount == 1
+
+    def fail(self, task_id, worker_id, error):
+        """
+        Give a task back after an error. It is requeued
+        unless it has used up its attempts.
+
+        """
+
+        self.connection.execute(
+            "UPDATE tasks SET state = CASE WHEN attempts >= ? THEN ? ELSE ? END, "
+            "error = ?, lease_owner = NULL, lease_expires = NULL "
+            "WHERE id = ? AND state = ? AND lease_owner = ?",
+            (self.max_attempts, FAILED, PENDING, error, task_id, LEASED, worker_id))
+
+    def _expire_leases(self, now):
+        """
+        Put every task with an expired lease back in the
+        queue, or mark it failed if it has used up its
+        attempts.
+
+        """
+
+        cursor = self.connection.execute(
+            "UPDATE tasks SET state = CASE WHEN attempts >= ? THEN ? ELSE ? END, "
+            "error = CASE WHEN attempts >= ? THEN ? ELSE error END, lease_owner = NULL, lease_expires = NULL "
+            "WHERE state = ? AND lease_expires < ?",
+            (self.max_attempts, FAILED, PENDING, self.max_attempts, "Lease expired", LEASED, now))
+        return cursor.rowcount
+
+    def requeue_expired(self):
+        """
+        Put every task with an expired lease back in the
+        queue (or mark it failed, see _expire_leases()).
+        lease() already does this lazily; this is for
+        status reports.
+
+        Returns
+        -------
+        int
+            Number of tasks requeued or failed.
+
+        """
+
+        return self._expire_leases(time.time())
+
+    def counts(self):
+        """
+        Returns
+        -------
+        dict
+            Maps (kind, state) to the number of tasks.
+
+        """
+
+        rows = self.connection.execute("SELECT kind, state, COUNT(*) FROM tasks GROUP BY kind, state")
+        return {(kind, state): count for kind, state, count in rows}
+
+    def is_finished(self, kind):
+        rows = self.connection.execute("SELECT COUNT(*) FROM tasks WHERE kind = ? AND state IN (?, ?)",
+                                       (kind, PENDING, LEASED))
+        return rows.fetchone()[0] == 0
+
+    def results(self, kind):
+        for (result,) in self.connection.execute(
+                "SELECT result FROM tasks WHERE kind = ? AND state = ? ORDER BY id", (kind, DONE)):
+            yield json.loads(result)
+
+
+class PermitCollector:
+    """
+    Stands in for a CSVReaderWriter in a worker: keeps the
+    permits found by a task in memory instead of writing
+    them to a csv file.
+
+    """
+
+    def __init__(self):
+        self.permits = []
+        self.permit_ids = set()
+
+    def write_permit_to_csv(self, permit):
+        identity = permit_id(permit.url)
+        if identity in self.permit_ids:
+            return False
+        self.permit_ids.add(identity)
+        self.permits.append(permit)
+        return True
+
+
+class ProgressWatchdog(NullProgressReporter):
+    def __init__(self, stall_seconds):
+        """
+        Progress reporter passed to the stages a task runs.
+        It only remembers when the last event (page loaded,
+        permit checked, ZIP code looked up...) happened, so
+        the heartbeat can tell a slow task from one that is
+        stuck, e.g. in a WebDriver call that never returns.
+
+        Parameters
+        ----------
+        stall_seconds: float
+            The task is stalled if it hasn't made any
+            progress for this long.
+
+        """
+
+        super().__init__()
+        self.stall_seconds = stall_seconds
+        self.last_progress = time.monotonic()
+
+    def publish(self, event, value=None):
+        self.last_progress = time.monotonic()
+
+    def is_stalled(self):
+        return time.monotonic() - self.last_progress > self.stall_seconds
+
+
+class Heartbeat(threading.Thread):
+    def __init__(self, queue_path, task_id, worker_id, interval, watchdog, lease_seconds=DEFAULT_LEASE_SECONDS):
+        """
+        Keeps the lease of a task alive from a background
+        thread while the worker runs it. SQLite connections
+        can't be shared across threads, so this thread
+        opens its own, renewing leases for @lease_seconds
+        (that of the worker's queue).
+
+        The lease is only renewed while @watchdog sees the
+        task making progress. Once it stalls, the lease is
+        left to expire so another worker can take the task.
+
+        """
+
+        super().__init__(daemon=True)
+        self.queue_path = queue_path
+        self.lease_seconds = lease_seconds
+        self.task_id = task_id
+        self.worker_id = worker_id
+        self.interval = interval
+        self.watchdog = watchdog
+        self.stopped = threading.Event()
+        self.lease_lost = False
+        self.stalled = False
+
+    def run(self):
+        queue = WorkQueue(self.queue_path, lease_seconds=self.lease_seconds)
+        try:
+            while not self.stopped.wait(self.interval):
+                if self.watchdog.is_stalled():
+                    self.stalled = True
+                    return
+                if not queue.heartbeat(self.task_id, self.worker_id):
+                    self.lease_lost = True
+                    return
+        finally:
+            queue.close()
+
+    def stop(self):
+        self.stopped.set()
+        self.join()
+
+
+def enqueue_date_range(queue, start_date, end_date, days_per_task=7, application_types=(DEFAULT_PERMIT_TYPE,)):
+    """
+    Split a date range into search tasks.
+
+    Parameters
+    ----------
+    queue: WorkQueue
+    start_date, end_date: datetime.date
+        First and last date to search (inclusive).
+    days_per_task: int
+    application_types: iterable
+
+    """
+
+    date = start_date
+    while date <= end_date:
+        days = min(days_per_task, (end_date - date).days + 1)
+        queue.enqueue(SEARCH, {"start": date.isoformat(), "days": days,
+                               "application_types": list(application_types)})
+        date += datetime.timedelta(days=days)
+
+
+def enqueue_zip_lookups(queue, addresses_per_task=100):
+    """
+    Once every search task is done, split the addresses
+    of the permits they found into ZIP lookup tasks.
+    Equivalent addresses are looked up once.
+
+    """
+
+    addresses = sorted(set(canonical_address(row["Address"])
+                           for result in queue.results(SEARCH) for row in result["permits"]))
+    for start in range(0, len(addresses), addresses_per_task):
+        queue.enqueue(ZIP, {"addresses": addresses[start:start + addresses_per_task]})
+
+
+def enqueue_refresh(queue, csv_filename, permits_per_task=50):
+    """
+    Split the uncompleted permits of a master file into
+    refresh tasks. Each task carries the state of its
+    permits (see PermitStateStore), so workers schedule
+    them the same way update_file() would.
+
+    """
+
+    from PoolPermitReaderWriter import iter_uncompleted_permits
+    from permit_state import PermitStateStore
+
+    state = PermitStateStore(csv_filename)
+    batch = []
+    batch_state = {}
+    for idx, permit in iter_uncompleted_permits(csv_filename):
+        batch.append([idx, permit.to_row()])
+        if state.get(permit.url):
+            batch_state[permit.url] = state.get(permit.url)
+        if len(batch) == permits_per_task:
+            queue.enqueue(REFRESH, {"permits": batch, "state": batch_state})
+            batch = []
+            batch_state = {}
+    if batch:
+        queue.enqueue(REFRESH, {"permits": batch, "state": batch_state})
+
+
+def merge_search_results(queue, output_filename):
+    """
+    Write the permits found by every search task, with
+    the full addresses found by the ZIP tasks, into one
+    csv file. Permits found by more than one task are
+    written once; permits with an invalid address are
+    dropped, same as run_bot().
+
+    Returns
+    -------
+    int
+        Number of permits written.
+
+    """
+
+    from permit_output import CsvOutput
+
+    full_addresses = {}
+    for result in queue.results(ZIP):
+        full_addresses.update(result["full_addresses"])
+
+    seen = set()
+    count = 0
+    with CsvOutput(output_filename) as output:
+        for result in queue.results(SEARCH):
+            for row in result["permits"]:
+                permit = Permit.from_row(row)
+                identity = permit_id(permit.url)
+                if identity in seen:
+                    continue
+                seen.add(identity)
+                permit.address = full_addresses.get(canonical_address(permit.address), permit.address)
+                if permit.address != "":
+                    output.write(permit)
+                    count += 1
+    return count
+
+
+def merge_refresh_results(queue, csv_filename):
+    """
+    Merge the completed dates found by the refresh tasks
+    back into the master file, and when each permit was
+    last checked into the master's state file.
+
+    Returns
+    -------
+    int
+        Number of permits updated.
+
+    """
+
+    from PoolPermitReaderWriter import merge_updates
+    from permit_state import PermitStateStore
+
+    state = PermitStateStore(csv_filename)
+    updated_permits = {}
+    for result in queue.results(REFRESH):
+        for idx, row in result["updated"]:
+            updated_permits[idx] = Permit.from_row(row)
+        for permit_url, entry in result.get("state", {}).items():
+            state.entries.setdefault(permit_url, {}).update(entry)
+    merge_updates(csv_filename, updated_permits)
+    state.save()
+    return len(updated_permits)
+
+
+def run_task(driver, task, progress):
+    """
+    Run one task with the existing web_driver stages,
+    which report their progress to @progress.
+
+    Returns
+    -------
+    dict
+        The task's result.
+
+    """
+
+    import web_driver
+    from permit_index import PermitIndex
+    from permit_state import PermitStateStore
+    from scheduler import CompletionScheduler
+    from usps_client import UspsZipClient
+    from zip_resolver import ZipResolver
+
+    if task.kind == SEARCH:
+        collector = PermitCollector()
+        start = datetime.datetime.strptime(task.payload["start"], "%Y-%m-%d")
+        delta = datetime.timedelta(days=task.payload["days"] - 1)
+        # Deduplication happens when the results are merged
+        web_driver.get_permits(driver, collector, delta, start, PermitIndex(), progress,
+                               application_types=task.payload["application_types"])
+        return {"permits": [permit.to_row() for permit in collector.permits]}
+
+    if task.kind == REFRESH:
+        uncompleted_permits = [(idx, Permit.from_row(row)) for idx, row in task.payload["permits"]]
+        # The state goes back with the result and is saved by merge_refresh_results()
+        state = PermitStateStore(None)
+        state.entries.update(task.payload.get("state", {}))
+        updated_permits = web_driver.update_permit_completion_date(driver, uncompleted_permits, state,
+                                                                   CompletionScheduler([]), progress)
+        return {"updated": [[idx, permit.to_row()] for idx, permit in updated_permits],
+                "state": {permit.url: state.get(permit.url) for _, permit in uncompleted_permits
+                          if state.get(permit.url)}}
+
+    if task.kind == ZIP:
+        permits = [SimpleNamespace(address=address) for address in task.payload["addresses"]]
+        usps_client = UspsZipClient()
+        try:
+            web_driver.get_full_address_for_permits(driver, permits, ZipResolver.load_default(), usps_client,
+                                                    progress)
+        finally:
+            usps_client.close()
+        return {"full_addresses": {address: permit.address
+                                   for address, permit in zip(task.payload["addresses"], permits)}}
+
+    raise ValueError("Unknown task kind: " + task.kind)
+
+
+def run_worker(queue_path, worker_id=None, kinds=None, wait_seconds=None, lease_seconds=DEFAULT_LEASE_SECONDS):
+    """
+    Lease and run tasks until the queue is empty. One
+    browser is started for the worker's lifetime and
+    restarted after a WebDriver error.
+
+    Parameters
+    ----------
+    queue_path: str
+        Path to the queue's SQLite file.
+    worker_id: str
+        Defaults to <host name>-<random suffix>.
+    kinds: list
+        Only run tasks of these kinds.
+    wait_seconds: float
+        If given, keep polling an empty queue for
+        this long before exiting (e.g. while other
+        workers may still requeue expired tasks).
+    lease_seconds: float
+        How long each lease (and each renewal by
+        the heartbeat) lasts.
+
+    Returns
+    -------
+    int
+        Number of tasks completed.
+
+    """
+
+    import web_driver
+
+    worker_id = worker_id or socket.gethostname() + "-" + uuid.uuid4().hex[:6]
+    queue = WorkQueue(queue_path, lease_seconds=lease_seconds)
+    driver = None
+    completed = 0
+    idle_since = None
+
+    try:
+        while True:
+            task = queue.lease(worker_id, kinds)
+            if task is None:
+                idle_since = idle_since or time.monotonic()
+                if wait_seconds is None or time.monotonic() - idle_since > wait_seconds:
+                    return completed
+                time.sleep(min(5, wait_seconds))
+                continue
+            idle_since = None
+
+            if driver is None:
+                driver = web_driver.start_driver()
+
+            watchdog = ProgressWatchdog(queue.lease_seconds)
+            heartbeat = Heartbeat(queue_path, task.id, worker_id, queue.lease_seconds / 3, watchdog,
+                                  queue.lease_seconds)
+            heartbeat.start()
+            try:
+                result = run_task(driver, task, watchdog)
+            except Exception as error:
+                heartbeat.stop()
+                print("Task " + str(task.id) + " (" + task.kind + ") failed: " + repr(error))
+                queue.fail(task.id, worker_id, repr(error))
+                web_driver.close_driver(driver)
+                driver = None
+                continue
+            heartbeat.stop()
+
+            if not heartbeat.lease_lost and queue.complete(task.id, worker_id, result):
+                completed += 1
+    finally:
+        if driver is not None:
+            web_driver.close_driver(driver)
+        queue.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Distributed permit scraping over a shared task queue.")
+    parser.add_argument("queue", help="Path to the queue's SQLite file (on a drive every worker can reach).")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    search = commands.add_parser("search", help="Queue search tasks for a date range (mm/dd/yyyy).")
+    search.add_argument("start")
+    search.add_argument("end")
+    search.add_argument("--days-per-task", type=int, default=7)
+    search.add_argument("--application-type", action="append", dest="application_types")
+
+    commands.add_parser("zip", help="Queue ZIP lookup tasks for the permits found by finished search tasks.")
+
+    refresh = commands.add_parser("refresh", help="Queue refresh tasks for the uncompleted permits of a master file.")
+    refresh.add_argument("master_csv")
+    refresh.add_argument("--permits-per-task", type=int, default=50)
+
+    worker = commands.add_parser("worker", help="Run tasks until the queue is empty.")
+    worker.add_argument("--kind", action="append", dest="kinds", choices=(SEARCH, REFRESH, ZIP))
+    worker.add_argument("--wait", type=float, default=None, help="Seconds to keep polling an empty queue.")
+    worker.add_argument("--lease-seconds", type=float, default=DEFAULT_LEASE_SECONDS,
+                        help="How long a task is leased before another worker may take it.")
+
+    merge = commands.add_parser("merge", help="Write the search and ZIP results into one csv file.")
+    merge.add_argument("output_csv")
+
+    merge_refresh = commands.add_parser("merge-refresh", help="Merge refresh results back into a master file.")
+    merge_refresh.add_argument("master_csv")
+
+    commands.add_parser("status", help="Show the number of tasks by kind and state.")
+
+    args = parser.parse_args()
+    if args.command == "worker":
+        print(str(run_worker(args.queue, kinds=args.kinds, wait_seconds=args.wait,
+                             lease_seconds=args.lease_seconds)) + " tasks completed.")
+        return
+
+    queue = WorkQueue(args.queue)
+    try:
+        if args.command == "search":
+            start = datetime.datetime.strptime(args.start, "%m/%d/%Y").date()
+            end = datetime.datetime.strptime(args.end, "%m/%d/%Y").date()
+            enqueue_date_range(queue, start, end, args.days_per_task,
+                               args.application_types or (DEFAULT_PERMIT_TYPE,))
+        elif args.command == "zip":
+            if not queue.is_finished(SEARCH):
+                print("Search tasks are still running. Try again when they are done.")
+                return
+            enqueue_zip_lookups(queue)
+        elif args.command == "refresh":
+            enqueue_refresh(queue, args.master_csv, args.permits_per_task)
+        elif args.command == "merge":
+            print(str(merge_search_results(queue, args.output_csv)) + " permits written to " + args.output_csv)
+        elif args.command == "merge-refresh":
+            print(str(merge_refresh_results(queue, args.master_csv)) + " permits updated in " + args.master_csv)
+        elif args.command == "status":
+            queue.requeue_expired()
+            for (kind, state), count in sorted(queue.counts().items()):
+                print(kind + " " + state + ": " + str(count))
+    finally:
+        queue.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,197 @@
+import bisect
+import csv
+import os
+import re
+import sys
+
+from address import format_address
+from address import format_full_address
+from address import normalize_street_name
+from address import parse_address
+
+
+# The reference file lists street segments in Dallas with their ZIP code:
+# ----------------------------------------------------------------------
+# Street  - the street name, e.g. "N Central Expy" (spelling is normalized)
+# From    - lowest house number on the segment
+# To      - highest house number on the segment
+# Parity  - "E" (even numbers only), "O" (odd numbers only) or "B"/blank (both)
+# ZIP     - the ZIP+4 code of the segment, e.g. "75201-1234", or the
+#           5-digit ZIP code with the +4 in a separate ZIP4 column
+#
+# Addresses are resolved to the same format as the USPS lookup (see
+# address.format_full_address()), ZIP+4 included, so rows without a +4
+# are skipped: addresses on them are looked up on the USPS website.
+#
+# The file is built from the Census Bureau's street data by
+# build_street_zip.py.
+REFERENCE_FILENAME = "dallas_street_zip.csv"
+
+ZIP_PLUS_4_PATTERN = re.compile(r"^\d{5}-\d{4}$")
+
+CITY = "DALLAS"
+STATE = "TX"
+
+
+class MissingReferenceData(OSError):
+    pass
+
+
+class ZipResolver:
+    def __init__(self, segments=()):
+        """
+        Initialize a ZipResolver object from a list of
+        street segments. Segments are grouped by their
+        normalized street name, and each street's
+        segments are sorted by their lowest house
+        number for binary search.
+
+        Parameters
+        ----------
+        segments: iterable
+            5-tuples of (street, from, to, parity, zip),
+            where zip is the ZIP+4 code.
+
+        """
+
+        grouped = {}
+        for street, low, high, parity, zip_code in segments:
+            if low > high:
+                low, high = high, low
+            grouped.setdefault(normalize_street_name(street), []).append((low, high, parity, zip_code))
+
+        self.streets = {}
+        for street, street_segments in grouped.items():
+            street_segments.sort()
+            starts = [segment[0] for segment in street_segments]
+
+            # max_ends[i] is the highest house number covered by segments 0..i,
+            # which lets lookup() stop scanning back through the segments early.
+            max_ends = []
+            highest = -1
+            for segment in street_segments:
+                highest = max(highest, segment[1])
+                max_ends.append(highest)
+            self.streets[street] = (starts, max_ends, street_segments)
+
+    @classmethod
+    def load(cls, filename):
+        """
+        Build a ZipResolver from a reference csv file.
+
+        Raises
+        ------
+        OSError
+            If the file can't be read.
+
+        """
+
+        segments = []
+        with open(filename, mode="r") as file:
+            for row in csv.DictReader(file):
+                try:
+                    parity = (row.get("Parity") or "B").strip().upper()[:1]
+                    zip_code = row["ZIP"].strip()
+                    if row.get("ZIP4"):
+                        zip_code = zip_code[:5] + "-" + row["ZIP4"].strip()
+                    if not ZIP_PLUS_4_PATTERN.match(zip_code):
+                        continue  # No +4, see REFERENCE_FILENAME
+                    segments.append((row["Street"], int(row["From"]), int(row["To"]), parity, zip_code))
+                except (KeyError, ValueError):
+                    continue  # Skip malformed rows
+        return cls(segments)
+
+    @classmethod
+    def load_default(cls):
+        """
+        Load the reference file shipped with the app.
+
+        Raises
+        ------
+        MissingReferenceData
+            If the file is missing or has no street
+            segment with a ZIP+4. Every address would
+            go to the USPS website, which is what the
+            file is there to avoid.
+
+        """
+
+        # sys._MEIPASS is given by PyInstaller. If this attribute doesn't exist,
+        # then we must be running the script itself, not the deployed application.
+        try:
+            directory = sys._MEIPASS
+        except AttributeError:
+            directory = "."
+        filename = os.path.join(directory, REFERENCE_FILENAME)
+        if not os.path.exists(filename):
+            raise MissingReferenceData(filename + " not found. Build it with build_street_zip.py.")
+
+        resolver = cls.load(filename)
+        if len(resolver) == 0:
+            raise MissingReferenceData(filename + " has no street segment with a ZIP+4. "
+                                       "Build it again with build_street_zip.py.")
+        return resolver
+
+    def __len__(self):
+        return len(self.streets)
+
+    def lookup(self, house_number, street):
+        """
+        Find the ZIP codes of every segment of @street
+        that contains @house_number.
+
+        Parameters
+        ----------
+        house_number: int
+        street: str
+            Normalized street name.
+
+        Returns
+        -------
+        set
+            The ZIP+4 codes found. Empty if none.
+
+        """
+
+        if street not in self.streets:
+            return set()
+
+        starts, max_ends, segments = self.streets[street]
+        zip_codes = set()
+        idx = bisect.bisect_right(starts, house_number) - 1
+        while idx >= 0 and max_ends[idx] >= house_number:
+            low, high, parity, zip_code = segments[idx]
+            if high >= house_number:
+                if parity == "B" or (parity == "E") == (house_number % 2 == 0):
+                    zip_codes.add(zip_code)
+            idx -= 1
+        return zip_codes
+
+    def resolve(self, address):
+        """
+        Resolve the full address (with ZIP code) of a
+        permit address without going to USPS.
+
+        Parameters
+        ----------
+        address: str
+            Address as saved by scraper.get_permit_info().
+
+        Returns
+        -------
+        str
+            The full address, in the same format as
+            the USPS lookup, or None if the address
+            isn't in the reference data or its ZIP code
+            is ambiguous.
+
+        """
+
+        parts = parse_address(address)
+        if parts is None:
+            return None
+
+        zip_codes = self.lookup(parts.house_number, parts.street)
+        if len(zip_codes) != 1:
+            return None
+        return format_full_address(format_address(parts), CITY, STATE, zip_codes.pop())